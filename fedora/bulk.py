@@ -0,0 +1,271 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+import json
+import logging
+import os
+import uuid
+
+from fedora import utils
+from fedora.events import JsonLinesSink
+from fedora.rest.api import FedoraException
+from fedora.rest.ds import DatastreamProfile, ObjectProfile
+from fedora.rest.limiter import TokenBucket
+from fedora.worker import Worker
+
+LOG = logging.getLogger(__name__)
+
+# operations that can be undone from the journal
+UNDOABLE = ("set_object_state", "set_datastream_state", "purge_relationship")
+
+
+class BulkOperations(object):
+    """
+    Change the state of, or purge, many objects or datastreams, and clean up relationships, in one go.
+
+    Each operation takes an id iterator (a list, a generator or the name of a file with one id per line, see
+    :meth:`fedora.worker.Worker.id_iter`) and works on `max_workers` objects at a time, at most `rate` calls
+    per second. Before anything changes, the current state is read; objects that are already in the requested
+    state are left alone. With `dry_run` nothing changes and the journal says what would have changed.
+
+    Every id gets a record in the journal, a file of JSON lines that is appended to. A record has the keys
+    id, time, operation, pid, ds_id, before, after, status ('done', 'dry-run', 'unchanged' or 'failed'), error,
+    arguments (of the operation), undo (`True` for records of an :meth:`undo`) and undoes (the ids of the
+    records that an undo record reverts). State changes and purged relationships can be undone from the journal
+    with :meth:`undo`; purges of objects and datastreams cannot, their records are an audit trail. Example::
+
+        bulk = BulkOperations(fedora, "bulk-journal.jsonl", dry_run=True)
+        bulk.set_object_state("dataset-ids.txt", "I", log_message="withdrawn")
+        # look at the journal, then do it
+        bulk.dry_run = False
+        bulk.set_object_state("dataset-ids.txt", "I", log_message="withdrawn")
+
+    :param fedora: the Fedora instance
+    :param journal_file: path of the journal
+    :param max_workers: number of concurrent calls, default: 4
+    :param rate: maximum number of objects per second, default: `None` (no maximum)
+    :param dry_run: only report what would change, default: `False`
+    """
+
+    def __init__(self, fedora, journal_file="bulk-journal.jsonl", max_workers=4, rate=None, dry_run=False):
+        self.fedora = fedora
+        self.journal_file = journal_file
+        self.max_workers = max_workers
+        self.bucket = None if rate is None else TokenBucket(rate)
+        self.dry_run = dry_run
+        # while undoing: the ids of the undone records per pid
+        self.undoing = None
+
+    def set_object_state(self, ids, state, log_message=None):
+        """
+        :param ids: ids of the objects
+        :param state: 'A' (active), 'I' (inactive) or 'D' (deleted)
+        :param log_message: message in the audit trail of the objects
+        :return: dict with the number of records per status
+        """
+        def before(pid, ds_id):
+            profile = ObjectProfile(pid, self.fedora)
+            profile.fetch()
+            return profile.obj_state
+
+        def change(pid, ds_id):
+            self.fedora.modify_object(pid, state=state, log_message=log_message)
+
+        return self._run("set_object_state", ids, None, before, change, state, {"log_message": log_message})
+
+    def set_datastream_state(self, ids, ds_id, state, log_message=None):
+        """
+        :param ids: ids of the objects
+        :param ds_id: id of the datastream in each object
+        :param state: 'A' (active), 'I' (inactive) or 'D' (deleted)
+        :param log_message: message in the audit trail of the objects
+        :return: dict with the number of records per status
+        """
+        def before(pid, ds_id):
+            profile = DatastreamProfile(pid, ds_id, self.fedora)
+            profile.fetch()
+            return profile.ds_state
+
+        def change(pid, ds_id):
+            self.fedora.modify_datastream_state(pid, ds_id, state, log_message=log_message)
+
+        return self._run("set_datastream_state", ids, ds_id, before, change, state, {"log_message": log_message})
+
+    def purge_datastream(self, ids, ds_id, log_message=None):
+        """
+        Purge a datastream, all its versions, from each object. The journal keeps the profile of the last version.
+
+        :param ids: ids of the objects
+        :param ds_id: id of the datastream in each object
+        :param log_message: message in the audit trail of the objects
+        :return: dict with the number of records per status
+        """
+        def before(pid, ds_id):
+            profile = DatastreamProfile(pid, ds_id, self.fedora)
+            profile.fetch()
+            return {"version_id": profile.ds_version_id, "created": profile.ds_creation_date,
+                    "state": profile.ds_state, "size": profile.ds_size, "checksum_type": profile.ds_checksum_type,
+                    "checksum": profile.ds_checksum}
+
+        def change(pid, ds_id):
+            self.fedora.purge_datastream(pid, ds_id, log_message=log_message)
+
+        return self._run("purge_datastream", ids, ds_id, before, change, None, {"log_message": log_message})
+
+    def purge_object(self, ids, log_message=None):
+        """
+        Purge objects. The journal keeps their profile.
+
+        :param ids: ids of the objects
+        :param log_message: message in the audit trail of the repository
+        :return: dict with the number of records per status
+        """
+        def before(pid, ds_id):
+            profile = ObjectProfile(pid, self.fedora)
+            profile.fetch()
+            return {"label": profile.obj_label, "owner_id": profile.obj_owner_id, "state": profile.obj_state,
+                    "created": profile.obj_create_date, "last_modified": profile.obj_last_mod_date}
+
+        def change(pid, ds_id):
+            self.fedora.purge_object(pid, log_message=log_message)
+
+        return self._run("purge_object", ids, None, before, change, None, {"log_message": log_message})
+
+    def purge_relationship(self, ids, predicate, obj, is_literal=False, data_type=None):
+        """
+        Purge a relationship from each object, f.i. after moving or purging the object it points to.
+
+        :param ids: ids of the subjects
+        :param predicate: the predicate of the relationship
+        :param obj: the object of the relationship
+        :param is_literal: is `obj` a literal
+        :param data_type: data type of a literal
+        :return: dict with the number of records per status
+        """
+        arguments = {"predicate": predicate, "obj": obj, "is_literal": is_literal, "data_type": data_type}
+
+        def change(pid, ds_id):
+            if not self.fedora.purge_relationship(pid, predicate, obj, is_literal, data_type):
+                return "unchanged"
+
+        # whether the relationship exists is only known when purging; a dry run cannot tell
+        return self._run("purge_relationship", ids, None, None, change, None, arguments)
+
+    def undo(self, journal_file=None):
+        """
+        Undo the state changes and relationship purges with status 'done' in a journal that were not undone
+        before. The journal is read newest first: an object or datastream that was changed more than once goes
+        back to the state it had before its first change. Records of the undo are written to the journal of this
+        instance, marked as undo and with the ids of the records they undo, so that running undo again does
+        nothing. With `dry_run` the journal says what the undo would change.
+
+        :param journal_file: the journal to undo, default: the journal of this instance
+        :return: dict with the number of records per status
+        """
+        journal_file = journal_file or self.journal_file
+        records = []
+        undone = set()
+        for path in {journal_file, self.journal_file}:
+            if not os.path.exists(path):
+                continue
+            with open(path, "r", encoding="utf-8") as f:
+                for number, line in enumerate(f):
+                    record = json.loads(line)
+                    if record.get("undo"):
+                        if record["status"] in ("done", "unchanged"):
+                            undone.update(record.get("undoes") or ())
+                    elif path == journal_file:
+                        # records of journals from before record ids are known by their line
+                        record.setdefault("id", "%s:%d" % (path, number))
+                        records.append(record)
+
+        # per object, datastream or relationship: the state before its first change and the ids of its changes
+        targets = {}
+        for record in reversed(records):
+            if record["status"] != "done" or record["id"] in undone:
+                continue
+            operation = record["operation"]
+            if operation not in UNDOABLE:
+                LOG.warning("Cannot undo %s of %s" % (operation, record["pid"]))
+                continue
+            if operation == "purge_relationship":
+                key = (operation,) + tuple(record["arguments"][k]
+                                           for k in ("predicate", "obj", "is_literal", "data_type"))
+                before = None
+            else:
+                key = (operation, record["ds_id"])
+                before = record["before"]
+            target = targets.setdefault((key, record["pid"]), {"before": before, "ids": []})
+            target["before"] = before
+            target["ids"].append(record["id"])
+
+        # objects that go back to the same state are undone together
+        groups = {}
+        for (key, pid), target in targets.items():
+            groups.setdefault(key + (target["before"],), {})[pid] = target["ids"]
+
+        counts = {}
+        try:
+            for key, undoes in groups.items():
+                self.undoing = undoes
+                operation = key[0]
+                message = "undo of %s" % operation
+                pids = list(undoes)
+                if operation == "set_object_state":
+                    more = self.set_object_state(pids, key[2], log_message=message)
+                elif operation == "set_datastream_state":
+                    more = self.set_datastream_state(pids, key[1], key[2], log_message=message)
+                else:
+                    more = self.add_relationship(pids, *key[1:5])
+                for status, count in more.items():
+                    counts[status] = counts.get(status, 0) + count
+        finally:
+            self.undoing = None
+        return counts
+
+    def add_relationship(self, ids, predicate, obj, is_literal=False, data_type=None):
+        """
+        Add a relationship to each object.
+
+        :return: dict with the number of records per status
+        """
+        arguments = {"predicate": predicate, "obj": obj, "is_literal": is_literal, "data_type": data_type}
+
+        def change(pid, ds_id):
+            self.fedora.add_relationship(pid, predicate, obj, is_literal, data_type)
+
+        return self._run("add_relationship", ids, None, None, change, None, arguments)
+
+    def _run(self, operation, ids, ds_id, before, change, after, arguments):
+        def apply(pid):
+            if self.bucket is not None:
+                self.bucket.consume()
+            record = {"id": uuid.uuid4().hex, "time": utils.w3c_now(), "operation": operation, "pid": pid,
+                      "ds_id": ds_id, "before": None, "after": after, "status": None, "error": None,
+                      "arguments": arguments, "undo": self.undoing is not None,
+                      "undoes": self.undoing.get(pid) if self.undoing is not None else None}
+            try:
+                if before is not None:
+                    record["before"] = before(pid, ds_id)
+                    if after is not None and record["before"] == after:
+                        record["status"] = "unchanged"
+                        return record
+                if self.dry_run:
+                    record["status"] = "dry-run"
+                    return record
+                record["status"] = change(pid, ds_id) or "done"
+            except FedoraException as e:
+                LOG.warning("%s of %s failed: %s" % (operation, pid, e))
+                record["status"] = "failed"
+                record["error"] = str(e)
+            return record
+
+        counts = {}
+        journal = JsonLinesSink(self.journal_file)
+        try:
+            for record in utils.ordered_map(apply, Worker.id_iter(ids), self.max_workers):
+                journal(record)
+                counts[record["status"]] = counts.get(record["status"], 0) + 1
+        finally:
+            journal.close()
+        LOG.info("%s%s: %s" % (operation, " (dry run)" if self.dry_run else "", counts))
+        return counts
@@ -0,0 +1,112 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+import errno
+import logging
+import os
+import shutil
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    # not on this platform, no reflinks
+    fcntl = None
+
+LOG = logging.getLogger(__name__)
+
+# ioctl request to clone a file on filesystems with copy-on-write support (btrfs, xfs)
+FICLONE = 0x40049409
+
+
+class ContentStore(object):
+    """
+    Content-addressed store of downloaded files, keyed by their SHA-1 checksum.
+
+    A file is kept once, as `{root}/{checksum[:2]}/{checksum}`; the directory tree itself is the index, so a
+    lookup is one stat call. Files are put in and taken out of the store by hardlink, or by reflink or copy if
+    hardlinks are not possible or not wanted. Note that hardlinked files share their content: do not change
+    files that are materialized from the store with `link='hard'`.
+
+    :param root: directory of the store
+    :param link: how to materialize files: 'hard' (hardlink, fall back to reflink, then copy), 'reflink'
+        (reflink, fall back to copy) or 'copy', default: 'hard'
+    """
+
+    def __init__(self, root, link="hard"):
+        if link not in ("hard", "reflink", "copy"):
+            raise ValueError("Unknown link: %s" % link)
+        self.root = os.path.abspath(root)
+        self.link = link
+        os.makedirs(self.root, exist_ok=True)
+
+    def path(self, checksum):
+        checksum = checksum.lower()
+        return os.path.join(self.root, checksum[:2], checksum)
+
+    def contains(self, checksum):
+        return checksum is not None and os.path.exists(self.path(checksum))
+
+    def add(self, local_path, checksum):
+        """
+        Put a file in the store. The caller vouches for the checksum.
+
+        :param local_path: the file
+        :param checksum: SHA-1 of the file
+        :return: `True` if the file was added, `False` if the store already had it
+        """
+        blob = self.path(checksum)
+        if os.path.exists(blob):
+            return False
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        # threads and processes may add the same content at the same time, each uses a file of its own
+        tmp_blob = "%s.tmp%d-%d" % (blob, os.getpid(), threading.get_ident())
+        if os.path.lexists(tmp_blob):
+            os.remove(tmp_blob)
+        try:
+            self._link(local_path, tmp_blob)
+        except FileExistsError:
+            return False
+        if os.path.exists(blob):
+            # added by another thread or process in the meantime
+            os.remove(tmp_blob)
+            return False
+        os.replace(tmp_blob, blob)
+        return True
+
+    def materialize(self, checksum, target_path):
+        """
+        Make the file with the given checksum appear at `target_path`.
+
+        :param checksum: SHA-1 of the file
+        :param target_path: where the file should appear, an existing file is replaced
+        :return: how the file was materialized: 'hard', 'reflink' or 'copy'
+        """
+        blob = self.path(checksum)
+        if os.path.exists(target_path) and os.path.samefile(blob, target_path):
+            # rename does nothing if source and target are links to the same file
+            return "hard"
+        os.makedirs(os.path.dirname(os.path.abspath(target_path)), exist_ok=True)
+        tmp_path = target_path + ".part"
+        if os.path.lexists(tmp_path):
+            os.remove(tmp_path)
+        method = self._link(blob, tmp_path)
+        os.replace(tmp_path, target_path)
+        return method
+
+    def _link(self, source, target):
+        if self.link == "hard":
+            try:
+                os.link(source, target)
+                return "hard"
+            except OSError as e:
+                if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP):
+                    raise
+        if self.link in ("hard", "reflink") and fcntl is not None:
+            try:
+                with open(source, "rb") as src, open(target, "wb") as dst:
+                    fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+                return "reflink"
+            except OSError:
+                os.remove(target)
+        shutil.copyfile(source, target)
+        return "copy"
@@ -0,0 +1,64 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+import gzip
+import os
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# suffix of compressed files by compression
+SUFFIXES = {"zstd": ".zst", "gzip": ".gz"}
+
+# zstd compresses xml and csv better and much faster than gzip; gzip is always available
+DEFAULT_COMPRESSION = "zstd" if zstandard is not None else "gzip"
+
+
+def open_text(path, mode="rt", compression=None):
+    """
+    Open a text file that is compressed with zstd or gzip, or not compressed.
+
+    :param path: path of the file
+    :param mode: 'rt', 'wt' or 'at'
+    :param compression: 'zstd', 'gzip' or `None`, default: `None` (decided by the suffix of the path)
+    :return: a text stream
+    """
+    if compression is None:
+        compression = compression_of(path)
+    if compression == "zstd":
+        if zstandard is None:
+            raise ImportError("Reading or writing %s needs the package zstandard" % path)
+        return zstandard.open(path, mode, encoding="utf-8", newline="")
+    if compression == "gzip":
+        return gzip.open(path, mode, encoding="utf-8", newline="")
+    if compression == "none":
+        return open(path, mode, encoding="utf-8", newline="")
+    raise ValueError("Unknown compression: %s" % compression)
+
+
+def compression_of(path):
+    """
+    :return: 'zstd', 'gzip' or 'none', after the suffix of the path; a '.part' suffix is ignored
+    """
+    if path.endswith(".part"):
+        path = path[:-len(".part")]
+    for compression, suffix in SUFFIXES.items():
+        if path.endswith(suffix):
+            return compression
+    return "none"
+
+
+def write_text(path, text, compression=None):
+    """
+    Write text compressed to a file, by way of a '.part' file, so the file is complete or not there.
+    """
+    tmp_path = path + ".part"
+    with open_text(tmp_path, "wt", compression) as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def read_text(path):
+    with open_text(path, "rt") as f:
+        return f.read()
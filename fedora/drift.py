@@ -0,0 +1,130 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+import logging
+
+from fedora import utils, worklog
+from fedora.rest.api import FedoraException
+from fedora.rest.ds import DatastreamProfile
+
+LOG = logging.getLogger(__name__)
+
+# creation date of the current version of EASY_FILE of all files, from the resource index
+FILE_DATES_QUERY = "PREFIX fmodel: <info:fedora/fedora-system:def/model#> " \
+                   "PREFIX view: <info:fedora/fedora-system:def/view#> " \
+                   "SELECT ?s ?date WHERE { " \
+                   "?s fmodel:hasModel <info:fedora/easy-model:EDM1FILE> . " \
+                   "?s view:disseminates ?ds . " \
+                   "?ds view:disseminationType <info:fedora/*/EASY_FILE> . " \
+                   "?ds view:lastModifiedDate ?date }"
+
+DRIFT_STATES = ("current", "stale", "changed", "missing", "gone", "error")
+
+# states of files that should be downloaded again
+REDOWNLOAD_STATES = ("stale", "changed", "missing")
+
+
+def detect_drift(log_file, fedora, max_workers=8, use_risearch=False, fmt=None):
+    """
+    Compare the files in a work-log with the current EASY_FILE datastreams in the repository.
+
+    The current profile of each file is fetched by `max_workers` threads. With `use_risearch` the creation date
+    of the current version of all files is first read with one risearch query, and only files with a date that
+    differs from the work-log are profiled. Work-log and repository are then compared column-wise. The state of
+    each file is one of :data:`DRIFT_STATES`:
+
+    - current: the checksum and creation date in the repository are the ones in the work-log
+    - stale: same checksum, but the repository has a newer version of the datastream
+    - changed: the content in the repository has another checksum
+    - missing: the file is in the repository, but the work-log has no good copy (the download failed or had
+      a checksum error)
+    - gone: the datastream is no longer in the repository
+    - error: the profile could not be read
+
+    When a file is in the work-log more than once, the last row counts.
+
+    :param log_file: path of the work-log, in any of the :data:`fedora.worklog.WORK_LOG_FORMATS`
+    :param fedora: the Fedora instance
+    :param max_workers: number of threads fetching profiles, default: 8
+    :param use_risearch: select the files to profile with one risearch query, default: `False`
+    :param fmt: format of the work-log, default: derived from the extension of `log_file`
+    :return: a :class:`pandas.DataFrame` with per file: file_id, local_path, checksum, creation_date,
+        remote_checksum, remote_creation_date, remote_version_id and state
+    """
+    # pandas takes long to import, only import it when needed
+    import numpy as np
+    import pandas as pd
+
+    columns = worklog.WORK_LOG_COLUMNS
+    log = pd.DataFrame([row[:len(columns)] for row in worklog.read_work_log(log_file, fmt)], columns=columns)
+    log = log.drop_duplicates("file_id", keep="last").set_index("file_id")
+    log_dates = pd.to_datetime(log["creation_date"], utc=True, errors="coerce")
+
+    to_profile = log.index
+    remote = pd.DataFrame(index=log.index, columns=["remote_checksum", "remote_creation_date",
+                                                    "remote_version_id", "remote_error", "remote_status"],
+                          dtype=object)
+    if use_risearch:
+        dates = _file_dates(fedora)
+        known = pd.to_datetime(dates.reindex(log.index), utc=True, errors="coerce")
+        unchanged = known.notna() & (known == log_dates)
+        remote.loc[unchanged, "remote_checksum"] = log.loc[unchanged, "checksum"]
+        remote.loc[unchanged, "remote_creation_date"] = log.loc[unchanged, "creation_date"]
+        to_profile = log.index[~unchanged.to_numpy()]
+        LOG.info("risearch: %d of %d files have another date" % (len(to_profile), len(log)))
+
+    def fetch(file_id):
+        profile = DatastreamProfile(file_id, "EASY_FILE", fedora)
+        try:
+            profile.fetch()
+        except FedoraException as e:
+            return file_id, None, None, None, str(e), e.status_code
+        return file_id, profile.ds_checksum, profile.ds_creation_date, profile.ds_version_id, None, None
+
+    rows = list(utils.ordered_map(fetch, to_profile, max_workers))
+    if rows:
+        fetched = pd.DataFrame(rows, columns=["file_id"] + list(remote.columns)).set_index("file_id")
+        remote.loc[fetched.index] = fetched
+
+    failed = (log["checksum"] == "ERROR") | (log["checksum_error"].fillna("") != "")
+    error = remote["remote_error"].notna()
+    gone = remote["remote_status"] == 404
+    changed = remote["remote_checksum"] != log["checksum"]
+    newer = pd.to_datetime(remote["remote_creation_date"], utc=True, errors="coerce") != log_dates
+    state = np.select([gone, error, failed, changed, newer],
+                      ["gone", "error", "missing", "changed", "stale"], default="current")
+
+    result = pd.DataFrame({"local_path": log["local_path"], "checksum": log["checksum"],
+                           "creation_date": log["creation_date"]})
+    result = result.join(remote.drop(columns=["remote_error", "remote_status"]))
+    result["state"] = state
+    result = result.reset_index()
+    LOG.info("Drift of %s: %s" % (log_file, result["state"].value_counts().to_dict()))
+    return result
+
+
+def write_ids(drift, id_file, states=REDOWNLOAD_STATES):
+    """
+    Write the ids of the files in the given states, one per line, f.i. as `id_list` for
+    :meth:`fedora.worker.Worker.download_batch`.
+
+    :param drift: result of :func:`detect_drift`
+    :param id_file: path of the file
+    :param states: default: :data:`REDOWNLOAD_STATES`
+    :return: number of ids written
+    """
+    ids = drift.loc[drift["state"].isin(states), "file_id"]
+    with open(id_file, "w") as f:
+        f.writelines(file_id + "\n" for file_id in ids)
+    return len(ids)
+
+
+def _file_dates(fedora):
+    import pandas as pd
+
+    # csv with header "s,date", subjects like "info:fedora/easy-file:1"
+    dates = {}
+    for line in fedora.risearch(FILE_DATES_QUERY, limit=None).splitlines()[1:]:
+        if "," in line:
+            subject, date = line.strip().split(",", 1)
+            dates[subject.split("/", 1)[-1]] = date
+    return pd.Series(dates, dtype=object)
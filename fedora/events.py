@@ -0,0 +1,191 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+import datetime
+import json
+import logging
+import sys
+import threading
+import time
+
+from fedora import utils
+
+LOG = logging.getLogger(__name__)
+
+
+class ProgressReporter(object):
+    """
+    Keeps aggregate progress of a batch job and sends it to a sink from a background thread.
+
+    Workers call :meth:`started` when they take on a file and :meth:`finished` with the work-log row when they
+    are done. Every `interval` seconds a 'progress' event is sent to the sink; when the reporter stops, a final
+    'done' event. A file that failed or has a checksum error is also sent as an 'error' event right away.
+    Only counters are kept, so memory does not grow with the size of the job.
+
+    An event is a dict. Progress events have the keys:
+    event, time, elapsed, files, total, in_flight, errors, failed, bytes, files_per_second, mb_per_second,
+    eta_seconds and transfers (count per value of the work-log column 'transfer'). Rates are over the last
+    interval, the ETA is based on the average rate so far and is `None` if `total` is unknown.
+
+    :param sink: callable that gets each event, f.i. a :class:`JsonLinesSink` or :class:`ConsoleSink`,
+        default: `None` (counters are kept, nothing is sent)
+    :param total: number of files in the job, if known
+    :param interval: seconds between progress events, default: 1.0
+    """
+
+    def __init__(self, sink=None, total=None, interval=1.0):
+        self.sink = sink
+        self.total = total
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+        self.start_time = time.monotonic()
+        self.files = 0
+        self.in_flight = 0
+        self.errors = 0
+        self.failed = 0
+        self.bytes = 0
+        self.transfers = {}
+        self._last = (self.start_time, 0, 0)
+
+    def start(self):
+        self.start_time = time.monotonic()
+        self._last = (self.start_time, 0, 0)
+        if self.sink is not None:
+            self.thread = threading.Thread(target=self._run, name="progress-reporter", daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+        self._emit(self.snapshot("done"))
+
+    def started(self):
+        with self.lock:
+            self.in_flight += 1
+
+    def finished(self, row):
+        """
+        :param row: the work-log row of the file, see :data:`fedora.worklog.WORK_LOG_COLUMNS`
+        """
+        file_id, size, checksum_error, transfer = row[0], row[7], row[14], row[15]
+        with self.lock:
+            self.in_flight -= 1
+            self.files += 1
+            self.transfers[transfer] = self.transfers.get(transfer, 0) + 1
+            if transfer == "download" and isinstance(size, int):
+                self.bytes += size
+            if checksum_error == "ERROR":
+                self.failed += 1
+            if checksum_error != "":
+                self.errors += 1
+        if checksum_error != "":
+            self._emit({"event": "error", "time": utils.w3c_now(), "file_id": file_id,
+                        "error": "failed" if checksum_error == "ERROR" else "checksum",
+                        "checksum_error": checksum_error})
+
+    def snapshot(self, event="progress"):
+        """
+        :return: a progress event with the current counts
+        """
+        now = time.monotonic()
+        with self.lock:
+            last_time, last_files, last_bytes = self._last
+            self._last = (now, self.files, self.bytes)
+            elapsed = now - self.start_time
+            span = now - last_time
+            eta = None
+            if self.total is not None and self.files > 0:
+                eta = round((self.total - self.files) * elapsed / self.files, 1)
+            return {"event": event, "time": utils.w3c_now(), "elapsed": round(elapsed, 3),
+                    "files": self.files, "total": self.total, "in_flight": self.in_flight,
+                    "errors": self.errors, "failed": self.failed, "bytes": self.bytes,
+                    "files_per_second": round((self.files - last_files) / span, 2) if span > 0 else 0.0,
+                    "mb_per_second": round((self.bytes - last_bytes) / span / 1e6, 3) if span > 0 else 0.0,
+                    "eta_seconds": eta, "transfers": dict(self.transfers)}
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            self._emit(self.snapshot())
+
+    def _emit(self, event):
+        if self.sink is None:
+            return
+        try:
+            self.sink(event)
+        except Exception:
+            # a broken dashboard should not break the job
+            LOG.exception("Failed to report %s event" % event["event"])
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+class JsonLinesSink(object):
+    """
+    Writes events as JSON lines, to a file that is opened for appending or to an open text stream.
+
+    :param file: path of the file or a text stream
+    """
+
+    def __init__(self, file):
+        self.owned = isinstance(file, str)
+        self.stream = open(file, "a", encoding="utf-8") if self.owned else file
+        self.lock = threading.Lock()
+
+    def __call__(self, event):
+        with self.lock:
+            self.stream.write(json.dumps(event) + "\n")
+            self.stream.flush()
+
+    def close(self):
+        if self.owned:
+            self.stream.close()
+
+
+class ConsoleSink(object):
+    """
+    Shows progress events on one line of the terminal; error events are left to the log.
+
+    :param stream: where to write, default: `sys.stdout`
+    """
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+
+    def __call__(self, event):
+        if event["event"] == "error":
+            return
+        files = event["files"] if event["total"] is None else "%d/%d" % (event["files"], event["total"])
+        line = "\r files %s  %.1f files/s  %.2f MB/s  errors %d  in flight %d" \
+               % (files, event["files_per_second"], event["mb_per_second"], event["errors"], event["in_flight"])
+        if event["eta_seconds"] is not None:
+            line += "  ETA %s" % datetime.timedelta(seconds=int(event["eta_seconds"]))
+        self.stream.write(line + ("\n" if event["event"] == "done" else ""))
+        self.stream.flush()
+
+
+def reporter(reporting, total=None, interval=1.0):
+    """
+    Make a reporter for the `reporting` argument of batch jobs.
+
+    :param reporting: `True` for progress on the console, `False` or `None` for no reporting, a callable
+        that gets the events, or a :class:`ProgressReporter`, which is used as it is
+    :param total: number of files in the job, if known
+    :param interval: seconds between progress events
+    :return: a :class:`ProgressReporter`
+    """
+    if isinstance(reporting, ProgressReporter):
+        return reporting
+    if reporting is True:
+        sink = ConsoleSink()
+    elif reporting is False or reporting is None:
+        sink = None
+    else:
+        sink = reporting
+    return ProgressReporter(sink, total, interval)
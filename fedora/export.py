@@ -0,0 +1,243 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+import datetime
+import hashlib
+import io
+import json
+import logging
+import os
+import posixpath
+import tarfile
+import time
+
+from fedora import compression, utils
+from fedora.rest.api import FedoraException
+from fedora.rest.ds import DatastreamProfile, FileItemMetadata, EasyMetadata, EMD_LIST_FIELDS, EMD_DICT_FIELDS, \
+    dataset_file_ids, find_objects_iter
+from fedora.rest.foxml import DigitalObject
+
+LOG = logging.getLogger(__name__)
+
+BAGIT_TXT = "BagIt-Version: 1.0\nTag-File-Character-Encoding: UTF-8\n"
+
+
+class DigestReader(object):
+    """
+    Readable stream that computes digests of everything that is read through it.
+
+    :param stream: the stream to read from
+    :param algorithms: names of hashlib algorithms, f.i. ("sha1", "sha256")
+    """
+
+    def __init__(self, stream, algorithms):
+        self.stream = stream
+        self.digests = {name: hashlib.new(name) for name in algorithms}
+        self.count = 0
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        for digest in self.digests.values():
+            digest.update(data)
+        self.count += len(data)
+        return data
+
+    def hexdigests(self):
+        return {name: digest.hexdigest() for name, digest in self.digests.items()}
+
+
+def export_dataset(dataset_id, fedora, target, bag=True, algorithms=("sha1", "sha256"), name=None, max_workers=4,
+                   use_foxml=False):
+    """
+    Export all files of a dataset to a tar archive in one pass over the data.
+
+    The content of each file streams from Fedora straight into the archive, at `{name}/data/{path}` for a bag or
+    `{name}/{path}` otherwise, where path is the path in EASY_FILE_METADATA. Digests are computed while the
+    content passes and the SHA-1 is checked against the checksum of the datastream. For a bag, the payload
+    manifests, bagit.txt, bag-info.txt and a tag manifest are added at the end, from the digests computed in
+    flight. Only one file is in transit at a time; the metadata of the next files is fetched by `max_workers`
+    threads meanwhile.
+
+    A file whose SHA-1 does not match is already in the archive when the mismatch shows, so it stays there, but
+    it is left out of the payload manifests and listed as Checksum-Error in bag-info.txt: the bag does not
+    validate until the file is replaced or removed. A path that would end up outside the payload directory
+    raises a :class:`FedoraException`.
+
+    :param dataset_id: id of the dataset, f.i. "easy-dataset:5958"
+    :param fedora: the Fedora instance
+    :param target: path of the archive, compressed if it ends with '.gz' or '.tgz', or a writable binary stream
+    :param bag: lay out the archive as a BagIt bag, default: `True`
+    :param algorithms: hashlib algorithms of the payload manifests, default: ("sha1", "sha256")
+    :param name: name of the top directory in the archive, default: the dataset id with ':' replaced by '_'
+    :param max_workers: number of threads fetching metadata, default: 4
+    :param use_foxml: get the metadata of each file from one objectXML request, default: `False`
+    :return: list of dicts, one per file, with file_id, path, size, the digests and checksum_error
+    """
+    name = name or dataset_id.replace(":", "_")
+    algorithms = tuple(algorithms)
+    if "sha1" not in algorithms:
+        algorithms += ("sha1",)
+    if isinstance(target, str):
+        mode = "w:gz" if target.endswith((".gz", ".tgz")) else "w"
+        tar = tarfile.open(target, mode, format=tarfile.PAX_FORMAT)
+    else:
+        tar = tarfile.open(fileobj=target, mode="w|", format=tarfile.PAX_FORMAT)
+
+    def metadata(file_id):
+        if use_foxml:
+            obj = DigitalObject(file_id, fedora)
+            obj.fetch()
+            return file_id, obj.file_item_metadata(), obj.profile("EASY_FILE")
+        fmd = FileItemMetadata(file_id, fedora)
+        fmd.fetch()
+        profile = DatastreamProfile(file_id, "EASY_FILE", fedora)
+        profile.fetch()
+        return file_id, fmd, profile
+
+    report = []
+    with tar:
+        payload = "data/" if bag else ""
+        for file_id, fmd, profile in utils.ordered_map(metadata, dataset_file_ids(dataset_id, fedora), max_workers):
+            path = payload + _member_path(fmd.fmd_path or fmd.fmd_name or file_id, file_id)
+            with fedora.content_stream(file_id, "EASY_FILE") as (raw, headers):
+                info = tarfile.TarInfo(name + "/" + path)
+                info.size = int(headers.get("Content-Length", profile.ds_size))
+                info.mtime = time.time()
+                reader = DigestReader(raw, algorithms)
+                try:
+                    tar.addfile(info, reader)
+                except OSError as e:
+                    raise FedoraException("Incomplete content of %s: %s" % (file_id, e))
+            digests = reader.hexdigests()
+            checksum_error = ""
+            if profile.ds_checksum_type == "SHA-1" and digests["sha1"] != profile.ds_checksum:
+                checksum_error = digests["sha1"]
+                LOG.warning("Checksum error in %s: %s" % (file_id, path))
+            row = {"file_id": file_id, "path": path, "size": info.size, "checksum_error": checksum_error}
+            row.update(digests)
+            report.append(row)
+
+        if bag:
+            bag_info = "External-Identifier: %s\nBagging-Date: %s\nPayload-Oxum: %d.%d\n" \
+                       % (dataset_id, datetime.date.today().isoformat(), sum(row["size"] for row in report),
+                          len(report))
+            bag_info += "".join("Checksum-Error: %s\n" % _encode_path(row["path"])
+                                for row in report if row["checksum_error"])
+            tag_files = {"bagit.txt": BAGIT_TXT, "bag-info.txt": bag_info}
+            for algorithm in algorithms:
+                tag_files["manifest-%s.txt" % algorithm] = "".join(
+                    "%s  %s\n" % (row[algorithm], _encode_path(row["path"])) for row in report
+                    if not row["checksum_error"])
+            tag_files["tagmanifest-sha256.txt"] = "".join(
+                "%s  %s\n" % (hashlib.sha256(text.encode("utf-8")).hexdigest(), tag_name)
+                for tag_name, text in tag_files.items())
+            for tag_name, text in tag_files.items():
+                data = text.encode("utf-8")
+                info = tarfile.TarInfo(name + "/" + tag_name)
+                info.size = len(data)
+                info.mtime = time.time()
+                tar.addfile(info, io.BytesIO(data))
+    LOG.info("Exported %d files of %s" % (len(report), dataset_id))
+    return report
+
+
+def _member_path(path, file_id):
+    # the path of a file in the archive, relative to the payload directory, which it may not leave
+    member = posixpath.normpath(path)
+    if posixpath.isabs(member) or member == ".." or member.startswith("../"):
+        raise FedoraException("Path %s of %s is outside the dataset" % (path, file_id))
+    return member
+
+
+def _encode_path(path):
+    # BagIt: percent-encode %, CR and LF in manifest paths
+    return path.replace("%", "%25").replace("\r", "%0D").replace("\n", "%0A")
+
+
+def export_emd(target, fedora, dataset_ids=None, max_workers=8, batch_size=1000):
+    """
+    Export the EMD of many datasets, one compact record per dataset (see :meth:`fedora.rest.ds.EasyMetadata.record`),
+    in one job. EMD is fetched by `max_workers` threads and records are written in batches of `batch_size` as
+    they come, so memory does not grow with the number of datasets.
+
+    The format follows from the extension of `target`: '.parquet' or '.pq' gives Apache Parquet (needs the
+    package `pyarrow`), with a row group per batch; anything else gives JSON lines, compressed if the name ends
+    in '.zst' or '.gz'.
+
+    :param target: path of the export
+    :param fedora: the Fedora instance
+    :param dataset_ids: ids of the datasets, a list, generator or the name of a file with one id per line,
+        default: `None` (all datasets in the repository, found with findObjects)
+    :param max_workers: number of threads fetching EMD, default: 8
+    :param batch_size: number of records per batch, default: 1000
+    :return: dict with the number of records written and of datasets that failed
+    """
+    from fedora.worker import Worker
+
+    if dataset_ids is None:
+        dataset_ids = (fields["pid"] for fields in find_objects_iter("pid~easy-dataset:*", fedora, fields=("pid",)))
+
+    def fetch(dataset_id):
+        emd = EasyMetadata(dataset_id, fedora)
+        try:
+            emd.fetch()
+        except FedoraException:
+            LOG.exception("Failed to export EMD of %s" % dataset_id)
+            return None
+        return emd.record()
+
+    counts = {"records": 0, "failed": 0}
+    ext = os.path.splitext(target)[1].lower()
+    writer = _ParquetRecords(target) if ext in (".parquet", ".pq") else _JsonRecords(target)
+    batch = []
+    with writer:
+        for record in utils.ordered_map(fetch, Worker.id_iter(dataset_ids), max_workers):
+            if record is None:
+                counts["failed"] += 1
+                continue
+            batch.append(record)
+            if len(batch) >= batch_size:
+                writer.write(batch)
+                counts["records"] += len(batch)
+                batch = []
+        if batch:
+            writer.write(batch)
+            counts["records"] += len(batch)
+    LOG.info("Exported EMD to %s: %s" % (target, counts))
+    return counts
+
+
+class _JsonRecords(object):
+
+    def __init__(self, path):
+        self.file = compression.open_text(path, "wt")
+
+    def write(self, records):
+        self.file.write("".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.file.close()
+
+
+class _ParquetRecords(object):
+
+    def __init__(self, path):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.pa = pa
+        self.schema = pa.schema([("dataset_id", pa.string()), ("doi", pa.string()), ("urn", pa.string())]
+                                + [(field, pa.list_(pa.string())) for field in EMD_LIST_FIELDS]
+                                + [(field, pa.map_(pa.string(), pa.list_(pa.string()))) for field in EMD_DICT_FIELDS])
+        self.writer = pq.ParquetWriter(path, self.schema)
+
+    def write(self, records):
+        self.writer.write_table(self.pa.Table.from_pylist(records, schema=self.schema))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.writer.close()
@@ -0,0 +1,107 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+import logging
+import os
+import sqlite3
+import threading
+
+from fedora import utils
+
+LOG = logging.getLogger(__name__)
+
+
+class FingerprintCache(object):
+    """
+    Remembers the SHA-1 of local files, so that unchanged files need not be hashed again.
+
+    A file is known by its absolute path; its fingerprint is (size, mtime_ns, sha1). As long as size and
+    modification time of the file are the same as when it was hashed, :meth:`sha1` returns the remembered
+    checksum. Optionally the id of the Fedora object the file was downloaded from is remembered too.
+
+    The fingerprints are kept in an SQLite database in WAL mode. Every change is committed at once, so the
+    write lock is only held for the moment of a write and several processes can share the database, like the
+    shards of :func:`fedora.runner.download_sharded`. One instance can be used by several threads.
+
+    :param path: path of the database
+    :param timeout: seconds to wait for the write lock of another process, default: 30
+    """
+
+    def __init__(self, path, timeout=30):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        # autocommit: a transaction per statement, cheap with WAL and synchronous=NORMAL
+        self.connection = sqlite3.connect(path, timeout=timeout, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS fingerprints "
+                                "(path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, sha1 TEXT, file_id TEXT)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS fingerprints_file_id ON fingerprints (file_id)")
+
+    def get(self, local_path):
+        """
+        :param local_path: the file
+        :return: the remembered SHA-1 of the file, or `None` if the file is unknown, changed or missing
+        """
+        try:
+            stat = os.stat(local_path)
+        except FileNotFoundError:
+            return None
+        with self.lock:
+            row = self.connection.execute("SELECT size, mtime_ns, sha1 FROM fingerprints WHERE path = ?",
+                                          (os.path.abspath(local_path),)).fetchone()
+        if row is None or row[0] != stat.st_size or row[1] != stat.st_mtime_ns:
+            return None
+        return row[2]
+
+    def put(self, local_path, sha1, file_id=None):
+        """
+        Remember the SHA-1 of a file, f.i. right after it was downloaded and verified.
+
+        :param local_path: the file
+        :param sha1: SHA-1 of the file as it is now
+        :param file_id: id of the Fedora object the file was downloaded from, default: `None`
+        """
+        stat = os.stat(local_path)
+        with self.lock:
+            self.connection.execute("INSERT OR REPLACE INTO fingerprints (path, size, mtime_ns, sha1, file_id) "
+                                    "VALUES (?, ?, ?, ?, ?)",
+                                    (os.path.abspath(local_path), stat.st_size, stat.st_mtime_ns, sha1, file_id))
+
+    def local_paths(self, file_id):
+        """
+        :param file_id: id of a Fedora object
+        :return: list of paths of files that were downloaded from this object
+        """
+        with self.lock:
+            rows = self.connection.execute("SELECT path FROM fingerprints WHERE file_id = ?", (file_id,)).fetchall()
+        return [row[0] for row in rows]
+
+    def sha1(self, local_path, file_id=None):
+        """
+        The SHA-1 of a file, from the cache if the file did not change, otherwise computed and remembered.
+
+        :param local_path: the file
+        :param file_id: id of the Fedora object the file was downloaded from, remembered with a computed SHA-1
+        :return: SHA-1 of the file
+        """
+        sha1 = self.get(local_path)
+        with self.lock:
+            if sha1 is not None:
+                self.hits += 1
+                return sha1
+            self.misses += 1
+        sha1 = utils.sha1_for_file(local_path)
+        self.put(local_path, sha1, file_id)
+        return sha1
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
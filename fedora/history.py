@@ -0,0 +1,177 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+import difflib
+import logging
+import os
+import sqlite3
+
+from fedora import utils
+from fedora.compression import DEFAULT_COMPRESSION, SUFFIXES, read_text, write_text
+from fedora.rest.api import FedoraException
+from fedora.rest.ds import DatastreamHistory
+
+LOG = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS versions (
+    pid TEXT, ds_id TEXT, version_id TEXT, created TEXT, label TEXT, state TEXT, mime TEXT, size INTEGER,
+    checksum_type TEXT, checksum TEXT, local_path TEXT, previous_version_id TEXT, diff TEXT, harvested TEXT,
+    PRIMARY KEY (pid, ds_id, version_id));
+CREATE INDEX IF NOT EXISTS versions_created ON versions (pid, ds_id, created);
+"""
+
+COLUMNS = ["pid", "ds_id", "version_id", "created", "label", "state", "mime", "size", "checksum_type", "checksum",
+           "local_path", "previous_version_id", "diff", "harvested"]
+
+
+class HistoryHarvester(object):
+    """
+    Harvests all versions of datastreams, f.i. of EMD and AMD for an audit.
+
+    For each datastream the history is fetched with one request. Only versions that are not stored yet are read,
+    with asOfDateTime set to their creation date. The content of each version is stored compressed as
+    `{root}/{pid with ':' replaced by '_'}/{ds_id}/{version_id}.zst` (or `.gz`); profiles are indexed in
+    `{root}/history.db`.
+    When a version is stored, a unified diff with the version before it is computed and kept in the index; the
+    previous version is read from disk, so earlier versions are never fetched again. Example::
+
+        harvester = HistoryHarvester(fedora, "emd-history")
+        harvester.harvest(["easy-dataset:1", "easy-dataset:2"], ds_ids=["EMD", "AMD"])
+        for version in harvester.versions("easy-dataset:1", "EMD"):
+            print(version["version_id"], version["created"])
+            print(version["diff"])
+
+    Histories are fetched by `max_workers` threads; files are written by these threads, the index by the calling
+    thread.
+
+    :param fedora: the Fedora instance
+    :param root: directory of the stored versions
+    :param max_workers: number of threads fetching histories, default: 4
+    :param compression: compression of new files, 'zstd' or 'gzip', default: 'zstd' if the package zstandard
+        is installed, 'gzip' otherwise. Files stored earlier with the other compression are still read.
+    """
+
+    def __init__(self, fedora, root="fedora-history", max_workers=4, compression=DEFAULT_COMPRESSION):
+        if compression not in SUFFIXES:
+            raise ValueError("Unknown compression: %s" % compression)
+        self.fedora = fedora
+        self.root = os.path.abspath(root)
+        self.max_workers = max_workers
+        self.compression = compression
+        os.makedirs(self.root, exist_ok=True)
+        self.connection = sqlite3.connect(os.path.join(self.root, "history.db"))
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(SCHEMA)
+        self.connection.commit()
+
+    def harvest(self, object_ids, ds_ids=("EMD", "AMD")):
+        """
+        Harvest the versions of datastreams that are not stored yet.
+
+        :param object_ids: ids of the digital objects
+        :param ds_ids: ids of the datastreams of each object, default: ("EMD", "AMD")
+        :return: number of versions that were stored
+        """
+        count = 0
+        for pid, ds_id, rows in self.harvest_iter(object_ids, ds_ids):
+            count += len(rows)
+        return count
+
+    def harvest_iter(self, object_ids, ds_ids=("EMD", "AMD")):
+        """
+        Like :meth:`harvest`, but yields (pid, ds_id, rows of the new versions) for each datastream as soon as it
+        is done. Nothing is harvested unless the iterator is consumed.
+        """
+        def tasks():
+            for pid in object_ids:
+                for ds_id in ds_ids:
+                    known = self._known(pid, ds_id)
+                    yield pid, ds_id, known
+
+        def fetch(task):
+            try:
+                return self._fetch(*task)
+            except FedoraException:
+                LOG.exception("Failed to harvest history of %s/%s" % (task[0], task[1]))
+                return task[0], task[1], []
+
+        for pid, ds_id, rows in utils.ordered_map(fetch, tasks(), self.max_workers):
+            with self.connection:
+                self.connection.executemany("INSERT OR REPLACE INTO versions (%s) VALUES (%s)"
+                                            % (", ".join(COLUMNS), ", ".join("?" * len(COLUMNS))),
+                                            [[row[c] for c in COLUMNS] for row in rows])
+            yield pid, ds_id, rows
+
+    def versions(self, pid, ds_id):
+        """
+        :return: list of the stored versions of a datastream, oldest first
+        """
+        return self.connection.execute("SELECT * FROM versions WHERE pid = ? AND ds_id = ? ORDER BY created",
+                                       (pid, ds_id)).fetchall()
+
+    def content(self, pid, ds_id, version_id):
+        """
+        :return: the stored content of a version
+        """
+        return read_text(self.path(pid, ds_id, version_id))
+
+    def path(self, pid, ds_id, version_id):
+        """
+        :return: the path of the stored version, or where a new version is stored
+        """
+        base = os.path.join(self.root, pid.replace(":", "_"), ds_id, version_id)
+        for suffix in SUFFIXES.values():
+            if os.path.exists(base + suffix):
+                return base + suffix
+        return base + SUFFIXES[self.compression]
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _known(self, pid, ds_id):
+        return {row[0] for row in self.connection.execute(
+            "SELECT version_id FROM versions WHERE pid = ? AND ds_id = ?", (pid, ds_id))}
+
+    def _fetch(self, pid, ds_id, known):
+        history = DatastreamHistory(pid, ds_id, self.fedora)
+        history.fetch()
+        rows = []
+        previous = None
+        previous_content = None
+        for version in history.versions:
+            local_path = self.path(pid, ds_id, version.ds_version_id)
+            if version.ds_version_id in known:
+                previous = version
+                previous_content = None
+                continue
+            content = history.content(version)
+            self._write(local_path, content)
+            diff = None
+            if previous is not None:
+                if previous_content is None:
+                    previous_content = read_text(self.path(pid, ds_id, previous.ds_version_id))
+                diff = "".join(difflib.unified_diff(previous_content.splitlines(True), content.splitlines(True),
+                                                    previous.ds_version_id, version.ds_version_id))
+            rows.append({"pid": pid, "ds_id": ds_id, "version_id": version.ds_version_id,
+                         "created": version.ds_creation_date, "label": version.ds_label, "state": version.ds_state,
+                         "mime": version.ds_mime, "size": version.ds_size,
+                         "checksum_type": version.ds_checksum_type, "checksum": version.ds_checksum,
+                         "local_path": local_path,
+                         "previous_version_id": None if previous is None else previous.ds_version_id,
+                         "diff": diff, "harvested": utils.w3c_now()})
+            previous = version
+            previous_content = content
+        LOG.debug("%s/%s: %d versions, %d new" % (pid, ds_id, len(history.versions), len(rows)))
+        return pid, ds_id, rows
+
+    @staticmethod
+    def _write(local_path, content):
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+        write_text(local_path, content)
@@ -0,0 +1,124 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+import hashlib
+import math
+import re
+
+# pids like 'easy-file:1234': namespace and number; 'easy-file:01234' is another pid, so it does not match
+NUMERIC_PID = re.compile(r"^(.+):(0|[1-9][0-9]*)$")
+
+# numbers are kept in chunks of this many bits, 1 KB each
+CHUNK_BITS = 1 << 13
+
+# chunks with at most this many numbers are kept as a set of offsets, a bit array would be bigger
+SPARSE_LIMIT = 32
+
+
+class PidBitmap(object):
+    """
+    Set of pids that keeps one bit per number for pids with a numeric suffix, like 'easy-file:1234'. The bits are
+    kept in chunks of :data:`CHUNK_BITS` per namespace, only for ranges of numbers that occur, and a chunk with
+    few numbers is a small set until it fills up. Ten million file pids with consecutive numbers take about
+    1.25 MB; a few pids with huge numbers take no more than a set of them. Other pids, including those with
+    leading zeros in the number, are kept in a plain set.
+    """
+
+    def __init__(self):
+        self.chunks = {}
+        self.others = set()
+        self.count = 0
+
+    def add(self, pid):
+        """
+        :param pid: the pid
+        :return: `True` if the pid was not in the set
+        """
+        match = NUMERIC_PID.match(pid)
+        if match is None:
+            if pid in self.others:
+                return False
+            self.others.add(pid)
+            self.count += 1
+            return True
+        number = int(match.group(2))
+        key, offset = (match.group(1), number // CHUNK_BITS), number % CHUNK_BITS
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            self.chunks[key] = {offset}
+        elif isinstance(chunk, set):
+            if offset in chunk:
+                return False
+            chunk.add(offset)
+            if len(chunk) > SPARSE_LIMIT:
+                bits = bytearray(CHUNK_BITS // 8)
+                for o in chunk:
+                    bits[o >> 3] |= 1 << (o & 7)
+                self.chunks[key] = bits
+        else:
+            mask = 1 << (offset & 7)
+            if chunk[offset >> 3] & mask:
+                return False
+            chunk[offset >> 3] |= mask
+        self.count += 1
+        return True
+
+    def __contains__(self, pid):
+        match = NUMERIC_PID.match(pid)
+        if match is None:
+            return pid in self.others
+        number = int(match.group(2))
+        chunk = self.chunks.get((match.group(1), number // CHUNK_BITS))
+        offset = number % CHUNK_BITS
+        if chunk is None:
+            return False
+        if isinstance(chunk, set):
+            return offset in chunk
+        return chunk[offset >> 3] & (1 << (offset & 7)) != 0
+
+    def __len__(self):
+        return self.count
+
+
+class BloomFilter(object):
+    """
+    Set of strings in a fixed amount of memory, for ids without numeric suffix or with very sparse numbers.
+    It may say that an id is in the set while it is not, with probability `error_rate` when holding `capacity`
+    ids; it never says an id is not in the set when it is. Deduplicating with a Bloom filter may therefore
+    skip a few ids that were not seen before. Ten million ids at error rate 0.001 take about 18 MB.
+
+    :param capacity: expected number of ids
+    :param error_rate: chance of a false positive at `capacity`, default: 0.001
+    """
+
+    def __init__(self, capacity, error_rate=0.001):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _indexes(self, item):
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, item):
+        """
+        :param item: the id
+        :return: `True` if the id was (certainly) not in the set
+        """
+        new = False
+        for index in self._indexes(item):
+            mask = 1 << (index & 7)
+            if not self.bits[index >> 3] & mask:
+                self.bits[index >> 3] |= mask
+                new = True
+        if new:
+            self.count += 1
+        return new
+
+    def __contains__(self, item):
+        return all(self.bits[index >> 3] & (1 << (index & 7)) for index in self._indexes(item))
+
+    def __len__(self):
+        return self.count
@@ -0,0 +1,250 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+import logging
+import sqlite3
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+
+from fedora import utils
+from fedora.rest.api import FedoraException
+from fedora.rest.ds import DatastreamProfile, FileItemMetadata, AdministrativeMetadata, RelsExt, \
+    find_objects_iter
+
+LOG = logging.getLogger(__name__)
+
+SUBORDINATE_TO = "http://dans.knaw.nl/ontologies/relations#isSubordinateTo"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS objects (
+    pid TEXT PRIMARY KEY, label TEXT, state TEXT, owner_id TEXT, created TEXT, last_modified TEXT, harvested TEXT);
+CREATE INDEX IF NOT EXISTS objects_last_modified ON objects (last_modified);
+
+CREATE TABLE IF NOT EXISTS datastreams (
+    pid TEXT, ds_id TEXT, label TEXT, version_id TEXT, created TEXT, state TEXT, mime TEXT, format_uri TEXT,
+    control_group TEXT, size INTEGER, versionable INTEGER, location TEXT, checksum_type TEXT, checksum TEXT,
+    PRIMARY KEY (pid, ds_id));
+CREATE INDEX IF NOT EXISTS datastreams_checksum ON datastreams (checksum);
+
+CREATE TABLE IF NOT EXISTS file_metadata (
+    pid TEXT PRIMARY KEY, sid TEXT, name TEXT, parent_sid TEXT, dataset_sid TEXT, path TEXT, mime_type TEXT,
+    size INTEGER, creator_role TEXT, visible_to TEXT, accessible_to TEXT);
+CREATE INDEX IF NOT EXISTS file_metadata_dataset ON file_metadata (dataset_sid, accessible_to);
+CREATE INDEX IF NOT EXISTS file_metadata_parent ON file_metadata (parent_sid);
+
+CREATE TABLE IF NOT EXISTS amd (
+    pid TEXT PRIMARY KEY, dataset_state TEXT, previous_state TEXT, last_state_change TEXT, depositor_id TEXT);
+CREATE INDEX IF NOT EXISTS amd_depositor ON amd (depositor_id);
+
+CREATE TABLE IF NOT EXISTS relationships (subject TEXT, predicate TEXT, object TEXT);
+CREATE INDEX IF NOT EXISTS relationships_subject ON relationships (subject);
+CREATE INDEX IF NOT EXISTS relationships_object ON relationships (predicate, object);
+
+CREATE TABLE IF NOT EXISTS harvests (query TEXT PRIMARY KEY, last_modified TEXT, harvested TEXT);
+"""
+
+
+class MetadataMirror(object):
+    """
+    Local mirror of repository metadata in an SQLite database.
+
+    A harvest pages through the results of a findObjects query and, for every object that is new or has a
+    lastModifiedDate later than the one in the mirror, stores the datastream profiles, the EASY_FILE_METADATA of
+    files, the AMD of datasets and the relations in RELS-EXT. Per query the latest lastModifiedDate seen is kept,
+    so the next harvest of the same query only asks for objects modified since; if objects failed to harvest, the
+    oldest lastModifiedDate among them is kept instead, so they are harvested again. Example::
+
+        mirror = MetadataMirror(fedora, "mirror.db")
+        mirror.harvest("pid~easy-file:*")
+        mirror.harvest("pid~easy-dataset:*")
+        for row in mirror.files("easy-dataset:5958", accessible_to="ANONYMOUS"):
+            print(row["pid"], row["path"])
+
+    Objects are fetched by `max_workers` threads; database writes are done by the calling thread.
+
+    :param fedora: the Fedora instance
+    :param db_file: path of the database
+    :param max_workers: number of threads fetching objects, default: 4
+    """
+
+    def __init__(self, fedora, db_file="fedora-mirror.db", max_workers=4):
+        self.fedora = fedora
+        self.db_file = db_file
+        self.max_workers = max_workers
+        self.connection = sqlite3.connect(db_file)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(SCHEMA)
+        self.connection.commit()
+
+    def harvest(self, query, full=False, batch_size=100):
+        """
+        Harvest the objects found with a findObjects query.
+
+        :param query: findObjects query, f.i. "pid~easy-file:*"
+        :param full: ignore the results of previous harvests of this query, default: `False`
+        :param batch_size: number of objects per transaction
+        :return: number of objects that were (re)harvested
+        """
+        mark = None if full else self._mark(query)
+        search = query if mark is None else query + " mDate>=" + mark
+        LOG.info("Harvesting '%s'" % search)
+        count = 0
+        newest = mark
+        failed = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            batch = []
+            for fields in find_objects_iter(search, self.fedora):
+                if newest is None or (fields["mDate"] or "") > newest:
+                    newest = fields["mDate"]
+                if not full and self._is_current(fields["pid"], fields["mDate"]):
+                    continue
+                batch.append(fields)
+                if len(batch) >= batch_size:
+                    count += self._store(batch, executor.map(self._fetch, batch), failed)
+                    batch = []
+            count += self._store(batch, executor.map(self._fetch, batch), failed)
+        if failed:
+            # the next harvest starts at the oldest object that failed, so it is fetched again
+            oldest = min(fields["mDate"] or "" for fields in failed)
+            LOG.warning("Failed to harvest %d objects, the next harvest of '%s' starts at %s"
+                        % (len(failed), query, oldest))
+            newest = min(newest, oldest) if oldest else mark
+        if newest is not None:
+            self.connection.execute("INSERT OR REPLACE INTO harvests (query, last_modified, harvested) "
+                                    "VALUES (?, ?, ?)", (query, newest, utils.w3c_now()))
+            self.connection.commit()
+        LOG.info("Harvested %d objects for '%s'" % (count, query))
+        return count
+
+    def files(self, dataset_id=None, accessible_to=None, visible_to=None):
+        """
+        Query file metadata.
+
+        :param dataset_id: only files of this dataset
+        :param accessible_to: only files with this accessibleTo, f.i. "ANONYMOUS"
+        :param visible_to: only files with this visibleTo
+        :return: list of rows, with the columns of file_metadata and of the EASY_FILE datastream
+        """
+        conditions = []
+        params = []
+        for column, value in (("f.dataset_sid", dataset_id), ("f.accessible_to", accessible_to),
+                              ("f.visible_to", visible_to)):
+            if value is not None:
+                conditions.append(column + " = ?")
+                params.append(value)
+        sql = "SELECT f.*, d.size AS ds_size, d.checksum_type, d.checksum, d.created AS ds_created " \
+              "FROM file_metadata f LEFT JOIN datastreams d ON d.pid = f.pid AND d.ds_id = 'EASY_FILE'"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        return self.query(sql + " ORDER BY f.path", params)
+
+    def datastream(self, pid, ds_id):
+        """
+        :return: the mirrored profile of a datastream, or `None`
+        """
+        rows = self.query("SELECT * FROM datastreams WHERE pid = ? AND ds_id = ?", (pid, ds_id))
+        return rows[0] if rows else None
+
+    def query(self, sql, params=()):
+        """
+        Run any query on the mirror.
+
+        :return: list of :class:`sqlite3.Row`
+        """
+        return self.connection.execute(sql, params).fetchall()
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _mark(self, query):
+        row = self.connection.execute("SELECT last_modified FROM harvests WHERE query = ?", (query,)).fetchone()
+        return row[0] if row else None
+
+    def _is_current(self, pid, last_modified):
+        row = self.connection.execute("SELECT last_modified FROM objects WHERE pid = ?", (pid,)).fetchone()
+        return row is not None and row[0] == last_modified
+
+    def _fetch(self, fields):
+        """
+        Fetch the metadata of one object. Runs in a worker thread, does not touch the database.
+        """
+        pid = fields["pid"]
+        harvest = {"fields": fields, "profiles": [], "fmd": None, "amd": None, "triples": []}
+        try:
+            root = ET.fromstring(self.fedora.list_datastreams(pid, profiles=True))
+            for element in root:
+                if element.tag.endswith("datastreamProfile"):
+                    profile = DatastreamProfile(pid, element.attrib.get("dsID"), self.fedora)
+                    profile.from_element(element)
+                    harvest["profiles"].append(profile)
+                elif "dsid" in element.attrib:
+                    # server does not support profiles in the listing
+                    profile = DatastreamProfile(pid, element.attrib["dsid"], self.fedora)
+                    profile.fetch()
+                    harvest["profiles"].append(profile)
+            ds_ids = {profile.ds_id for profile in harvest["profiles"]}
+            if "EASY_FILE_METADATA" in ds_ids:
+                harvest["fmd"] = FileItemMetadata(pid, self.fedora)
+                harvest["fmd"].fetch()
+            if "AMD" in ds_ids and pid.startswith("easy-dataset"):
+                harvest["amd"] = AdministrativeMetadata(pid, self.fedora)
+                harvest["amd"].fetch()
+            if "RELS-EXT" in ds_ids:
+                rex = RelsExt(pid, self.fedora)
+                rex.fetch()
+                harvest["triples"] = [(str(s), str(p), str(o)) for s, p, o in rex.get_graph()]
+        except FedoraException:
+            LOG.exception("Failed to harvest %s" % pid)
+            return None
+        return harvest
+
+    def _store(self, batch, harvests, failed):
+        count = 0
+        with self.connection:
+            for fields, harvest in zip(batch, harvests):
+                if harvest is None:
+                    failed.append(fields)
+                    continue
+                self._store_object(harvest)
+                count += 1
+        return count
+
+    def _store_object(self, harvest):
+        fields = harvest["fields"]
+        pid = fields["pid"]
+        execute = self.connection.execute
+        for table in ("datastreams", "file_metadata", "amd"):
+            execute("DELETE FROM %s WHERE pid = ?" % table, (pid,))
+        execute("DELETE FROM relationships WHERE subject = ?", ("info:fedora/" + pid,))
+
+        for p in harvest["profiles"]:
+            execute("INSERT INTO datastreams VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (pid, p.ds_id, p.ds_label, p.ds_version_id, p.ds_creation_date, p.ds_state, p.ds_mime,
+                     p.ds_format_uri, p.ds_control_group, p.ds_size, p.ds_versionable, p.ds_location,
+                     p.ds_checksum_type, p.ds_checksum))
+        self.connection.executemany("INSERT INTO relationships VALUES (?, ?, ?)", harvest["triples"])
+        fmd = harvest["fmd"]
+        if fmd is not None:
+            dataset_sid = fmd.fmd_dataset_sid
+            if not dataset_sid:
+                # as of late the dataset id is not in FileItemMetadata anymore
+                dataset_sid = next((o.split("/")[-1] for s, p, o in harvest["triples"] if p == SUBORDINATE_TO),
+                                   None)
+            execute("INSERT INTO file_metadata VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (pid, fmd.fmd_sid, fmd.fmd_name, fmd.fmd_parent_sid, dataset_sid, fmd.fmd_path,
+                     fmd.fmd_mime_type, fmd.fmd_size, fmd.fmd_creator_role, fmd.fmd_visible_to,
+                     fmd.fmd_accessible_to))
+        amd = harvest["amd"]
+        if amd is not None:
+            execute("INSERT INTO amd VALUES (?, ?, ?, ?, ?)",
+                    (pid, amd.amd_dataset_state, amd.amd_previous_state, amd.amd_last_state_change,
+                     amd.amd_depositor_id))
+        execute("INSERT OR REPLACE INTO objects VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (pid, fields.get("label"), fields.get("state"), fields.get("ownerId"), fields.get("cDate"),
+                 fields.get("mDate"), utils.w3c_now()))
@@ -0,0 +1,178 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+import csv
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from fedora import utils, worklog
+
+LOG = logging.getLogger(__name__)
+
+REPORT_COLUMNS = ["kind", "local_path", "file_id", "expected_size", "actual_size", "expected_checksum",
+                  "actual_checksum"]
+
+
+class ReconcileReport(object):
+    """
+    Differences between a download tree and its work-log. Each list holds dicts with the keys of
+    :data:`REPORT_COLUMNS`, except kind.
+
+    - orphans: files in the tree that are not in the work-log
+    - missing: files in the work-log that are not in the tree
+    - size_mismatches: files with another size than in the work-log
+    - checksum_mismatches: files with another SHA-1 than in the work-log, only when verified
+    - partial: '.part' files left by interrupted downloads
+    """
+
+    def __init__(self):
+        self.orphans = []
+        self.missing = []
+        self.size_mismatches = []
+        self.checksum_mismatches = []
+        self.partial = []
+        self.files_scanned = 0
+        self.rows = 0
+
+    def kinds(self):
+        return {"orphan": self.orphans, "missing": self.missing, "size_mismatch": self.size_mismatches,
+                "checksum_mismatch": self.checksum_mismatches, "partial": self.partial}
+
+    def summary(self):
+        """
+        :return: dict with the number of files scanned, work-log rows and differences of each kind
+        """
+        summary = {"files_scanned": self.files_scanned, "rows": self.rows}
+        summary.update((kind, len(items)) for kind, items in self.kinds().items())
+        return summary
+
+    def is_clean(self):
+        return not any(self.kinds().values())
+
+    def write(self, path, dialect=utils.RFC4180):
+        """
+        Write all differences to a csv file with the columns :data:`REPORT_COLUMNS`.
+        """
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f, dialect=dialect)
+            writer.writerow(REPORT_COLUMNS)
+            for kind, items in self.kinds().items():
+                for item in items:
+                    writer.writerow([kind] + [item.get(column, "") for column in REPORT_COLUMNS[1:]])
+
+
+def scan_tree(root, max_workers=8):
+    """
+    List all files under `root` with their size. Directories are read with :func:`os.scandir` by `max_workers`
+    threads, each directory as soon as it is found; symbolic links are not followed.
+
+    :param root: the directory to scan
+    :param max_workers: number of threads, default: 8
+    :return: dict with the absolute path and size of each file
+    """
+    files = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = {executor.submit(_scan_dir, os.path.abspath(root))}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                found, directories = future.result()
+                files.update(found)
+                pending.update(executor.submit(_scan_dir, directory) for directory in directories)
+    return files
+
+
+def _scan_dir(directory):
+    files = []
+    directories = []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        directories.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        files.append((entry.path, entry.stat(follow_symlinks=False).st_size))
+                except OSError:
+                    LOG.warning("Cannot read %s" % entry.path)
+    except OSError:
+        LOG.warning("Cannot read directory %s" % directory)
+    return files, directories
+
+
+def reconcile(log_file, root="worker-downloads", max_workers=8, verify=False, fmt=None, dialect=csv.excel,
+              base_dir=None):
+    """
+    Compare a download tree with its work-log. Only sizes are compared, from one scan of the tree and one read
+    of the work-log, joined on the local path; files are hashed only if `verify` is set. Rows of failed
+    downloads are ignored; when a local path is in the work-log more than once, the last row counts.
+    Work-log rows with a local path outside `root` are only checked for existence. A relative local path in the
+    work-log is taken relative to `base_dir`, not to the current working directory.
+
+    :param log_file: path of the work-log, in any of the :data:`fedora.worklog.WORK_LOG_FORMATS`
+    :param root: the download tree, default: 'worker-downloads'
+    :param max_workers: number of threads scanning the tree and hashing files, default: 8
+    :param verify: compute the SHA-1 of files with the right size and compare it with the work-log,
+        default: `False`
+    :param fmt: format of the work-log, default: derived from the extension of `log_file`
+    :param dialect: csv dialect of a csv work-log
+    :param base_dir: directory of relative local paths in the work-log, default: the directory of `log_file`,
+        which is the working directory of a run with the default `log_file`
+    :return: a :class:`ReconcileReport`
+    """
+    report = ReconcileReport()
+    root = os.path.abspath(root)
+    base_dir = os.path.abspath(base_dir if base_dir is not None else os.path.dirname(os.path.abspath(log_file)))
+    on_disk = scan_tree(root, max_workers)
+    report.files_scanned = len(on_disk)
+
+    expected = {}
+    columns = worklog.WORK_LOG_COLUMNS
+    file_id_col, local_path_col, size_col, checksum_type_col, checksum_col, error_col = \
+        (columns.index(c) for c in ("file_id", "local_path", "size", "checksum_type", "checksum", "checksum_error"))
+    for row in worklog.read_work_log(log_file, fmt, dialect):
+        report.rows += 1
+        if row[local_path_col] in ("ERROR", "", None) or row[error_col] == "ERROR":
+            continue
+        expected[os.path.abspath(os.path.join(base_dir, row[local_path_col]))] = row
+
+    to_verify = []
+    for local_path, row in expected.items():
+        size = on_disk.get(local_path)
+        if size is None and not local_path.startswith(root + os.sep) and os.path.isfile(local_path):
+            size = os.path.getsize(local_path)
+        item = {"local_path": local_path, "file_id": row[file_id_col], "expected_size": row[size_col]}
+        if size is None:
+            report.missing.append(item)
+            continue
+        item["actual_size"] = size
+        if str(size) != str(row[size_col]):
+            report.size_mismatches.append(item)
+        elif verify and row[checksum_type_col] == "SHA-1":
+            item["expected_checksum"] = row[checksum_col]
+            to_verify.append(item)
+
+    for local_path, size in on_disk.items():
+        if local_path in expected:
+            continue
+        item = {"local_path": local_path, "actual_size": size}
+        if local_path.endswith(".part"):
+            report.partial.append(item)
+        else:
+            report.orphans.append(item)
+
+    def hash_file(item):
+        try:
+            item["actual_checksum"] = utils.sha1_for_file(item["local_path"])
+        except OSError:
+            item["actual_checksum"] = "ERROR"
+        return item
+
+    for item in utils.ordered_map(hash_file, to_verify, max_workers):
+        if item["actual_checksum"] != item["expected_checksum"]:
+            report.checksum_mismatches.append(item)
+
+    for items in report.kinds().values():
+        items.sort(key=lambda i: i["local_path"])
+    LOG.info("Reconciled %s with %s: %s" % (root, log_file, report.summary()))
+    return report
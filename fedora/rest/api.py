@@ -1,59 +1,240 @@
 #! /usr/bin/env python3
 # -*- coding: utf-8 -*-
+import contextlib
+import functools
 import logging
 import os
 import re
+import threading
 import urllib.parse
 
 import requests
 
+from fedora.rest.endpoints import EndpointPool, UNAVAILABLE_CODES
+from fedora.rest.limiter import Unlimited
+from fedora.rest.transport import RequestsTransport, HttpxTransport
+
 LOG = logging.getLogger(__name__)
 CFG_FILE = "src/fedora.cfg"
 
 FEDORA_INSTANCE = None
 
+UNLIMITED = Unlimited()
 
-class FedoraException(RuntimeError):
-    pass
+# buffer size for streaming content
+STREAM_BUFFER_SIZE = 1 << 20
 
+# content of datastreams is transferred as is, so that Content-Length and Range requests count bytes of the content
+IDENTITY = {"Accept-Encoding": "identity"}
 
-class Fedora(object):
+
+class FedoraException(RuntimeError):
     """
+    :param message: what went wrong
+    :param status_code: http status code of the error response of the server, if any
+    """
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+    @classmethod
+    def from_response(cls, response):
+        """
+        :param response: the error response of the server
+        """
+        return cls("Error response from Fedora: %d %s" % (response.status_code, response.reason),
+                   response.status_code)
 
 
+class Fedora(object):
+    """
+    Client for the Fedora Commons 3.x Rest API.
+
+    Calls to :meth:`download`, :meth:`datastream` and :meth:`risearch` go through the `limiter`. Give an
+    :class:`fedora.rest.limiter.AdaptiveLimiter` if several threads share this instance and the server
+    should be protected against too many concurrent requests.
+
+    Read replicas of the server can be given as `replicas`. Read requests (getting objects and datastreams,
+    findObjects, listDatastreams, risearch) then go to the primary server or one of the replicas, whichever has
+    the least outstanding requests and is not down. A read request that fails on one server is tried on the
+    next. Write requests always go to the primary server. See :class:`fedora.rest.endpoints.EndpointPool`.
+
+    :param host: protocol + host
+    :param port: port
+    :param username: username
+    :param password: password
+    :param limiter: limiter on concurrent requests, default: `None` (no limit)
+    :param replicas: read replicas, a list of "host:port" strings or (host, port) tuples, default: `None`
+    :param probe: when to check the connection to the server: 'eager' in the constructor, 'lazy' just before the
+        first request, 'off' never, default: 'eager'
+    :param transport: how requests are sent: 'requests' (HTTP/1.1, the default), 'http2' (multiplexed over
+        HTTP/2, needs httpx) or a transport instance, f.i. a configured
+        :class:`fedora.rest.transport.HttpxTransport`. See :mod:`fedora.rest.transport`.
+    :param compression: ask for compressed responses (zstd or gzip) from the text endpoints: FOXML, datastream
+        xml, findObjects, listDatastreams and risearch; they are decompressed while they stream in. The content
+        of datastreams is always transferred uncompressed. Default: `True`
     """
 
-    def __init__(self, host, port, username, password):
-        if not host.startswith("http"):
-            host = "http://" + host
-        self.url = host + ":" + str(port) + "/fedora"
-        self.session = requests.Session()
-        self.session.headers = {'User-Agent': 'Mozilla/5.0'}
-        self.session.auth = (username, password)
-        response = self.session.get(self.url)
-        if response.status_code != requests.codes.ok:
-            raise FedoraException("Could not connect to %s" % self.url)
+    def __init__(self, host, port, username, password, limiter=None, replicas=None, probe="eager", transport=None,
+                 compression=True):
+        if probe not in ("eager", "lazy", "off"):
+            raise ValueError("Unknown probe: %s" % probe)
+        self.url = self.base_url(host, port)
+        self.username = username
+        self.limiter = limiter if limiter is not None else UNLIMITED
+        self.endpoints = EndpointPool([self.url] + [self.base_url(*self.split_endpoint(r)) for r in replicas or []])
+        if transport is None or transport == "requests":
+            self.session = RequestsTransport()
+        elif transport == "http2":
+            self.session = HttpxTransport()
+        elif isinstance(transport, str):
+            raise ValueError("Unknown transport: %s" % transport)
+        else:
+            self.session = transport
+        if self.session.auth is None:
+            self.session.auth = (username, password)
+        if compression:
+            self.text_headers = {"Accept-Encoding": getattr(self.session, "accept_encoding", "gzip")}
         else:
-            LOG.info("Connected to %s\n" % self.url)
-            print('Version: 1.0.3 Connected to %s, logged in as %s\n' % (self.url, username))
+            self.text_headers = IDENTITY
+        self.connected = probe == "off"
+        self.connect_lock = threading.Lock()
+        if probe == "eager":
+            self.connect()
+
+    def connect(self):
+        """
+        Check the connection to the server. Called by the constructor, or before the first request if the
+        instance was made with `probe='lazy'`.
+
+        :raises FedoraException: if the server does not answer
+        """
+        with self.connect_lock:
+            if self.connected:
+                return
+            response = self.session.get(self.url)
+            if response.status_code != requests.codes.ok:
+                raise FedoraException("Could not connect to %s" % self.url)
+            else:
+                LOG.info("Connected to %s\n" % self.url)
+                print('Version: 1.0.3 Connected to %s, logged in as %s\n' % (self.url, self.username))
+            self.connected = True
 
     @staticmethod
-    def from_file(cfg_file=None):
+    def from_file(cfg_file=None, **kwargs):
+        """
+        Create a Fedora instance from a configuration file. The first line of the file has the connection
+        details of the primary server: 'host,port,username,password'. Each next line that is not empty
+        and does not start with '#' has the connection details of a read replica: 'host,port'.
+
+        :param cfg_file: path to the configuration file, default: {user_home}/src/fedora.cfg
+        :param kwargs: keyword arguments passed on to the constructor
+        :return: a new Fedora instance
+        """
         if cfg_file is None:
             cfg_file = os.path.join(os.path.expanduser("~"), CFG_FILE)
         LOG.info("Creating a new Fedora instance from file %s" % cfg_file)
         with open(cfg_file) as cfg:
             line = cfg.readline().strip()
+            replicas = [tuple(l.strip().split(",")[:2]) for l in cfg if l.strip() and not l.startswith("#")]
         host, port, username, password = line.split(",")
-        return Fedora(host, port, username, password)
+        if replicas and "replicas" not in kwargs:
+            kwargs["replicas"] = replicas
+        return Fedora(host, port, username, password, **kwargs)
 
-    def as_text(self, url):
-        response = self.session.get(url)
-        if response.status_code == requests.codes.ok:
-            text = str(response.content, 'utf-8', errors='replace')
-            return text
-        else:
-            raise FedoraException("Error response from Fedora: %d %s" % (response.status_code, response.reason))
+    @staticmethod
+    def base_url(host, port):
+        if not host.startswith("http"):
+            host = "http://" + host
+        return host + ":" + str(port) + "/fedora"
+
+    @staticmethod
+    def split_endpoint(endpoint):
+        if isinstance(endpoint, str):
+            return endpoint.rsplit(":", 1)
+        return endpoint
+
+    def check_endpoints(self):
+        """
+        Probe the primary server and all read replicas.
+
+        :return: dict of url: healthy
+        """
+        return self.endpoints.check(self.session)
+
+    @contextlib.contextmanager
+    def read(self, method, url, **kwargs):
+        """
+        Send a read request to the endpoint with the least outstanding requests. If the endpoint is not
+        reachable or unavailable, the request is sent to the next endpoint. The request counts as outstanding
+        until the with-block is left, so read streamed content within the block.
+
+        :param method: http method
+        :param url: url on the primary server, the path is appended to the url of the selected endpoint
+        :param kwargs: keyword arguments for :meth:`requests.Session.request`
+        """
+        if not self.connected:
+            self.connect()
+        if not url.startswith(self.url):
+            yield self.session.request(method, url, **kwargs)
+            return
+        path = url[len(self.url):]
+        tried = []
+        while True:
+            endpoint = self.endpoints.select(exclude=tried)
+            last = len(tried) + 1 == len(self.endpoints)
+            try:
+                response = self.session.request(method, endpoint.url + path, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                self.endpoints.mark_down(endpoint)
+                self.endpoints.release(endpoint)
+                if last:
+                    raise
+                tried.append(endpoint)
+                continue
+            except BaseException:
+                # any other error, or an interrupt, ends the request as well
+                self.endpoints.release(endpoint)
+                raise
+            if response.status_code in UNAVAILABLE_CODES:
+                self.endpoints.mark_down(endpoint)
+                if not last:
+                    self.endpoints.release(endpoint)
+                    response.close()
+                    tried.append(endpoint)
+                    continue
+            else:
+                self.endpoints.mark_up(endpoint)
+            try:
+                yield response
+            finally:
+                self.endpoints.release(endpoint)
+            return
+
+    def write(self, method, url, **kwargs):
+        """
+        Send a write request to the primary server.
+
+        :param method: http method
+        :param url: url on the primary server
+        :param kwargs: keyword arguments for :meth:`requests.Session.request`
+        :return: the response
+        """
+        if not self.connected:
+            self.connect()
+        return self.session.request(method, url, **kwargs)
+
+    def as_text(self, url, limited=False):
+        limiter = self.limiter if limited else UNLIMITED
+        with limiter.slot() as slot, self.read("get", url, headers=self.text_headers) as response:
+            slot.observe(response.status_code)
+            if response.status_code == requests.codes.ok:
+                self.check_encoding(response, self.text_headers)
+                text = str(response.content, 'utf-8', errors='replace')
+                return text
+            else:
+                raise FedoraException.from_response(response)
 
     def object_xml(self, object_id):
         """
@@ -64,18 +245,97 @@ class Fedora(object):
         url = self.url + "/objects/" + object_id + "/objectXML"
         return self.as_text(url)
 
-    def datastream(self, object_id, ds_id, content_format="content"):
+    @contextlib.contextmanager
+    def object_xml_stream(self, object_id):
+        """
+        Like :meth:`object_xml`, but gives the FOXML as a readable stream of bytes, for incremental parsing.
+        See :class:`fedora.rest.foxml.DigitalObject`.
+
+        :param object_id: id of the digital object
+        :return: a context manager that gives the stream
+        """
+        url = self.url + "/objects/" + object_id + "/objectXML"
+        with self.limiter.slot() as slot, \
+                self.read("get", url, headers=self.text_headers, stream=True) as response:
+            slot.observe(response.status_code)
+            if response.status_code != requests.codes.ok:
+                raise FedoraException.from_response(response)
+            self.check_encoding(response, self.text_headers)
+            response.raw.decode_content = True
+            yield response.raw
+
+    def object_profile(self, object_id):
+        """
+        See: https://wiki.duraspace.org/display/FEDORA36/REST+API#RESTAPI-getObjectProfile
+
+        /objects/{pid} ? [format] [asOfDateTime]
+        """
+        url = self.url + "/objects/" + object_id + "?format=xml"
+        return self.as_text(url, limited=True)
+
+    def modify_object(self, pid, state=None, label=None, owner_id=None, log_message=None):
+        """
+        See: https://wiki.duraspace.org/display/FEDORA36/REST+API#RESTAPI-modifyObject
+
+        /objects/{pid} ? [label] [ownerId] [state] [logMessage] [lastModifiedDate]
+
+        :param state: 'A' (active), 'I' (inactive) or 'D' (deleted)
+        :return: the new lastModifiedDate of the object
+        """
+        query = {'state': state, 'label': label, 'ownerId': owner_id, 'logMessage': log_message}
+        query = {k: v for k, v in query.items() if v is not None}
+        url = self.url + "/objects/" + pid + "?" + urllib.parse.urlencode(query)
+        response = self.write("put", url)
+        if response.status_code != requests.codes.ok:
+            raise FedoraException.from_response(response)
+        return response.text
+
+    def purge_object(self, pid, log_message=None):
+        """
+        See: https://wiki.duraspace.org/display/FEDORA36/REST+API#RESTAPI-purgeObject
+
+        /objects/{pid} ? [logMessage]
+        """
+        url = self.url + "/objects/" + pid
+        if log_message is not None:
+            url += "?" + urllib.parse.urlencode({'logMessage': log_message})
+        response = self.write("delete", url)
+        if response.status_code != requests.codes.ok:
+            raise FedoraException.from_response(response)
+        return response.text
+
+    def datastream(self, object_id, ds_id, content_format="content", as_of_date_time=None):
         """
         See: https://wiki.duraspace.org/display/FEDORA36/REST+API#RESTAPI-getDatastream
 
         auth required for some datastreams
+
+        :param as_of_date_time: read the version of the datastream that was current at this moment, f.i. the
+            dsCreateDate of a version in :meth:`datastream_history`, default: `None` (the current version)
         """
+        params = {}
         if content_format == "content":
             postfix = "/content"
         else:
-            postfix = "?format=" + content_format
+            postfix = ""
+            params["format"] = content_format
+        if as_of_date_time is not None:
+            params["asOfDateTime"] = as_of_date_time
         url = self.url + "/objects/" + object_id + "/datastreams/" + ds_id + postfix
-        return self.as_text(url)
+        if params:
+            url += "?" + urllib.parse.urlencode(params)
+        return self.as_text(url, limited=True)
+
+    def datastream_history(self, object_id, ds_id):
+        """
+        See: https://wiki.duraspace.org/display/FEDORA36/REST+API#RESTAPI-getDatastreamHistory
+
+        /objects/{pid}/datastreams/{dsID}/history ? [format]
+
+        :return: xml with the profiles of all versions of the datastream, newest first
+        """
+        url = self.url + "/objects/" + object_id + "/datastreams/" + ds_id + "/history?format=xml"
+        return self.as_text(url, limited=True)
 
     def add_managed_datastream(self, pid, ds_id, ds_label, filepath, mediatype, sha1):
         """
@@ -89,9 +349,9 @@ class Fedora(object):
         filename = os.path.basename(filepath)
         with open(filepath, 'rb') as file:
             files = {'file': (filename, file, mediatype, {'Expires': '0'})}
-            response = self.session.post(url, params=payload, files=files)
+            response = self.write("post", url, params=payload, files=files)
             if response.status_code != 201:
-                raise FedoraException("Error response from Fedora: %d %s" % (response.status_code, response.reason))
+                raise FedoraException.from_response(response)
         return response
 
     def modify_datastream(self, pid, ds_id, ds_label, filepath, mediatype, formatURI, logMessage):
@@ -107,21 +367,66 @@ class Fedora(object):
                    'mimeType': mediatype, 'formatURI': formatURI, 'logMessage': logMessage}
         filename = os.path.basename(filepath)
         with open(filepath, 'rb') as file:
-            response = self.session.put(url, params=payload, data=file)
+            response = self.write("put", url, params=payload, data=file)
             if response.status_code != 200:
-                raise FedoraException("Error response from Fedora: %d %s" % (response.status_code, response.reason))
+                raise FedoraException.from_response(response)
         return response
 
-    def list_datastreams(self, pid):
+    def modify_datastream_state(self, pid, ds_id, state, log_message=None):
         """
-        /objects/{pid}/datastreams ? [format] [asOfDateTime]
+        See: https://wiki.duraspace.org/display/FEDORA36/REST+API#RESTAPI-modifyDatastream
+
+        /objects/{pid}/datastreams/{dsID} ? [dsState] [logMessage] [ignoreContent]
+
+        :param state: 'A' (active), 'I' (inactive) or 'D' (deleted)
+        :return: datastream profile
+        """
+        url = self.url + '/objects/' + pid + '/datastreams/' + ds_id
+        payload = {'dsState': state, 'ignoreContent': 'true'}
+        if log_message is not None:
+            payload['logMessage'] = log_message
+        response = self.write("put", url, params=payload)
+        if response.status_code != requests.codes.ok:
+            raise FedoraException.from_response(response)
+        return response.text
+
+    def purge_datastream(self, pid, ds_id, start_dt=None, end_dt=None, log_message=None):
+        """
+        See: https://wiki.duraspace.org/display/FEDORA36/REST+API#RESTAPI-purgeDatastream
+
+        /objects/{pid}/datastreams/{dsID} ? [startDT] [endDT] [logMessage]
+
+        :param start_dt: purge versions created at or after this moment, default: `None` (the first version)
+        :param end_dt: purge versions created at or before this moment, default: `None` (the last version)
+        :return: list of the creation dates of the purged versions, as sent by Fedora
+        """
+        url = self.url + '/objects/' + pid + '/datastreams/' + ds_id
+        payload = {'startDT': start_dt, 'endDT': end_dt, 'logMessage': log_message}
+        payload = {k: v for k, v in payload.items() if v is not None}
+        response = self.write("delete", url, params=payload)
+        if response.status_code != requests.codes.ok:
+            raise FedoraException.from_response(response)
+        return response.text
+
+    def list_datastreams(self, pid, profiles=False, as_of_date_time=None):
+        """
+        /objects/{pid}/datastreams ? [format] [asOfDateTime] [profiles]
+
+        :param pid: id of the digital object
+        :param profiles: include the profile of each datastream in the listing, default: `False`
+        :param as_of_date_time: list the datastreams as they were at this moment, default: `None` (now)
         """
         url = self.url + '/objects/' + pid + '/datastreams'
         payload = {'format': 'xml'}
-        response = self.session.get(url, params=payload)
-        if response.status_code != 200:
-            raise FedoraException("Error response from Fedora: %d %s" % (response.status_code, response.reason))
-        return response.text
+        if profiles:
+            payload['profiles'] = 'true'
+        if as_of_date_time is not None:
+            payload['asOfDateTime'] = as_of_date_time
+        with self.read("get", url, params=payload, headers=self.text_headers) as response:
+            if response.status_code != 200:
+                raise FedoraException.from_response(response)
+            self.check_encoding(response, self.text_headers)
+            return response.text
 
     def add_relationship(self, subj_id, predicate, obj, is_literal=False, data_type=None):
         """
@@ -129,9 +434,9 @@ class Fedora(object):
         """
         url = self.url + "/objects/" + subj_id + "/relationships/new?" \
               + self.create_rdf_statement(subj_id, predicate, obj, is_literal, data_type)
-        response = self.session.post(url)
+        response = self.write("post", url)
         if response.status_code != requests.codes.ok:
-            raise FedoraException("Error response from Fedora: %d %s" % (response.status_code, response.reason))
+            raise FedoraException.from_response(response)
 
     def purge_relationship(self, subj_id, predicate, obj, is_literal=False, data_type=None):
         """
@@ -139,11 +444,11 @@ class Fedora(object):
         """
         url = self.url + "/objects/" + subj_id + "/relationships?" \
               + self.create_rdf_statement(subj_id, predicate, obj, is_literal, data_type)
-        response = self.session.delete(url)
+        response = self.write("delete", url)
         if response.status_code == requests.codes.ok:
             return response.text == "true"
         else:
-            raise FedoraException("Error response from Fedora: %d %s" % (response.status_code, response.reason))
+            raise FedoraException.from_response(response)
 
     @staticmethod
     def create_rdf_statement(subj_id, predicate, obj, is_literal=False, data_type=None):
@@ -158,7 +463,8 @@ class Fedora(object):
                 query.update({"datatype": data_type})
         return urllib.parse.urlencode(query)
 
-    def download(self, object_id, ds_id, folder="downloads", id_in_path=True, chunk_size=1024):
+    def download(self, object_id, ds_id, folder="downloads", id_in_path=True, chunk_size=1024, throttle=None,
+                 filename=None):
         """
         Download datastream contents from Fedora.
 
@@ -167,6 +473,9 @@ class Fedora(object):
         :param folder: where to store the downloaded file, default: 'downloads'
         :param id_in_path: should a subdirectory be created within the the download folder
         :param chunk_size: chunk size for read/write operation
+        :param throttle: callable that is called with the size of each chunk before it is written and may wait,
+            f.i. :meth:`fedora.rest.limiter.TokenBucket.consume` to keep to a bandwidth, default: `None`
+        :param filename: name of the local file, default: `None` (the name in the Content-Disposition header)
         :return: dict with response headers + filename and local_path of the downloaded file
         """
         if id_in_path:
@@ -175,19 +484,220 @@ class Fedora(object):
             path = os.path.abspath(folder)
         os.makedirs(path, exist_ok=True)
         url = self.url + "/objects/" + object_id + "/datastreams/" + ds_id + "/content"
-        response = self.session.get(url, stream=True)
-        if response.status_code == requests.codes.ok:
-            filename = self.compute_filename(response)
-            local_path = os.path.join(path, filename)
-            with open(local_path, 'wb') as fd:
-                for chunk in response.iter_content(chunk_size):
-                    fd.write(chunk)
-            LOG.debug("Downloaded %s" % local_path)
-            meta = {"filename": filename, "local-path": local_path}
-            meta.update(response.headers)
-            return meta
+        # the slot is held until the content is transferred
+        with self.limiter.slot() as slot, self.read("get", url, headers=IDENTITY, stream=True) as response:
+            slot.observe(response.status_code)
+            if response.status_code == requests.codes.ok:
+                self.check_encoding(response, IDENTITY)
+                if filename is None:
+                    filename = self.compute_filename(response)
+                local_path = os.path.join(path, filename)
+                # an interrupted transfer leaves a .part file, never a truncated file under the final name
+                part_path = local_path + ".part"
+                with open(part_path, 'wb') as fd:
+                    for chunk in response.iter_content(chunk_size):
+                        if throttle is not None:
+                            throttle(len(chunk))
+                        fd.write(chunk)
+                os.replace(part_path, local_path)
+                LOG.debug("Downloaded %s" % local_path)
+                meta = {"filename": filename, "local-path": local_path}
+                meta.update(response.headers)
+                return meta
+            else:
+                raise FedoraException.from_response(response)
+
+    def read_range(self, object_id, ds_id, start, end=None):
+        """
+        Read part of the content of a datastream with an http Range request.
+
+        :param object_id: id of the digital object
+        :param ds_id: id of the datastream within this digital object
+        :param start: offset of the first byte; a negative offset counts from the end of the content,
+            f.i. -22 reads the last 22 bytes
+        :param end: offset just after the last byte, default: `None` (until the end of the content)
+        :return: the bytes from `start` to `end`
+        """
+        return self.get_range(object_id, ds_id, start, end)[0]
+
+    def get_range(self, object_id, ds_id, start, end=None):
+        """
+        Like :meth:`read_range`, but also returns the total size of the content. Servers that do not honour the
+        Range header send all content; only the requested bytes are read from such a response.
+
+        :return: tuple (bytes, total size of the content or `None` if unknown)
+        """
+        if start < 0:
+            if end is not None:
+                raise ValueError("end cannot be combined with a negative start")
+            byte_range = "bytes=%d" % start
+        elif end is None:
+            byte_range = "bytes=%d-" % start
+        elif end <= start:
+            return b"", None
+        else:
+            byte_range = "bytes=%d-%d" % (start, end - 1)
+        url = self.url + "/objects/" + object_id + "/datastreams/" + ds_id + "/content"
+        with self.limiter.slot() as slot, \
+                self.read("get", url, headers=dict(IDENTITY, Range=byte_range), stream=True) as response:
+            slot.observe(response.status_code)
+            self.check_encoding(response, IDENTITY)
+            if response.status_code == requests.codes.partial_content:
+                total = response.headers.get("Content-Range", "").rsplit("/", 1)[-1]
+                return response.content, int(total) if total.isdigit() else None
+            elif response.status_code == requests.codes.ok:
+                length = response.headers.get("Content-Length")
+                total = int(length) if length is not None else None
+                if start < 0:
+                    data = response.content
+                    return data[start:], len(data)
+                data = bytearray()
+                skip = start
+                for chunk in response.iter_content(65536):
+                    if skip >= len(chunk):
+                        skip -= len(chunk)
+                        continue
+                    data += chunk[skip:]
+                    skip = 0
+                    if end is not None and len(data) >= end - start:
+                        break
+                return bytes(data if end is None else data[:end - start]), total
+            elif response.status_code == requests.codes.requested_range_not_satisfiable:
+                total = response.headers.get("Content-Range", "").rsplit("/", 1)[-1]
+                return b"", int(total) if total.isdigit() else None
+            else:
+                raise FedoraException.from_response(response)
+
+    def open(self, object_id, ds_id, block_size=65536, cache_blocks=64, read_ahead=1):
+        """
+        Open the content of a datastream as a seekable, read-only file. Content is read with Range requests,
+        in blocks that are cached. Example::
+
+            with zipfile.ZipFile(fedora.open("easy-file:1", "EASY_FILE")) as archive:
+                print(archive.namelist())
+
+        See :class:`fedora.rest.streams.DatastreamFile` for the parameters.
+        """
+        from fedora.rest.streams import DatastreamFile
+
+        return DatastreamFile(self, object_id, ds_id, block_size, cache_blocks, read_ahead)
+
+    def stream(self, object_id, ds_id, sink, buffer_size=STREAM_BUFFER_SIZE):
+        """
+        Pipe the content of a datastream into a writable sink, without temporary files. Content is read with
+        `readinto` into one reusable buffer of `buffer_size` bytes. Example::
+
+            with open("a.pdf", "wb") as sink:
+                fedora.stream("easy-file:1", "EASY_FILE", sink)
+
+        :param object_id: id of the digital object
+        :param ds_id: id of the datastream within this digital object
+        :param sink: object with a method `write` that takes a bytes-like object, f.i. a file opened for binary
+            writing, `socket.makefile('wb')` or the stdin of a subprocess
+        :param buffer_size: size of the buffer in bytes, default: 1 MiB
+        :return: dict with the response headers and 'bytes', the number of bytes written
+        """
+        with self.content_stream(object_id, ds_id) as (raw, headers):
+            count = self.copy_stream(raw, sink, buffer_size)
+        meta = dict(headers)
+        meta["bytes"] = count
+        return meta
+
+    @contextlib.contextmanager
+    def content_stream(self, object_id, ds_id):
+        """
+        Open the content of a datastream as a non-seekable, readable stream, for consumers that read
+        themselves, f.i. :meth:`tarfile.TarFile.addfile` or :meth:`upload_datastream`. Example::
+
+            with fedora.content_stream("easy-file:1", "EASY_FILE") as (raw, headers):
+                info = tarfile.TarInfo("a.pdf")
+                info.size = int(headers["Content-Length"])
+                tar.addfile(info, raw)
+
+        :param object_id: id of the digital object
+        :param ds_id: id of the datastream within this digital object
+        :return: a context manager that gives a tuple (stream, response headers)
+        """
+        url = self.url + "/objects/" + object_id + "/datastreams/" + ds_id + "/content"
+        with self.limiter.slot() as slot, self.read("get", url, headers=IDENTITY, stream=True) as response:
+            slot.observe(response.status_code)
+            if response.status_code != requests.codes.ok:
+                raise FedoraException.from_response(response)
+            self.check_encoding(response, IDENTITY)
+            response.raw.decode_content = True
+            yield response.raw, response.headers
+
+    def upload_datastream(self, pid, ds_id, source, ds_label, mediatype, sha1=None, modify=False, log_message=None):
+        """
+        Add or replace the content of a managed datastream, reading the content from a stream. With
+        :meth:`content_stream` of another Fedora as source, content goes from repository to repository without
+        temporary files.
+
+        :param pid: id of the digital object
+        :param ds_id: id of the datastream
+        :param source: readable file-like object, or an iterable of bytes that is sent chunked
+        :param ds_label: label of the datastream
+        :param mediatype: mime type of the content
+        :param sha1: SHA-1 of the content, checked by Fedora, default: `None` (Fedora computes it)
+        :param modify: replace the content of an existing datastream, default: `False` (add a datastream)
+        :param log_message: message for the audit trail
+        :return: the response
+        """
+        url = self.url + '/objects/' + pid + '/datastreams/' + ds_id
+        payload = {'dsLabel': ds_label, 'checksumType': 'SHA-1', 'mimeType': mediatype}
+        if sha1 is not None:
+            payload['checksum'] = sha1
+        if log_message is not None:
+            payload['logMessage'] = log_message
+        if modify:
+            method, expected = "put", 200
         else:
-            raise FedoraException("Error response from Fedora: %d %s" % (response.status_code, response.reason))
+            method, expected = "post", 201
+            payload['controlGroup'] = 'M'
+        if hasattr(source, "read") and not (hasattr(source, "seekable") and source.seekable()):
+            # requests cannot size a non-seekable stream: send it chunked
+            source = iter(functools.partial(source.read, STREAM_BUFFER_SIZE), b"")
+        response = self.write(method, url, params=payload, data=source, headers={'Content-Type': mediatype})
+        if response.status_code != expected:
+            raise FedoraException.from_response(response)
+        return response
+
+    @staticmethod
+    def copy_stream(source, sink, buffer_size=STREAM_BUFFER_SIZE):
+        """
+        Copy from a stream that supports `readinto` to a sink with `write`, through one reusable buffer.
+
+        :return: the number of bytes copied
+        """
+        buffer = bytearray(buffer_size)
+        view = memoryview(buffer)
+        count = 0
+        while True:
+            n = source.readinto(buffer)
+            if not n:
+                break
+            written = 0
+            while written < n:
+                # raw sinks may take less than offered
+                w = sink.write(view[written:n])
+                written = n if w is None else written + w
+            count += n
+        return count
+
+    @staticmethod
+    def check_encoding(response, headers):
+        """
+        Check that the content coding of a response is one that was asked for in the Accept-Encoding of the
+        request, and can therefore be decoded.
+
+        :param response: the response
+        :param headers: the headers of the request
+        """
+        encoding = response.headers.get("Content-Encoding", "identity").strip().lower()
+        accepted = [e.strip().lower() for e in headers.get("Accept-Encoding", "identity").split(",")]
+        if encoding not in accepted and encoding != "identity":
+            response.close()
+            raise FedoraException("Unexpected Content-Encoding from Fedora: %s" % encoding)
 
     @staticmethod
     def compute_filename(response):
@@ -209,14 +719,17 @@ class Fedora(object):
             filename = ".".join(exts[:-1])
         return filename
 
-    def find_objects(self, query, max_results=25, result_format="xml", fields=("pid", "label")):
+    def find_objects(self, query, max_results=25, result_format="xml", fields=("pid", "label"), session_token=None):
         """
         See: https://wiki.duraspace.org/display/FEDORA38/REST+API#RESTAPI-findObjects
 
         /objects?query=pid%7E*1&maxResults=50&format=true&pid=true&title=true
 
+        :param session_token: token from a previous result, to get the next page of results
         """
         parameters = {"query": query, "maxResults": max_results, "resultFormat": result_format}
+        if session_token:
+            parameters.update({"sessionToken": session_token})
         for field in fields:
             parameters.update({field: "true"})
 
@@ -235,16 +748,21 @@ class Fedora(object):
                                      &distinct=[*on* (default is off)]
                                      &stream=[*on* (default is off)]
                                      &query=*QUERY_TEXT_OR_URL*
+
+        A `limit` of `None` means no limit.
         """
 
         data = {"type": type, "flush": str(flush).lower(), "lang": lang, "format": format, "limit": limit,
                 "distinct": distinct, "query": query}
+        if limit is None:
+            del data["limit"]
         url = self.url + "/risearch"
-        response = self.session.post(url, data)
-        if response.status_code != requests.codes.ok:
-            raise FedoraException("Error response from Fedora: %d %s" % (response.status_code, response.reason))
-
-        return response.text
+        with self.limiter.slot() as slot, self.read("post", url, data=data, headers=self.text_headers) as response:
+            slot.observe(response.status_code)
+            if response.status_code != requests.codes.ok:
+                raise FedoraException.from_response(response)
+            self.check_encoding(response, self.text_headers)
+            return response.text
 
     def ingest(self, pid=None, label=None, format=None, encoding=None, namespace=None, owner_id=None, log_message=None,
                ignore_mime=False):
@@ -263,9 +781,9 @@ class Fedora(object):
 
         npid = pid if pid else 'new'
         url = self.url + "/objects/" + npid + "?" + urllib.parse.urlencode(query)
-        response = self.session.post(url);
+        response = self.write("post", url)
         if response.status_code != requests.codes.created:
-            raise FedoraException("Error response from Fedora: %d %s" % (response.status_code, response.reason))
+            raise FedoraException.from_response(response)
         return response.text
 
     def get_next_pid(self, num_pids=1, namespace='test', format='xml'):
@@ -278,9 +796,9 @@ class Fedora(object):
         """
         query = {'numPIDs': num_pids, 'namespace': namespace, 'format': format}
         url = self.url + "/objects/nextPID?" + urllib.parse.urlencode(query)
-        response = self.session.post(url);
+        response = self.write("post", url)
         if response.status_code != requests.codes.ok:
-            raise FedoraException("Error response from Fedora: %d %s" % (response.status_code, response.reason))
+            raise FedoraException.from_response(response)
         return response.text
 
 ## See static method Fedora.from_file()
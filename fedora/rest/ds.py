@@ -1,8 +1,6 @@
 #! /usr/bin/env python3
 # -*- coding: utf-8 -*-
 import xml.etree.ElementTree as ET
-import pandas as pd
-import rdflib
 
 from fedora.rest.api import Fedora, FedoraException
 
@@ -10,7 +8,9 @@ ns = {"dsp": "http://www.fedora.info/definitions/1/0/management/",
       "damd": "http://easy.dans.knaw.nl/easy/dataset-administrative-metadata/",
       "dc": "http://purl.org/dc/elements/1.1/",
       "emd": "http://easy.dans.knaw.nl/easy/easymetadata/",
-      "eas": "http://easy.dans.knaw.nl/easy/easymetadata/eas/"}
+      "eas": "http://easy.dans.knaw.nl/easy/easymetadata/eas/",
+      "types": "http://www.fedora.info/definitions/1/0/types/",
+      "access": "http://www.fedora.info/definitions/1/0/access/"}
 
 
 def __text__(element):
@@ -62,7 +62,12 @@ class DatastreamProfile(object):
         self.from_xml(xml)
 
     def from_xml(self, xml):
-        root = ET.fromstring(xml)
+        self.from_element(ET.fromstring(xml))
+
+    def from_element(self, root):
+        """
+        Read the profile from a parsed `datastreamProfile` element.
+        """
         self.ds_label = __text__(root.find("dsp:dsLabel", ns))
         self.ds_version_id = __text__(root.find("dsp:dsVersionID", ns))
         self.ds_creation_date = __text__(root.find("dsp:dsCreateDate", ns))
@@ -80,6 +85,65 @@ class DatastreamProfile(object):
         self.props = {k: v for k, v in self.__dict__.items() if k.startswith("ds_")}
 
 
+class ObjectProfile(object):
+
+    def __init__(self, object_id, fedora):
+        self.fedora = fedora
+        self.object_id = object_id
+
+        self.obj_label = None
+        self.obj_owner_id = None
+        self.obj_create_date = None
+        self.obj_last_mod_date = None
+        self.obj_state = None
+
+    def fetch(self):
+        xml = self.fedora.object_profile(self.object_id)
+        self.from_xml(xml)
+
+    def from_xml(self, xml):
+        root = ET.fromstring(xml)
+        self.obj_label = __text__(root.find("access:objLabel", ns))
+        self.obj_owner_id = __text__(root.find("access:objOwnerId", ns))
+        self.obj_create_date = __text__(root.find("access:objCreateDate", ns))
+        self.obj_last_mod_date = __text__(root.find("access:objLastModDate", ns))
+        self.obj_state = __text__(root.find("access:objState", ns))
+
+
+class DatastreamHistory(object):
+    """
+    The profiles of all versions of a datastream, oldest first. The content of a version can be read with
+    :meth:`content`.
+    """
+
+    def __init__(self, object_id, ds_id, fedora):
+        self.fedora = fedora
+        self.object_id = object_id
+        self.ds_id = ds_id
+        self.versions = []
+
+    def fetch(self):
+        xml = self.fedora.datastream_history(self.object_id, self.ds_id)
+        self.from_xml(xml)
+
+    def from_xml(self, xml):
+        root = ET.fromstring(xml)
+        versions = []
+        for element in root.iter("{%s}datastreamProfile" % ns["dsp"]):
+            profile = DatastreamProfile(self.object_id, self.ds_id, self.fedora)
+            profile.from_element(element)
+            versions.append(profile)
+        # Fedora lists the newest version first
+        self.versions = sorted(versions, key=lambda p: p.ds_creation_date or "")
+
+    def content(self, version):
+        """
+        :param version: one of the profiles in `versions`
+        :return: the content of this version
+        """
+        return self.fedora.datastream(self.object_id, self.ds_id, as_of_date_time=version.ds_creation_date)
+
+
 class FileItemMetadata(object):
 
     def __init__(self, object_id, fedora):
@@ -100,6 +164,9 @@ class FileItemMetadata(object):
 
     def fetch(self):
         xml = self.fedora.datastream(self.object_id, "EASY_FILE_METADATA")
+        self.from_xml(xml)
+
+    def from_xml(self, xml):
         root = ET.fromstring(xml)
         # elements in this datastream are not in any particular namespace
         self.fmd_sid = __text__(root.find("sid"))
@@ -131,6 +198,9 @@ class AdministrativeMetadata(object):
 
     def fetch(self):
         xml = self.fedora.datastream(self.object_id, "AMD")
+        self.from_xml(xml)
+
+    def from_xml(self, xml):
         root = ET.fromstring(xml)
         self.amd_dataset_state = __text__(root.find("datasetState"))
         self.amd_previous_state = __text__(root.find("previousState"))
@@ -139,7 +209,33 @@ class AdministrativeMetadata(object):
         self.props = {k: v for k, v in self.__dict__.items() if k.startswith("amd_")}
 
 
+# fields of the record of an EasyMetadata, list fields hold strings, dict fields map a name to a list of strings
+EMD_LIST_FIELDS = ["titles", "alternative_titles", "creators", "contributors", "subjects", "descriptions",
+                   "publishers", "types", "formats", "languages", "coverage", "access_rights", "licenses",
+                   "audiences"]
+EMD_DICT_FIELDS = ["dates", "identifiers"]
+
+# where the list fields are found: (container, local name of the element) -> field
+EMD_ELEMENTS = {("title", "title"): "titles", ("title", "alternative"): "alternative_titles",
+                ("creator", "creator"): "creators", ("contributor", "contributor"): "contributors",
+                ("subject", "subject"): "subjects", ("description", "description"): "descriptions",
+                ("description", "abstract"): "descriptions", ("publisher", "publisher"): "publishers",
+                ("type", "type"): "types", ("format", "format"): "formats", ("format", "extent"): "formats",
+                ("format", "medium"): "formats", ("language", "language"): "languages",
+                ("coverage", "coverage"): "coverage", ("coverage", "spatial"): "coverage",
+                ("coverage", "temporal"): "coverage", ("rights", "accessRights"): "access_rights",
+                ("rights", "license"): "licenses", ("audience", "audience"): "audiences"}
+
+EAS_SCHEME = "{%s}scheme" % ns["eas"]
+
+
 class EasyMetadata(object):
+    """
+    The EMD of a dataset. Next to `doi` and `urn`, all fields of the :meth:`record` are attributes: lists of
+    strings for :data:`EMD_LIST_FIELDS`; `dates` maps the name of a date term (created, available, ...) and
+    `identifiers` the scheme of an identifier (DOI, PID, DMO_ID, ...) to a list of values. Creators and
+    contributors that are given in parts are written as 'title initials prefix surname (organization)'.
+    """
 
     def __init__(self, object_id, fedora):
         if not str(object_id).startswith("easy-dataset"):
@@ -149,29 +245,115 @@ class EasyMetadata(object):
 
         self.doi = None
         self.urn = None
+        for field in EMD_LIST_FIELDS:
+            setattr(self, field, [])
+        for field in EMD_DICT_FIELDS:
+            setattr(self, field, {})
 
     def fetch(self):
         xml = self.fedora.datastream(self.object_id, "EMD")
+        self.from_xml(xml)
+
+    def from_xml(self, xml):
         root = ET.fromstring(xml)
-        emd_identifier = root.find("emd:identifier", ns)
-        if emd_identifier:
-            for child in emd_identifier:
-                if '{http://easy.dans.knaw.nl/easy/easymetadata/eas/}scheme' in child.attrib \
-                        and child.attrib['{http://easy.dans.knaw.nl/easy/easymetadata/eas/}scheme'] == 'DOI':
-                    self.doi = child.text
-                if '{http://easy.dans.knaw.nl/easy/easymetadata/eas/}scheme' in child.attrib \
-                        and child.attrib['{http://easy.dans.knaw.nl/easy/easymetadata/eas/}scheme'] == 'PID':
-                    self.urn = child.text
+        for container in root:
+            group = _local_name(container.tag)
+            for element in container:
+                name = _local_name(element.tag)
+                if group == "date":
+                    value = _strip(element.text)
+                    if value:
+                        self.dates.setdefault(name, []).append(value)
+                elif group == "identifier":
+                    value = _strip(element.text)
+                    if value:
+                        self.identifiers.setdefault(element.get(EAS_SCHEME) or "", []).append(value)
+                elif (group, name) in EMD_ELEMENTS:
+                    value = _person(element) if len(element) > 0 else _strip(element.text)
+                    if value:
+                        getattr(self, EMD_ELEMENTS[(group, name)]).append(value)
+        self.doi = self.identifiers.get("DOI", [None])[0]
+        self.urn = self.identifiers.get("PID", [None])[0]
+
+    def record(self):
+        """
+        :return: dict with dataset_id, doi, urn and the fields in :data:`EMD_LIST_FIELDS` and
+            :data:`EMD_DICT_FIELDS`
+        """
+        record = {"dataset_id": self.object_id, "doi": self.doi, "urn": self.urn}
+        for field in EMD_LIST_FIELDS + EMD_DICT_FIELDS:
+            record[field] = getattr(self, field)
+        return record
+
+
+def _local_name(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+def _strip(text):
+    return text.strip() if text is not None else None
+
+
+def _person(element):
+    parts = {_local_name(child.tag): _strip(child.text) for child in element}
+    name = " ".join(p for p in (parts.get("title"), parts.get("initials"), parts.get("prefix"),
+                                parts.get("surname")) if p)
+    organization = parts.get("organization")
+    if name and organization:
+        return "%s (%s)" % (name, organization)
+    return name or organization
 
 
 def dataset_identifiers(dataset_ids, fedora):
-    df = pd.DataFrame(columns=['dataset_id', 'doi', 'urn'])
+    # pandas takes long to import, only import it when needed
+    import pandas as pd
+
+    rows = []
     for easy_id in dataset_ids:
         emd = EasyMetadata(easy_id, fedora)
         emd.fetch()
-        fields = {'dataset_id': easy_id, 'doi': emd.doi, 'urn': emd.urn}
-        df = df.append(fields, ignore_index=True)
-    return df
+        rows.append({'dataset_id': easy_id, 'doi': emd.doi, 'urn': emd.urn})
+    return pd.DataFrame(rows, columns=['dataset_id', 'doi', 'urn'])
+
+
+def dataset_file_ids(dataset_id, fedora):
+    """
+    Find the files of a dataset with one risearch query.
+
+    :param dataset_id: id of the dataset, f.i. "easy-dataset:5958"
+    :param fedora: the Fedora instance
+    :return: list of file ids
+    """
+    query = "PREFIX dans: <http://dans.knaw.nl/ontologies/relations#> " \
+            "PREFIX fmodel: <info:fedora/fedora-system:def/model#> " \
+            "SELECT ?s WHERE { " \
+            "?s dans:isSubordinateTo <info:fedora/" + dataset_id + "> . " \
+            "?s fmodel:hasModel <info:fedora/easy-model:EDM1FILE> }"
+    result = fedora.risearch(query, limit=None)
+    # csv with header "s", values like "info:fedora/easy-file:1"
+    return [line.strip().split("/", 1)[1] for line in result.splitlines()[1:] if line.strip()]
+
+
+def find_objects_iter(query, fedora, fields=("pid", "label", "state", "ownerId", "cDate", "mDate"),
+                      page_size=100):
+    """
+    Page through the results of a findObjects query.
+
+    :param query: findObjects query, f.i. "pid~easy-file:* mDate>=2017-01-01"
+    :param fedora: the Fedora instance
+    :param fields: the fields to return, "pid" should be one of them
+    :param page_size: number of results per request
+    :return: generator of dicts with the requested fields
+    """
+    session_token = None
+    while True:
+        xml = fedora.find_objects(query, max_results=page_size, fields=fields, session_token=session_token)
+        root = ET.fromstring(xml)
+        for object_fields in root.iterfind("types:resultList/types:objectFields", ns):
+            yield {field: __text__(object_fields.find("types:" + field, ns)) for field in fields}
+        session_token = __text__(root.find("types:listSession/types:token", ns))
+        if not session_token:
+            break
 
 
 class RelsExt(object):
@@ -179,18 +361,25 @@ class RelsExt(object):
     def __init__(self, object_id, fedora):
         self.fedora = fedora
         self.object_id = object_id
+        # rdflib takes long to import, only import it when needed
+        import rdflib
+
+        self.rdflib = rdflib
         self.graph = rdflib.Graph()
         self.subject = rdflib.URIRef('info:fedora/' + self.object_id)
 
     def fetch(self):
-        self.graph.parse(data=self.fedora.datastream(self.object_id, "RELS-EXT"))
+        self.from_xml(self.fedora.datastream(self.object_id, "RELS-EXT"))
+
+    def from_xml(self, xml):
+        self.graph.parse(data=xml, format="xml")
 
     def get_graph(self):
         return self.graph
 
     def get_is_subordinate_to(self):
         return \
-        str(self.graph.value(self.subject, rdflib.URIRef('http://dans.knaw.nl/ontologies/relations#isSubordinateTo'))).split(
+        str(self.graph.value(self.subject, self.rdflib.URIRef('http://dans.knaw.nl/ontologies/relations#isSubordinateTo'))).split(
             '/')[1]
 
 
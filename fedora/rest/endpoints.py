@@ -0,0 +1,114 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+import logging
+import threading
+import time
+
+LOG = logging.getLogger(__name__)
+
+# status codes after which an endpoint is taken out of rotation
+UNAVAILABLE_CODES = (502, 503, 504)
+
+
+class Endpoint(object):
+    """
+    A Fedora server, known by its base url (protocol + host + port + "/fedora").
+    """
+
+    def __init__(self, url):
+        self.url = url
+        self.outstanding = 0
+        self.down_since = None
+        self.requests = 0
+        self.failures = 0
+
+    def is_available(self, retry_after):
+        return self.down_since is None or time.monotonic() - self.down_since > retry_after
+
+    def __str__(self):
+        state = "up" if self.down_since is None else "down"
+        return "%s (%s, outstanding=%d, requests=%d, failures=%d)" \
+               % (self.url, state, self.outstanding, self.requests, self.failures)
+
+
+class EndpointPool(object):
+    """
+    Spreads read requests over a primary Fedora server and its read replicas.
+
+    :meth:`select` returns the available endpoint with the least outstanding requests; of endpoints with as many
+    outstanding, the one that got the fewest requests so far, so that also reads one after the other are spread.
+    An endpoint that fails (connection error or one of :data:`UNAVAILABLE_CODES`) is marked down and skipped for
+    `retry_after` seconds, after which it gets another chance. :meth:`check` probes all endpoints at once.
+
+    :param urls: base urls of the endpoints, the first one is the primary
+    :param retry_after: seconds an endpoint that is down is left alone, default: 30
+    """
+
+    def __init__(self, urls, retry_after=30):
+        self.endpoints = [Endpoint(url) for url in urls]
+        self.retry_after = retry_after
+        self.lock = threading.Lock()
+
+    @property
+    def primary(self):
+        return self.endpoints[0]
+
+    def select(self, exclude=()):
+        """
+        Select the endpoint for the next read request and count it as outstanding. Call :meth:`release`
+        when the request is done.
+
+        :param exclude: endpoints not to select, f.i. because they already failed for this request
+        :return: the selected endpoint, or `None` if all endpoints are excluded
+        """
+        with self.lock:
+            candidates = [e for e in self.endpoints if e not in exclude]
+            if len(candidates) == 0:
+                return None
+            available = [e for e in candidates if e.is_available(self.retry_after)]
+            # when all are down, try anyway: better an error from the server than no request at all
+            endpoint = min(available or candidates, key=lambda e: (e.outstanding, e.requests))
+            endpoint.outstanding += 1
+            endpoint.requests += 1
+            return endpoint
+
+    def release(self, endpoint):
+        with self.lock:
+            endpoint.outstanding -= 1
+
+    def mark_down(self, endpoint):
+        with self.lock:
+            endpoint.failures += 1
+            if endpoint.down_since is None:
+                LOG.warning("Endpoint %s is down" % endpoint.url)
+            endpoint.down_since = time.monotonic()
+
+    def mark_up(self, endpoint):
+        if endpoint.down_since is not None:
+            with self.lock:
+                LOG.info("Endpoint %s is up again" % endpoint.url)
+                endpoint.down_since = None
+
+    def check(self, session, timeout=10):
+        """
+        Probe all endpoints with a GET on their base url and mark them up or down.
+
+        :param session: the session to send requests with
+        :param timeout: seconds to wait for an answer
+        :return: dict of url: healthy
+        """
+        health = {}
+        for endpoint in self.endpoints:
+            try:
+                healthy = session.get(endpoint.url, timeout=timeout).status_code == 200
+            except IOError:
+                healthy = False
+            if healthy:
+                self.mark_up(endpoint)
+            else:
+                self.mark_down(endpoint)
+            health[endpoint.url] = healthy
+        return health
+
+    def __len__(self):
+        return len(self.endpoints)
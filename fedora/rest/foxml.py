@@ -0,0 +1,137 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+import logging
+import xml.etree.ElementTree as ET
+
+from fedora.rest.api import FedoraException
+from fedora.rest.ds import DatastreamProfile, FileItemMetadata, AdministrativeMetadata, EasyMetadata, RelsExt
+
+LOG = logging.getLogger(__name__)
+
+FOXML = "{info:fedora/fedora-system:def/foxml#}"
+
+# object properties by the last part of their name
+PROPERTIES = {"state": "state", "label": "label", "ownerId": "ownerId", "createdDate": "cDate",
+              "lastModifiedDate": "mDate"}
+
+
+class DigitalObject(object):
+    """
+    Everything about a digital object from one objectXML request.
+
+    The FOXML is parsed incrementally while it streams in; elements are dropped as soon as they are read, so
+    memory stays small for objects with many datastream versions. Of each datastream the profile of every version
+    is kept, and of inline (control group X) datastreams the content of the current version. The usual classes
+    of :mod:`fedora.rest.ds` are filled from that, without further requests; only the content of managed
+    datastreams is fetched when asked for. Example::
+
+        obj = DigitalObject("easy-file:1", fedora)
+        obj.fetch()
+        fmd = obj.file_item_metadata()
+        profile = obj.profile("EASY_FILE")
+
+    :param object_id: id of the digital object
+    :param fedora: the Fedora instance
+    """
+
+    def __init__(self, object_id, fedora):
+        self.object_id = object_id
+        self.fedora = fedora
+        self.properties = {}
+        self.versions = {}
+        self.inline = {}
+
+    def fetch(self):
+        with self.fedora.object_xml_stream(self.object_id) as stream:
+            self.parse(stream)
+
+    def parse(self, source):
+        """
+        :param source: a file name or a readable stream with FOXML
+        """
+        datastream = None
+        for event, element in ET.iterparse(source, events=("start", "end")):
+            tag = element.tag
+            if event == "start":
+                if tag == FOXML + "datastream":
+                    datastream = element.attrib
+                    self.versions[datastream["ID"]] = []
+                continue
+            if tag == FOXML + "property":
+                name = element.get("NAME", "").rsplit("#", 1)[-1]
+                if name in PROPERTIES:
+                    self.properties[PROPERTIES[name]] = element.get("VALUE")
+            elif tag == FOXML + "datastreamVersion":
+                self.versions[datastream["ID"]].append(self._profile(datastream, element))
+                content = element.find(FOXML + "xmlContent")
+                if content is not None and len(content) > 0:
+                    # the versions are in order, the last one is current
+                    self.inline[datastream["ID"]] = ET.tostring(content[0], encoding="unicode")
+                element.clear()
+            elif tag == FOXML + "datastream":
+                element.clear()
+                datastream = None
+
+    def _profile(self, datastream, version):
+        profile = DatastreamProfile(self.object_id, datastream["ID"], self.fedora)
+        profile.ds_label = version.get("LABEL")
+        profile.ds_version_id = version.get("ID")
+        profile.ds_creation_date = version.get("CREATED")
+        profile.ds_state = datastream.get("STATE")
+        profile.ds_mime = version.get("MIMETYPE")
+        profile.ds_format_uri = version.get("FORMAT_URI")
+        profile.ds_control_group = datastream.get("CONTROL_GROUP")
+        profile.ds_size = int(version.get("SIZE")) if version.get("SIZE") is not None else None
+        profile.ds_versionable = datastream.get("VERSIONABLE") == "true" if "VERSIONABLE" in datastream else None
+        digest = version.find(FOXML + "contentDigest")
+        if digest is not None:
+            profile.ds_checksum_type = digest.get("TYPE")
+            profile.ds_checksum = digest.get("DIGEST")
+        location = version.find(FOXML + "contentLocation")
+        if location is not None:
+            profile.ds_location = location.get("REF")
+            profile.ds_location_type = location.get("TYPE")
+        profile.props = {k: v for k, v in profile.__dict__.items() if k.startswith("ds_")}
+        return profile
+
+    @property
+    def ds_ids(self):
+        return list(self.versions)
+
+    def profile(self, ds_id):
+        """
+        :return: the profile of the current version of the datastream
+        """
+        versions = self.versions.get(ds_id)
+        if not versions:
+            raise FedoraException("object %s has no datastream %s" % (self.object_id, ds_id))
+        return versions[-1]
+
+    def content(self, ds_id):
+        """
+        :return: the content of the current version of the datastream, from the FOXML if it is inline
+        """
+        if ds_id in self.inline:
+            return self.inline[ds_id]
+        self.profile(ds_id)
+        return self.fedora.datastream(self.object_id, ds_id)
+
+    def file_item_metadata(self):
+        fmd = FileItemMetadata(self.object_id, self.fedora)
+        fmd.from_xml(self.content("EASY_FILE_METADATA"))
+        return fmd
+
+    def administrative_metadata(self):
+        amd = AdministrativeMetadata(self.object_id, self.fedora)
+        amd.from_xml(self.content("AMD"))
+        return amd
+
+    def easy_metadata(self):
+        emd = EasyMetadata(self.object_id, self.fedora)
+        emd.from_xml(self.content("EMD"))
+        return emd
+
+    def rels_ext(self):
+        rels_ext = RelsExt(self.object_id, self.fedora)
+        rels_ext.from_xml(self.content("RELS-EXT"))
+        return rels_ext
@@ -0,0 +1,220 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+import logging
+import math
+import threading
+import time
+
+LOG = logging.getLogger(__name__)
+
+# status codes that signal an overloaded server (or servlet container, or proxy in front of it)
+OVERLOAD_CODES = (429, 500, 502, 503, 504)
+
+
+class TokenBucket(object):
+    """
+    Classic token bucket. Tokens are added at `rate` per second up to a maximum of `burst`.
+    A call to :meth:`consume` blocks until the requested amount of tokens is available.
+
+    :param rate: number of tokens added per second
+    :param burst: maximum number of tokens in the bucket, default: `rate`
+    """
+
+    def __init__(self, rate, burst=None):
+        if rate <= 0:
+            raise ValueError("rate should be positive, not %s" % rate)
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else rate)
+        self.tokens = self.burst
+        self.stamp = time.monotonic()
+        self.lock = threading.Lock()
+
+    def consume(self, amount=1):
+        """
+        Take `amount` tokens from the bucket, wait until they are available.
+
+        An amount larger than `burst` is allowed: the bucket goes into debt and subsequent callers wait longer.
+
+        :param amount: number of tokens to take
+        :return: the number of seconds this call was waiting
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+            self.stamp = now
+            self.tokens -= amount
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+class Slot(object):
+    """
+    A permit handed out by a limiter. Report the outcome of the request with :meth:`observe`;
+    an exception leaving the with-block counts as a dropped request.
+    """
+
+    def __init__(self, limiter):
+        self.limiter = limiter
+        self.start = None
+        self.latency = None
+        self.overloaded = False
+
+    def observe(self, status_code):
+        """
+        Record the response of the server. The latency of the request is measured up to the first call of this
+        method, so that time spent in transferring the body of a response does not count.
+
+        :param status_code: http status code of the response
+        """
+        if self.latency is None:
+            self.latency = time.monotonic() - self.start
+        if status_code in OVERLOAD_CODES:
+            self.overloaded = True
+
+    def __enter__(self):
+        self.limiter.acquire()
+        self.start = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is not None and self.latency is None:
+            self.overloaded = True
+        if self.latency is None:
+            self.latency = time.monotonic() - self.start
+        self.limiter.release(self.latency, self.overloaded, self.start)
+        return False
+
+
+class Unlimited(object):
+    """
+    The limiter that does not limit. Used by :class:`fedora.rest.api.Fedora` when no limiter is given.
+    """
+
+    def acquire(self):
+        pass
+
+    def release(self, latency, overloaded=False, start=None):
+        pass
+
+    def slot(self):
+        return Slot(self)
+
+
+class AdaptiveLimiter(object):
+    """
+    Limits the number of concurrent requests to the Fedora server. The limit adapts to the behaviour of the server.
+
+    Two algorithms are available:
+
+    - ``aimd``: additive increase, multiplicative decrease. The limit grows by one for every `limit` successful
+      requests and is multiplied by `backoff` on overload. A request is considered overloaded if the server
+      answers with one of :data:`OVERLOAD_CODES`, if the request fails altogether or, if `latency_threshold` is given,
+      if the request takes longer than `latency_threshold` seconds.
+    - ``gradient``: the limit follows the ratio between the long-term and the short-term average latency. When
+      latency goes up, because requests are queueing at the server, the limit goes down. Overload is handled
+      as in ``aimd``.
+
+    Optionally, the request rate can be capped with a token bucket (`rate` requests per second, bursts of
+    `burst` requests). Example::
+
+        limiter = AdaptiveLimiter(initial_limit=4, max_limit=32, rate=50)
+        fedora = Fedora.from_file(limiter=limiter)
+
+    :param initial_limit: the concurrency limit to start with
+    :param min_limit: the limit never goes below this number
+    :param max_limit: the limit never goes above this number
+    :param algorithm: either ``aimd`` or ``gradient``, default: ``aimd``
+    :param backoff: factor with which the limit is multiplied on overload
+    :param latency_threshold: requests taking longer than this (in seconds) count as overloaded, default: `None`
+    :param rate: maximum number of requests per second, default: `None` (no maximum)
+    :param burst: size of bursts allowed above `rate`, default: `rate`
+    :param smoothing: weight of a new sample in the gradient algorithm
+    """
+
+    def __init__(self, initial_limit=4, min_limit=1, max_limit=64, algorithm="aimd", backoff=0.5,
+                 latency_threshold=None, rate=None, burst=None, smoothing=0.2):
+        if algorithm not in ("aimd", "gradient"):
+            raise ValueError("Unknown algorithm: %s" % algorithm)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.algorithm = algorithm
+        self.backoff = backoff
+        self.latency_threshold = latency_threshold
+        self.smoothing = smoothing
+        self.bucket = TokenBucket(rate, burst) if rate else None
+
+        self.limit = float(max(min_limit, min(initial_limit, max_limit)))
+        self.in_flight = 0
+        self.short_latency = None
+        self.long_latency = None
+        self.last_decrease = 0.0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        """
+        Wait until the number of requests in flight is below the current limit and, when a rate is given,
+        until a token is available.
+        """
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self.in_flight += 1
+        if self.bucket:
+            self.bucket.consume()
+
+    def release(self, latency, overloaded=False, start=None):
+        """
+        Return a permit and adjust the limit.
+
+        :param latency: seconds the request took
+        :param overloaded: did the server signal overload
+        :param start: :func:`time.monotonic` when the request started, default: `None` (`latency` seconds ago)
+        """
+        if self.latency_threshold is not None and latency > self.latency_threshold:
+            overloaded = True
+        with self.condition:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if start is None:
+                start = now - latency
+            if overloaded:
+                # requests that started before the last decrease saw the old limit, don't punish twice
+                if start >= self.last_decrease:
+                    self.limit = max(self.min_limit, self.limit * self.backoff)
+                    self.last_decrease = now
+                    LOG.debug("Overload, concurrency limit lowered to %.1f" % self.limit)
+            else:
+                self._track(latency)
+                if self.algorithm == "aimd":
+                    self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+                else:
+                    self._gradient()
+            self.condition.notify_all()
+
+    def slot(self):
+        """
+        :return: a :class:`Slot` to be used as context manager around a request
+        """
+        return Slot(self)
+
+    def _track(self, latency):
+        if self.short_latency is None:
+            self.short_latency = self.long_latency = latency
+        else:
+            self.short_latency += self.smoothing * (latency - self.short_latency)
+            self.long_latency += self.smoothing / 10 * (latency - self.long_latency)
+
+    def _gradient(self):
+        gradient = max(0.5, min(1.0, self.long_latency / self.short_latency)) if self.short_latency > 0 else 1.0
+        queue_size = math.sqrt(self.limit)
+        new_limit = self.limit * gradient + queue_size
+        new_limit = self.limit * (1 - self.smoothing) + new_limit * self.smoothing
+        self.limit = max(self.min_limit, min(self.max_limit, new_limit))
+        # let the long-term average drift back when latency stays high, otherwise the limit stays low forever
+        if self.long_latency < self.short_latency / 2:
+            self.long_latency = self.short_latency / 2
+
+    def __str__(self):
+        return "AdaptiveLimiter(%s, limit=%.1f, in_flight=%d)" % (self.algorithm, self.limit, self.in_flight)
@@ -0,0 +1,140 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+import collections
+import io
+import logging
+
+LOG = logging.getLogger(__name__)
+
+
+class DatastreamFile(io.RawIOBase):
+    """
+    Seekable, read-only file on the content of a datastream. Content is read with http Range requests in blocks of
+    `block_size` bytes. The last `cache_blocks` blocks are kept in memory; on a cache miss `read_ahead` more blocks
+    are fetched in the same request. Only the parts that are actually read are transferred, so tools like
+    :mod:`zipfile` can inspect large files at the cost of a few requests.
+
+    Usually obtained with :meth:`fedora.rest.api.Fedora.open`.
+
+    :param fedora: the Fedora instance
+    :param object_id: id of the digital object
+    :param ds_id: id of the datastream within this digital object
+    :param block_size: number of bytes in a block, default: 64 KiB
+    :param cache_blocks: number of blocks kept in memory, default: 64
+    :param read_ahead: number of blocks fetched after a missed block, default: 1
+    """
+
+    def __init__(self, fedora, object_id, ds_id, block_size=65536, cache_blocks=64, read_ahead=1):
+        super().__init__()
+        self.fedora = fedora
+        self.object_id = object_id
+        self.ds_id = ds_id
+        self.block_size = block_size
+        self.cache_blocks = max(1, cache_blocks)
+        self.read_ahead = read_ahead
+        self.position = 0
+        self.cache = collections.OrderedDict()
+        self.requests = 0
+        self.bytes_transferred = 0
+        self._size = None
+
+    @property
+    def size(self):
+        """
+        Size of the content in bytes. Known after the first request; if there was none, the first block is read.
+        """
+        if self._size is None:
+            self._blocks(0, 0)
+        return self._size
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self.position + offset
+        elif whence == io.SEEK_END:
+            if self.size is None:
+                raise io.UnsupportedOperation("size of %s/%s is unknown" % (self.object_id, self.ds_id))
+            position = self.size + offset
+        else:
+            raise ValueError("invalid whence: %s" % whence)
+        if position < 0:
+            raise ValueError("negative seek position %d" % position)
+        self.position = position
+        return self.position
+
+    def readinto(self, buffer):
+        view = memoryview(buffer).cast("B")
+        wanted = len(view)
+        if self._size is not None:
+            wanted = min(wanted, self._size - self.position)
+        if wanted <= 0:
+            return 0
+        first = self.position // self.block_size
+        last = (self.position + wanted - 1) // self.block_size
+        blocks = self._blocks(first, last)
+        count = 0
+        for index in range(first, last + 1):
+            block = blocks.get(index, b"")
+            offset = self.position + count - index * self.block_size
+            piece = block[offset:offset + wanted - count]
+            if len(piece) == 0:
+                break
+            view[count:count + len(piece)] = piece
+            count += len(piece)
+        self.position += count
+        return count
+
+    def _blocks(self, first, last):
+        """
+        :return: dict of index: block for the blocks `first` to `last` inclusive, fetching what is not cached
+        """
+        blocks = {}
+        missing = []
+        for index in range(first, last + 1):
+            if index in self.cache:
+                self.cache.move_to_end(index)
+                blocks[index] = self.cache[index]
+            else:
+                missing.append(index)
+        # fetch each run of consecutive missing blocks with one request, read ahead after the last run
+        runs = []
+        for index in missing:
+            if runs and runs[-1][1] == index - 1:
+                runs[-1][1] = index
+            else:
+                runs.append([index, index])
+        if runs:
+            runs[-1][1] += self.read_ahead
+            if self._size is not None:
+                runs[-1][1] = min(runs[-1][1], max(runs[-1][0], (self._size - 1) // self.block_size))
+        for run_first, run_last in runs:
+            start = run_first * self.block_size
+            data, total = self.fedora.get_range(self.object_id, self.ds_id, start, (run_last + 1) * self.block_size)
+            self.requests += 1
+            self.bytes_transferred += len(data)
+            if total is not None:
+                self._size = total
+            elif len(data) < (run_last - run_first + 1) * self.block_size:
+                # a short read means we hit the end
+                self._size = start + len(data)
+            for index in range(run_first, run_last + 1):
+                offset = (index - run_first) * self.block_size
+                block = data[offset:offset + self.block_size]
+                if len(block) == 0:
+                    break
+                self.cache[index] = block
+                if first <= index <= last:
+                    blocks[index] = block
+        while len(self.cache) > self.cache_blocks:
+            self.cache.popitem(last=False)
+        return blocks
@@ -0,0 +1,112 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class LocalServer(object):
+    """
+    An http server on localhost that answers like a Fedora server, for off-line tests of
+    :class:`fedora.rest.api.Fedora`. Responses are looked up by method and path (without query string) in `routes`;
+    a route is either a tuple (status, headers, body) or a callable that gets the request handler and returns one.
+    """
+
+    def __init__(self):
+        self.routes = {("GET", "/fedora"): (200, {}, b"Fedora")}
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, fmt, *args):
+                pass
+
+            def handle_method(self, method):
+                path = urllib.parse.urlsplit(self.path).path
+                if self.headers.get("Transfer-Encoding") == "chunked":
+                    self.body = self.read_chunked()
+                else:
+                    length = int(self.headers.get("Content-Length", 0))
+                    self.body = self.rfile.read(length) if length else b""
+                server.requests.append((method, self.path, dict(self.headers)))
+                route = server.routes.get((method, path), (404, {}, b"Not Found"))
+                status, headers, body = route(self) if callable(route) else route
+                self.send_response(status)
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                if "Content-Length" not in headers:
+                    self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if method != "HEAD":
+                    self.wfile.write(body)
+
+            def read_chunked(self):
+                chunks = []
+                while True:
+                    size = int(self.rfile.readline().strip().split(b";")[0], 16)
+                    chunk = self.rfile.read(size)
+                    self.rfile.readline()
+                    if size == 0:
+                        return b"".join(chunks)
+                    chunks.append(chunk)
+
+            def do_GET(self):
+                self.handle_method("GET")
+
+            def do_HEAD(self):
+                self.handle_method("HEAD")
+
+            def do_POST(self):
+                self.handle_method("POST")
+
+            def do_PUT(self):
+                self.handle_method("PUT")
+
+            def do_DELETE(self):
+                self.handle_method("DELETE")
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @staticmethod
+    def content(data, filename="file.bin", ranges=True, headers=None):
+        """
+        A route that serves `data` as datastream content, honouring Range headers if `ranges` is true.
+        """
+        def route(handler):
+            response_headers = {"Content-Type": "application/octet-stream",
+                                "Content-Disposition": 'attachment; filename="%s"' % filename}
+            response_headers.update(headers or {})
+            byte_range = handler.headers.get("Range")
+            if not ranges or byte_range is None:
+                return 200, response_headers, data
+            first, last = byte_range.split("=")[1].split("-")
+            if first == "":
+                start, end = max(0, len(data) - int(last)), len(data)
+            else:
+                start, end = int(first), min(len(data), int(last) + 1 if last else len(data))
+            if start >= len(data):
+                response_headers["Content-Range"] = "bytes */%d" % len(data)
+                return 416, response_headers, b""
+            response_headers["Content-Range"] = "bytes %d-%d/%d" % (start, end - 1, len(data))
+            return 206, response_headers, data[start:end]
+        return route
+
+    @property
+    def host(self):
+        return "http://127.0.0.1"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def paths(self, method="GET"):
+        return [path for m, path, headers in self.requests if m == method]
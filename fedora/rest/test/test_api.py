@@ -1,6 +1,10 @@
 #! /usr/bin/env python3
 # -*- coding: utf-8 -*-
+import contextlib
+import gzip
+import io
 import os
+import subprocess
 import unittest
 
 import logging
@@ -12,6 +16,7 @@ import fedora.rest.api as fra
 from fedora.utils import sha1_for_file
 
 from fedora.rest.ds import DatastreamProfile
+from fedora.rest.test.local_server import LocalServer
 
 test_file = "easy-file:219890"
 test_dataset = "easy-dataset:5958"
@@ -235,3 +240,119 @@ class TestFedora(unittest.TestCase):
         dsp.from_xml(response.text)
         print(dsp.props)
 
+
+class TestFedoraProbe(unittest.TestCase):
+
+    def setUp(self):
+        self.server = LocalServer().start()
+        self.server.routes[("GET", "/fedora/objects/easy-file:1/datastreams/DC/content")] = (200, {}, b"<dc/>")
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_eager(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            fra.Fedora(self.server.host, self.server.port, "user", "secret")
+        self.assertEqual(["/fedora"], self.server.paths())
+
+    def test_lazy(self):
+        fedora = fra.Fedora(self.server.host, self.server.port, "user", "secret", probe="lazy")
+        self.assertEqual([], self.server.paths())
+        with contextlib.redirect_stdout(io.StringIO()):
+            fedora.datastream("easy-file:1", "DC")
+            fedora.datastream("easy-file:1", "DC")
+        self.assertEqual(["/fedora"] + ["/fedora/objects/easy-file:1/datastreams/DC/content"] * 2,
+                         self.server.paths())
+
+    def test_lazy_fails_on_first_request(self):
+        self.server.routes[("GET", "/fedora")] = (500, {}, b"")
+        fedora = fra.Fedora(self.server.host, self.server.port, "user", "secret", probe="lazy")
+        with self.assertRaises(fra.FedoraException):
+            fedora.datastream("easy-file:1", "DC")
+
+    def test_off(self):
+        fedora = fra.Fedora(self.server.host, self.server.port, "user", "secret", probe="off")
+        self.assertEqual("<dc/>", fedora.datastream("easy-file:1", "DC"))
+        self.assertEqual(["/fedora/objects/easy-file:1/datastreams/DC/content"], self.server.paths())
+
+    def test_as_of_date_time(self):
+        self.server.routes[("GET", "/fedora/objects/easy-file:1/datastreams/DC/history")] = (200, {}, b"<h/>")
+        fedora = fra.Fedora(self.server.host, self.server.port, "user", "secret", probe="off")
+        fedora.datastream("easy-file:1", "DC", as_of_date_time="2016-01-01T00:00:00.000Z")
+        self.assertEqual("<h/>", fedora.datastream_history("easy-file:1", "DC"))
+        self.assertEqual(["/fedora/objects/easy-file:1/datastreams/DC/content"
+                          "?asOfDateTime=2016-01-01T00%3A00%3A00.000Z",
+                          "/fedora/objects/easy-file:1/datastreams/DC/history?format=xml"], self.server.paths())
+
+    def test_heavy_imports_are_lazy(self):
+        code = "import sys, fedora.worker; print('pandas' in sys.modules, 'rdflib' in sys.modules)"
+        out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__)))))
+        self.assertEqual("False False", out.stdout.strip())
+
+
+class TestCompression(unittest.TestCase):
+
+    def setUp(self):
+        self.xml = b"<emd>" + b"<title>a title</title>" * 1000 + b"</emd>"
+        self.server = LocalServer().start()
+        self.server.routes[("GET", "/fedora/objects/easy-dataset:1/datastreams/EMD/content")] = self.gzip_route
+        self.server.routes[("GET", "/fedora/objects/easy-file:1/datastreams/EASY_FILE/content")] = self.gzip_route
+
+    def tearDown(self):
+        self.server.stop()
+
+    def gzip_route(self, handler):
+        if "gzip" in handler.headers.get("Accept-Encoding", ""):
+            return 200, {"Content-Encoding": "gzip"}, gzip.compress(self.xml)
+        return 200, {}, self.xml
+
+    def test_text_is_compressed(self):
+        fedora = fra.Fedora(self.server.host, self.server.port, "user", "secret", probe="off")
+        self.assertEqual(self.xml.decode("utf-8"), fedora.datastream("easy-dataset:1", "EMD"))
+        self.assertIn("gzip", self.server.requests[-1][2]["Accept-Encoding"])
+
+    def test_content_is_not_compressed(self):
+        fedora = fra.Fedora(self.server.host, self.server.port, "user", "secret", probe="off")
+        with fedora.content_stream("easy-file:1", "EASY_FILE") as (raw, headers):
+            self.assertEqual(self.xml, raw.read())
+        self.assertEqual("identity", self.server.requests[-1][2]["Accept-Encoding"])
+
+    def test_no_compression(self):
+        fedora = fra.Fedora(self.server.host, self.server.port, "user", "secret", probe="off", compression=False)
+        self.assertEqual(self.xml.decode("utf-8"), fedora.datastream("easy-dataset:1", "EMD"))
+        self.assertEqual("identity", self.server.requests[-1][2]["Accept-Encoding"])
+
+    def test_unexpected_encoding(self):
+        self.server.routes[("GET", "/fedora/objects/easy-file:1/datastreams/EASY_FILE/content")] = \
+            (200, {"Content-Encoding": "gzip"}, gzip.compress(self.xml))
+        fedora = fra.Fedora(self.server.host, self.server.port, "user", "secret", probe="off")
+        with self.assertRaises(fra.FedoraException):
+            fedora.read_range("easy-file:1", "EASY_FILE", 0, 10)
+
+
+class TestStateChanges(unittest.TestCase):
+
+    def setUp(self):
+        self.server = LocalServer().start()
+        self.fedora = fra.Fedora(self.server.host, self.server.port, "user", "secret", probe="off")
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_requests(self):
+        self.server.routes[("PUT", "/fedora/objects/easy-file:1")] = (200, {}, b"2018-01-01T00:00:00.000Z")
+        self.server.routes[("DELETE", "/fedora/objects/easy-file:1")] = (200, {}, b"")
+        self.server.routes[("PUT", "/fedora/objects/easy-file:1/datastreams/EMD")] = (200, {}, b"<p/>")
+        self.server.routes[("DELETE", "/fedora/objects/easy-file:1/datastreams/EMD")] = (200, {}, b"[]")
+        self.fedora.modify_object("easy-file:1", state="I", log_message="bulk")
+        self.fedora.modify_datastream_state("easy-file:1", "EMD", "D")
+        self.fedora.purge_datastream("easy-file:1", "EMD")
+        self.fedora.purge_object("easy-file:1")
+        self.assertEqual([("PUT", "/fedora/objects/easy-file:1?state=I&logMessage=bulk"),
+                          ("PUT", "/fedora/objects/easy-file:1/datastreams/EMD?dsState=D&ignoreContent=true"),
+                          ("DELETE", "/fedora/objects/easy-file:1/datastreams/EMD"),
+                          ("DELETE", "/fedora/objects/easy-file:1")],
+                         [(method, path) for method, path, headers in self.server.requests])
+        with self.assertRaises(fra.FedoraException):
+            self.fedora.purge_object("easy-file:2")
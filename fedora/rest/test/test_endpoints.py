@@ -0,0 +1,121 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+from fedora.rest.api import Fedora, FedoraException
+from fedora.rest.endpoints import EndpointPool
+from fedora.rest.test.local_server import LocalServer
+
+DS_PATH = "/fedora/objects/easy-file:1/datastreams/DC/content"
+
+
+class TestEndpointPool(unittest.TestCase):
+
+    def test_least_outstanding(self):
+        pool = EndpointPool(["a", "b", "c"])
+        first = pool.select()
+        second = pool.select()
+        third = pool.select()
+        self.assertEqual(["a", "b", "c"], [first.url, second.url, third.url])
+        pool.release(second)
+        self.assertEqual("b", pool.select().url)
+
+    def test_mark_down(self):
+        pool = EndpointPool(["a", "b"], retry_after=60)
+        pool.mark_down(pool.primary)
+        for _ in range(3):
+            endpoint = pool.select()
+            self.assertEqual("b", endpoint.url)
+            pool.release(endpoint)
+        # all down: still select one
+        pool.mark_down(pool.endpoints[1])
+        self.assertIsNotNone(pool.select())
+        pool.retry_after = 0
+        pool.mark_up(pool.primary)
+        self.assertEqual("a", pool.select(exclude=[pool.endpoints[1]]).url)
+
+
+class TestFedoraReplicas(unittest.TestCase):
+
+    transport = None
+
+    def setUp(self):
+        self.servers = [LocalServer().start() for _ in range(3)]
+        for server in self.servers:
+            server.routes[("GET", DS_PATH)] = (200, {}, b"<dc/>")
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.fedora = Fedora(self.servers[0].host, self.servers[0].port, "user", "secret",
+                                 replicas=["%s:%d" % (s.host, s.port) for s in self.servers[1:]],
+                                 transport=self.transport)
+
+    def tearDown(self):
+        self.fedora.session.close()
+        for server in self.servers:
+            server.stop()
+
+    def test_reads_are_spread(self):
+        for _ in range(6):
+            self.assertEqual("<dc/>", self.fedora.datastream("easy-file:1", "DC"))
+        # requests are sequential, so every endpoint has 0 outstanding: they take turns
+        reads = [server.paths().count(DS_PATH) for server in self.servers]
+        self.assertEqual([2, 2, 2], reads)
+
+    def test_failover(self):
+        self.servers[0].routes[("GET", DS_PATH)] = (503, {}, b"")
+        self.servers[1].stop()
+        for _ in range(3):
+            self.assertEqual("<dc/>", self.fedora.datastream("easy-file:1", "DC"))
+        self.assertEqual(3, len(self.servers[2].paths()))
+        # both failing endpoints are marked down and skipped
+        self.assertEqual(2, len(self.servers[0].paths()))
+
+    def test_last_error_is_final(self):
+        for server in self.servers:
+            server.routes[("GET", DS_PATH)] = (503, {}, b"")
+        with self.assertRaises(FedoraException):
+            self.fedora.datastream("easy-file:1", "DC")
+
+    def test_unexpected_error(self):
+        with mock.patch.object(self.fedora.session, "request", side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                self.fedora.datastream("easy-file:1", "DC")
+        self.assertTrue(all(endpoint.outstanding == 0 for endpoint in self.fedora.endpoints.endpoints))
+
+    def test_check_endpoints(self):
+        self.servers[2].stop()
+        health = self.fedora.check_endpoints()
+        self.assertEqual([True, True, False], list(health.values()))
+
+    def test_from_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cfg_file = os.path.join(tmp, "fedora.cfg")
+            with open(cfg_file, "w") as cfg:
+                cfg.write("%s,%d,user,secret\n" % (self.servers[0].host, self.servers[0].port))
+                cfg.write("# replicas\n%s,%d\n\n" % (self.servers[1].host, self.servers[1].port))
+            with contextlib.redirect_stdout(io.StringIO()):
+                fedora = Fedora.from_file(cfg_file)
+        self.assertEqual(2, len(fedora.endpoints))
+
+
+@unittest.skipIf(httpx is None, "httpx is not installed")
+class TestFedoraReplicasHttp2(TestFedoraReplicas):
+    """
+    Failover and health checks with the transport of httpx, which raises errors of its own.
+    """
+
+    transport = "http2"
+
+    def test_refused_connection(self):
+        self.servers[0].stop()
+        self.assertEqual("<dc/>", self.fedora.datastream("easy-file:1", "DC"))
+        self.assertTrue(all(endpoint.outstanding == 0 for endpoint in self.fedora.endpoints.endpoints))
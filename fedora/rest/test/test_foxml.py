@@ -0,0 +1,91 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+import io
+import unittest
+
+from fedora.rest.api import FedoraException
+from fedora.rest.foxml import DigitalObject
+
+FOXML = b"""<?xml version="1.0" encoding="UTF-8"?>
+<foxml:digitalObject VERSION="1.1" PID="easy-dataset:1" xmlns:foxml="info:fedora/fedora-system:def/foxml#">
+  <foxml:objectProperties>
+    <foxml:property NAME="info:fedora/fedora-system:def/model#state" VALUE="Active"/>
+    <foxml:property NAME="info:fedora/fedora-system:def/model#label" VALUE="A dataset"/>
+    <foxml:property NAME="info:fedora/fedora-system:def/view#lastModifiedDate" VALUE="2017-02-01T00:00:00.000Z"/>
+  </foxml:objectProperties>
+  <foxml:datastream ID="AMD" STATE="A" CONTROL_GROUP="X" VERSIONABLE="true">
+    <foxml:datastreamVersion ID="AMD.0" LABEL="Administrative metadata" CREATED="2016-01-01T00:00:00.000Z"
+        MIMETYPE="text/xml" SIZE="100">
+      <foxml:contentDigest TYPE="DISABLED" DIGEST="none"/>
+      <foxml:xmlContent>
+        <damd:administrative-md xmlns:damd="http://easy.dans.knaw.nl/easy/dataset-administrative-metadata/">
+          <datasetState>DRAFT</datasetState>
+        </damd:administrative-md>
+      </foxml:xmlContent>
+    </foxml:datastreamVersion>
+    <foxml:datastreamVersion ID="AMD.1" LABEL="Administrative metadata" CREATED="2016-02-01T00:00:00.000Z"
+        MIMETYPE="text/xml" SIZE="120">
+      <foxml:contentDigest TYPE="DISABLED" DIGEST="none"/>
+      <foxml:xmlContent>
+        <damd:administrative-md xmlns:damd="http://easy.dans.knaw.nl/easy/dataset-administrative-metadata/">
+          <datasetState>PUBLISHED</datasetState>
+          <previousState>SUBMITTED</previousState>
+          <depositorId>user001</depositorId>
+        </damd:administrative-md>
+      </foxml:xmlContent>
+    </foxml:datastreamVersion>
+  </foxml:datastream>
+  <foxml:datastream ID="EMD" STATE="A" CONTROL_GROUP="X" VERSIONABLE="false">
+    <foxml:datastreamVersion ID="EMD.0" LABEL="Descriptive metadata" CREATED="2016-01-01T00:00:00.000Z"
+        MIMETYPE="text/xml" SIZE="300">
+      <foxml:xmlContent>
+        <emd:easymetadata xmlns:emd="http://easy.dans.knaw.nl/easy/easymetadata/"
+            xmlns:eas="http://easy.dans.knaw.nl/easy/easymetadata/eas/"
+            xmlns:dc="http://purl.org/dc/elements/1.1/">
+          <emd:identifier>
+            <dc:identifier eas:scheme="DOI">10.17026/dans-xyz</dc:identifier>
+            <dc:identifier eas:scheme="PID">urn:nbn:nl:ui:13-abc</dc:identifier>
+          </emd:identifier>
+        </emd:easymetadata>
+      </foxml:xmlContent>
+    </foxml:datastreamVersion>
+  </foxml:datastream>
+  <foxml:datastream ID="DATASET_LICENSE" STATE="I" CONTROL_GROUP="M" VERSIONABLE="true">
+    <foxml:datastreamVersion ID="DATASET_LICENSE.0" LABEL="license.pdf" CREATED="2016-01-01T00:00:00.000Z"
+        MIMETYPE="application/pdf" SIZE="4321">
+      <foxml:contentDigest TYPE="SHA-1" DIGEST="abc123"/>
+      <foxml:contentLocation TYPE="INTERNAL_ID" REF="easy-dataset:1+DATASET_LICENSE+DATASET_LICENSE.0"/>
+    </foxml:datastreamVersion>
+  </foxml:datastream>
+</foxml:digitalObject>
+"""
+
+
+class TestDigitalObject(unittest.TestCase):
+
+    def setUp(self):
+        self.obj = DigitalObject("easy-dataset:1", None)
+        self.obj.parse(io.BytesIO(FOXML))
+
+    def test_properties(self):
+        self.assertEqual({"state": "Active", "label": "A dataset", "mDate": "2017-02-01T00:00:00.000Z"},
+                         self.obj.properties)
+        self.assertEqual(["AMD", "EMD", "DATASET_LICENSE"], self.obj.ds_ids)
+
+    def test_profiles(self):
+        self.assertEqual(["AMD.0", "AMD.1"], [p.ds_version_id for p in self.obj.versions["AMD"]])
+        license_profile = self.obj.profile("DATASET_LICENSE")
+        self.assertEqual(("I", "M", 4321), (license_profile.ds_state, license_profile.ds_control_group,
+                                            license_profile.ds_size))
+        self.assertEqual(("SHA-1", "abc123"), (license_profile.ds_checksum_type, license_profile.ds_checksum))
+        self.assertEqual("INTERNAL_ID", license_profile.ds_location_type)
+        self.assertFalse(self.obj.profile("EMD").ds_versionable)
+        with self.assertRaises(FedoraException):
+            self.obj.profile("RELS-EXT")
+
+    def test_inline_metadata(self):
+        amd = self.obj.administrative_metadata()
+        self.assertEqual(("PUBLISHED", "SUBMITTED", "user001"),
+                         (amd.amd_dataset_state, amd.amd_previous_state, amd.amd_depositor_id))
+        emd = self.obj.easy_metadata()
+        self.assertEqual(("10.17026/dans-xyz", "urn:nbn:nl:ui:13-abc"), (emd.doi, emd.urn))
@@ -0,0 +1,108 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+import threading
+import time
+import unittest
+
+from fedora.rest.limiter import AdaptiveLimiter, TokenBucket
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def test_consume(self):
+        bucket = TokenBucket(rate=100, burst=2)
+        self.assertEqual(0, bucket.consume())
+        self.assertEqual(0, bucket.consume())
+        # bucket is empty, next token arrives in 1/100 s
+        waited = bucket.consume()
+        self.assertGreater(waited, 0)
+        self.assertLess(waited, 0.1)
+
+    def test_invalid_rate(self):
+        with self.assertRaises(ValueError):
+            TokenBucket(rate=0)
+
+
+class TestAdaptiveLimiter(unittest.TestCase):
+
+    def test_additive_increase(self):
+        limiter = AdaptiveLimiter(initial_limit=2, max_limit=4)
+        for _ in range(100):
+            with limiter.slot() as slot:
+                slot.observe(200)
+        self.assertEqual(4, limiter.limit)
+        self.assertEqual(0, limiter.in_flight)
+
+    def test_multiplicative_decrease(self):
+        limiter = AdaptiveLimiter(initial_limit=16, min_limit=2)
+        first = limiter.slot().__enter__()
+        second = limiter.slot().__enter__()
+        first.observe(503)
+        first.__exit__(None, None, None)
+        self.assertEqual(8, limiter.limit)
+        # the second request was in flight before the decrease, it does not count
+        second.observe(503)
+        second.__exit__(None, None, None)
+        self.assertEqual(8, limiter.limit)
+        with limiter.slot() as slot:
+            slot.observe(503)
+        self.assertEqual(4, limiter.limit)
+
+    def test_decrease_after_slow_body(self):
+        limiter = AdaptiveLimiter(initial_limit=16, min_limit=2)
+        first = limiter.slot().__enter__()
+        second = limiter.slot().__enter__()
+        # the second request got its status before the decrease, its body came after it
+        second.observe(503)
+        time.sleep(0.01)
+        first.observe(503)
+        first.__exit__(None, None, None)
+        self.assertEqual(8, limiter.limit)
+        second.__exit__(None, None, None)
+        self.assertEqual(8, limiter.limit)
+
+    def test_exception_is_overload(self):
+        limiter = AdaptiveLimiter(initial_limit=8)
+        with self.assertRaises(IOError):
+            with limiter.slot():
+                raise IOError("connection reset")
+        self.assertEqual(4, limiter.limit)
+        self.assertEqual(0, limiter.in_flight)
+
+    def test_latency_threshold(self):
+        limiter = AdaptiveLimiter(initial_limit=8, latency_threshold=0.0)
+        with limiter.slot() as slot:
+            time.sleep(0.001)
+            slot.observe(200)
+        self.assertEqual(4, limiter.limit)
+
+    def test_gradient(self):
+        limiter = AdaptiveLimiter(initial_limit=4, max_limit=16, algorithm="gradient")
+        for _ in range(50):
+            limiter.acquire()
+            limiter.release(0.01)
+        self.assertGreater(limiter.limit, 4)
+        high = limiter.limit
+        for _ in range(20):
+            limiter.acquire()
+            limiter.release(1.0)
+        self.assertLess(limiter.limit, high)
+
+    def test_concurrency_is_limited(self):
+        limiter = AdaptiveLimiter(initial_limit=3, max_limit=3)
+        peak = [0]
+        lock = threading.Lock()
+
+        def work():
+            with limiter.slot() as slot:
+                with lock:
+                    peak[0] = max(peak[0], limiter.in_flight)
+                time.sleep(0.01)
+                slot.observe(200)
+
+        threads = [threading.Thread(target=work) for _ in range(12)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(3, peak[0])
@@ -0,0 +1,119 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+import io
+import os
+import tarfile
+import unittest
+import zipfile
+
+from fedora.rest.api import Fedora
+from fedora.rest.test.local_server import LocalServer
+
+CONTENT_PATH = "/fedora/objects/easy-file:1/datastreams/EASY_FILE/content"
+
+
+class TestRangeReads(unittest.TestCase):
+
+    def setUp(self):
+        self.data = os.urandom(300000)
+        self.server = LocalServer().start()
+        self.server.routes[("GET", CONTENT_PATH)] = LocalServer.content(self.data)
+        self.fedora = Fedora(self.server.host, self.server.port, "user", "secret", probe="off")
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_read_range(self):
+        self.assertEqual(self.data[10:20], self.fedora.read_range("easy-file:1", "EASY_FILE", 10, 20))
+        self.assertEqual(self.data[-22:], self.fedora.read_range("easy-file:1", "EASY_FILE", -22))
+        self.assertEqual(self.data[299990:], self.fedora.read_range("easy-file:1", "EASY_FILE", 299990))
+        self.assertEqual((b"", 300000), self.fedora.get_range("easy-file:1", "EASY_FILE", 400000))
+
+    def test_read_range_without_server_support(self):
+        self.server.routes[("GET", CONTENT_PATH)] = LocalServer.content(self.data, ranges=False)
+        self.assertEqual(self.data[70000:70010], self.fedora.read_range("easy-file:1", "EASY_FILE", 70000, 70010))
+        self.assertEqual(self.data[-5:], self.fedora.read_range("easy-file:1", "EASY_FILE", -5))
+
+    def test_datastream_file(self):
+        with self.fedora.open("easy-file:1", "EASY_FILE", block_size=1000, cache_blocks=4) as f:
+            self.assertEqual(self.data[:10], f.read(10))
+            self.assertEqual(300000, f.size)
+            f.seek(-100, io.SEEK_END)
+            self.assertEqual(self.data[-100:], f.read())
+            self.assertEqual(b"", f.read(10))
+            f.seek(1500)
+            self.assertEqual(self.data[1500:4500], f.read(3000))
+            requests = f.requests
+            # block 4 was read ahead
+            f.seek(4500)
+            self.assertEqual(self.data[4500:4900], f.read(400))
+            self.assertEqual(requests, f.requests)
+            self.assertLessEqual(len(f.cache), 4)
+
+    def test_zip_tail(self):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w") as archive:
+            archive.writestr("big.bin", os.urandom(500000))
+            archive.writestr("small.txt", "hello")
+        self.server.routes[("GET", CONTENT_PATH)] = LocalServer.content(buffer.getvalue())
+        f = self.fedora.open("easy-file:1", "EASY_FILE", block_size=4096)
+        with zipfile.ZipFile(f) as archive:
+            self.assertEqual(["big.bin", "small.txt"], archive.namelist())
+            self.assertEqual(b"hello", archive.read("small.txt"))
+        self.assertLess(f.bytes_transferred, 50000)
+
+
+class TestStreaming(unittest.TestCase):
+
+    def setUp(self):
+        self.data = os.urandom(300000)
+        self.server = LocalServer().start()
+        self.server.routes[("GET", CONTENT_PATH)] = LocalServer.content(self.data, headers={"X-Test": "yes"})
+        self.fedora = Fedora(self.server.host, self.server.port, "user", "secret", probe="off")
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_stream(self):
+        class PartialSink(object):
+            """takes at most 1000 bytes per write, like a non-blocking socket"""
+            def __init__(self):
+                self.data = bytearray()
+
+            def write(self, b):
+                self.data += b[:1000]
+                return min(len(b), 1000)
+
+        sink = PartialSink()
+        meta = self.fedora.stream("easy-file:1", "EASY_FILE", sink, buffer_size=65536)
+        self.assertEqual(self.data, bytes(sink.data))
+        self.assertEqual((300000, "yes"), (meta["bytes"], meta["X-Test"]))
+
+    def test_tar_without_temporary_files(self):
+        archive = io.BytesIO()
+        with tarfile.open(fileobj=archive, mode="w") as tar, \
+                self.fedora.content_stream("easy-file:1", "EASY_FILE") as (raw, headers):
+            info = tarfile.TarInfo("easy-file-1.bin")
+            info.size = int(headers["Content-Length"])
+            tar.addfile(info, raw)
+        archive.seek(0)
+        with tarfile.open(fileobj=archive) as tar:
+            self.assertEqual(self.data, tar.extractfile("easy-file-1.bin").read())
+
+    def test_upload_from_other_repository(self):
+        target_path = "/fedora/objects/easy-file:2/datastreams/EASY_FILE"
+        received = []
+        self.server.routes[("POST", target_path)] = lambda handler: received.append(handler.body) or (201, {}, b"")
+        with self.fedora.content_stream("easy-file:1", "EASY_FILE") as (raw, headers):
+            self.fedora.upload_datastream("easy-file:2", "EASY_FILE", raw, "a.bin", "application/octet-stream")
+        method, path, headers = self.server.requests[-1]
+        self.assertEqual("POST", method)
+        self.assertIn("controlGroup=M", path)
+        self.assertEqual("chunked", headers["Transfer-Encoding"])
+        self.assertEqual([self.data], received)
+
+        received.clear()
+        self.server.routes[("PUT", target_path)] = lambda handler: received.append(handler.body) or (200, {}, b"")
+        self.fedora.upload_datastream("easy-file:2", "EASY_FILE", io.BytesIO(b"abc"), "a.txt", "text/plain",
+                                      modify=True)
+        self.assertEqual([b"abc"], received)
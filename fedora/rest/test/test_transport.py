@@ -0,0 +1,91 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+import importlib.util
+import io
+import os
+import tarfile
+import tempfile
+import unittest
+
+from fedora.rest.api import Fedora
+from fedora.rest.test.local_server import LocalServer
+from fedora.rest.transport import RequestsTransport, IteratorStream
+
+# the http2 extra of httpx brings h2
+HTTPX = importlib.util.find_spec("httpx") is not None and importlib.util.find_spec("h2") is not None
+
+CONTENT_PATH = "/fedora/objects/easy-file:1/datastreams/EASY_FILE/content"
+
+
+class TestTransport(unittest.TestCase):
+
+    def test_default_transport(self):
+        fedora = Fedora("localhost", 1, "user", "secret", probe="off")
+        self.assertIsInstance(fedora.session, RequestsTransport)
+        self.assertEqual(("user", "secret"), fedora.session.auth)
+        self.assertRaises(ValueError, Fedora, "localhost", 1, "user", "secret", probe="off", transport="spdy")
+
+    def test_iterator_stream(self):
+        stream = IteratorStream(iter([b"ab", b"", b"cde", b"f"]))
+        self.assertEqual(b"abcd", stream.read(4))
+        self.assertEqual(b"ef", stream.read(4))
+        self.assertEqual(b"", stream.read(4))
+
+
+@unittest.skipIf(not HTTPX, "httpx[http2] is not installed")
+class TestHttpxTransport(unittest.TestCase):
+    """
+    The transport against a local server on plain http that only speaks HTTP/1.1: this covers the fallback of
+    the transport to HTTP/1.1, not HTTP/2 itself.
+    """
+
+    def setUp(self):
+        self.data = os.urandom(300000)
+        self.server = LocalServer().start()
+        self.server.routes[("GET", CONTENT_PATH)] = LocalServer.content(self.data, headers={"X-Test": "yes"})
+        self.fedora = Fedora(self.server.host, self.server.port, "user", "secret", probe="off", transport="http2")
+
+    def tearDown(self):
+        self.fedora.session.close()
+        self.server.stop()
+
+    def test_datastream(self):
+        self.server.routes[("GET", "/fedora/objects/easy-file:1/datastreams/DC/content")] = \
+            (200, {"Content-Type": "text/xml"}, b"<dc/>")
+        self.assertEqual("<dc/>", self.fedora.datastream("easy-file:1", "DC", as_of_date_time="2020-01-01"))
+        method, path, headers = self.server.requests[-1]
+        self.assertIn("asOfDateTime=2020-01-01", path)
+        self.assertTrue(headers["Authorization"].startswith("Basic "))
+
+    def test_http_version(self):
+        response = self.fedora.session.request("get", self.fedora.url + CONTENT_PATH[len("/fedora"):])
+        self.assertEqual(200, response.status_code)
+        self.assertEqual("HTTP/1.1", response.response.http_version)
+
+    def test_download(self):
+        with tempfile.TemporaryDirectory() as folder:
+            meta = self.fedora.download("easy-file:1", "EASY_FILE", folder=folder)
+            with open(meta["local-path"], "rb") as f:
+                self.assertEqual(self.data, f.read())
+        self.assertEqual("yes", meta["X-Test"])
+
+    def test_content_stream(self):
+        archive = io.BytesIO()
+        with tarfile.open(fileobj=archive, mode="w") as tar, \
+                self.fedora.content_stream("easy-file:1", "EASY_FILE") as (raw, headers):
+            info = tarfile.TarInfo("easy-file-1.bin")
+            info.size = int(headers["Content-Length"])
+            tar.addfile(info, raw)
+        archive.seek(0)
+        with tarfile.open(fileobj=archive) as tar:
+            self.assertEqual(self.data, tar.extractfile("easy-file-1.bin").read())
+
+    def test_upload(self):
+        received = []
+        self.server.routes[("POST", "/fedora/objects/easy-file:2/datastreams/EASY_FILE")] = \
+            lambda handler: received.append(handler.body) or (201, {}, b"")
+        self.fedora.upload_datastream("easy-file:2", "EASY_FILE", io.BytesIO(self.data), "a.bin",
+                                      "application/octet-stream")
+        self.assertEqual([self.data], received)
+        method, path, headers = self.server.requests[-1]
+        self.assertIn("controlGroup=M", path)
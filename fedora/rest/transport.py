@@ -0,0 +1,221 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+import contextlib
+import functools
+import io
+import logging
+import urllib.parse
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from urllib3.util.request import ACCEPT_ENCODING
+
+LOG = logging.getLogger(__name__)
+
+USER_AGENT = 'Mozilla/5.0'
+
+
+class RequestsTransport(object):
+    """
+    Sends requests with a :class:`requests.Session`: HTTP/1.1, one request at a time per connection.
+    The default transport of :class:`fedora.rest.api.Fedora`.
+
+    A transport has a method `request(method, url, **kwargs)` that takes the keyword arguments `params`, `data`,
+    `files`, `headers`, `stream` and `timeout` of :meth:`requests.Session.request` and returns an object that
+    behaves like a :class:`requests.Response`, a method `get(url, **kwargs)`, an attribute `auth`, an attribute
+    `accept_encoding` with the content codings it decodes and a method `close()`.
+
+    :param auth: tuple (username, password)
+    :param headers: headers sent with every request
+    """
+
+    # content codings that urllib3 decodes, zstd if the package zstandard is installed
+    accept_encoding = ", ".join(ACCEPT_ENCODING.split(","))
+
+    def __init__(self, auth=None, headers=None):
+        self.session = requests.Session()
+        self.session.headers = headers if headers is not None else {'User-Agent': USER_AGENT}
+        self.session.auth = auth
+
+    @property
+    def auth(self):
+        return self.session.auth
+
+    @auth.setter
+    def auth(self, auth):
+        self.session.auth = auth
+
+    def request(self, method, url, **kwargs):
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request("get", url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+class HttpxTransport(object):
+    """
+    Sends requests with an :class:`httpx.Client` that speaks HTTP/2. Concurrent requests from several threads
+    are multiplexed as streams over a few connections, instead of each taking a connection of its own, which
+    cuts latency for many small requests. Needs the package httpx with the extra http2 (`pip install httpx[http2]`).
+
+    HTTP/2 is negotiated during the TLS handshake, so on https urls; the connection falls back to HTTP/1.1 if the
+    server does not offer it. For a server on plain http that is known to speak HTTP/2, set `prior_knowledge`.
+
+    :param auth: tuple (username, password)
+    :param headers: headers sent with every request
+    :param http2: use HTTP/2 if the server supports it, default: `True`
+    :param prior_knowledge: speak HTTP/2 without negotiation, needed for plain http, default: `False`
+    :param max_connections: maximum number of connections, default: 10
+    :param timeout: seconds to wait for connect, read and write, default: 60
+    """
+
+    def __init__(self, auth=None, headers=None, http2=True, prior_knowledge=False, max_connections=10,
+                 timeout=60.0):
+        # only import httpx when this transport is used
+        import httpx
+
+        self.auth = auth
+        self.timeout = timeout
+        self.accept_encoding = "gzip, deflate"
+        try:
+            import zstandard  # noqa: F401
+            self.accept_encoding += ", zstd"
+        except ImportError:
+            pass
+        self.client = httpx.Client(http1=not (http2 and prior_knowledge), http2=http2,
+                                   headers=headers if headers is not None else {'User-Agent': USER_AGENT},
+                                   limits=httpx.Limits(max_connections=max_connections), timeout=timeout)
+
+    def request(self, method, url, params=None, data=None, files=None, headers=None, stream=False, timeout=None):
+        if params:
+            # httpx replaces the query of the url with params, requests adds them
+            url += ("&" if "?" in url else "?") + urllib.parse.urlencode(params)
+        kwargs = {}
+        if files is not None:
+            kwargs["files"] = files
+            kwargs["data"] = data
+        elif isinstance(data, dict):
+            kwargs["data"] = data
+        elif hasattr(data, "read"):
+            kwargs["content"] = iter(functools.partial(data.read, 1 << 16), b"")
+        elif data is not None:
+            kwargs["content"] = data
+        request = self.client.build_request(method.upper(), url, headers=headers,
+                                            timeout=timeout if timeout is not None else self.timeout, **kwargs)
+        with requests_errors():
+            response = self.client.send(request, auth=self.auth, stream=stream)
+        return HttpxResponse(response)
+
+    def get(self, url, **kwargs):
+        return self.request("get", url, **kwargs)
+
+    def close(self):
+        self.client.close()
+
+
+@contextlib.contextmanager
+def requests_errors():
+    """
+    Raise the exceptions of requests for errors of httpx in the with-block, so that callers of a transport
+    catch the same errors, whatever the transport: connect errors and timeouts lead to failover in
+    :meth:`fedora.rest.api.Fedora.read`.
+    """
+    import httpx
+
+    try:
+        yield
+    except httpx.ConnectTimeout as e:
+        raise requests.ConnectTimeout(str(e)) from e
+    except httpx.ReadTimeout as e:
+        raise requests.ReadTimeout(str(e)) from e
+    except httpx.TimeoutException as e:
+        raise requests.Timeout(str(e)) from e
+    except httpx.TransportError as e:
+        raise requests.ConnectionError(str(e)) from e
+
+
+class HttpxResponse(object):
+    """
+    An :class:`httpx.Response` with the parts of the interface of :class:`requests.Response` that
+    :class:`fedora.rest.api.Fedora` uses.
+    """
+
+    def __init__(self, response):
+        self.response = response
+        self.status_code = response.status_code
+        self.reason = response.reason_phrase
+        # keep the names of the headers as the server sent them
+        self.headers = CaseInsensitiveDict((k.decode("latin-1"), v.decode("latin-1"))
+                                           for k, v in response.headers.raw)
+        self._raw = None
+
+    @property
+    def content(self):
+        with requests_errors():
+            return self.response.read()
+
+    @property
+    def text(self):
+        with requests_errors():
+            self.response.read()
+        return self.response.text
+
+    def iter_content(self, chunk_size=1):
+        return self._iter_bytes(chunk_size)
+
+    @property
+    def raw(self):
+        if self._raw is None:
+            self._raw = IteratorStream(self._iter_bytes())
+        return self._raw
+
+    def _iter_bytes(self, chunk_size=None):
+        with requests_errors():
+            yield from self.response.iter_bytes(chunk_size)
+
+    def close(self):
+        self.response.close()
+
+
+class IteratorStream(io.RawIOBase):
+    """
+    Readable stream over an iterator of bytes.
+    """
+
+    def __init__(self, iterator):
+        super().__init__()
+        self.iterator = iterator
+        self.pending = b""
+        # compatibility with urllib3: content is always decoded
+        self.decode_content = True
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        # like urllib3: only return less than size at the end of the stream
+        if size is None or size < 0:
+            return self.readall()
+        chunks = []
+        while size > 0:
+            chunk = super().read(size)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            size -= len(chunk)
+        return b"".join(chunks)
+
+    def readinto(self, buffer):
+        while not self.pending:
+            self.pending = next(self.iterator, None)
+            if self.pending is None:
+                self.pending = b""
+                return 0
+        view = memoryview(buffer).cast("B")
+        n = min(len(view), len(self.pending))
+        view[:n] = self.pending[:n]
+        self.pending = self.pending[n:]
+        return n
@@ -0,0 +1,253 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import time
+
+from fedora import events, utils, worklog
+from fedora.rest.api import Fedora
+from fedora.worker import Worker
+
+LOG = logging.getLogger(__name__)
+
+
+def download_sharded(id_list, cfg_file=None,
+                     shards=4,
+                     dump_dir="worker-downloads",
+                     log_file="worker-log.csv",
+                     id_in_path=True,
+                     chunk_size=1024,
+                     reporting=True,
+                     log_format=None,
+                     max_workers=1,
+                     fedora_kwargs=None,
+                     report_interval=1.0,
+                     cas_dir=None,
+                     fingerprint_file=None,
+                     dedupe=False,
+                     use_foxml=False,
+                     bandwidth=None):
+    """
+    Run :meth:`fedora.worker.Worker.download_batch` in `shards` processes.
+
+    `id_list` is read once, by this process, and split into an id file per shard next to `log_file`: id number i
+    goes to shard i % `shards`. Each shard has its own :class:`fedora.rest.api.Fedora` instance, made with
+    :meth:`fedora.rest.api.Fedora.from_file`, and writes its own partial work-log next to `log_file`. When all
+    shards are done the partial work-logs are merged round-robin into `log_file`, which gives the rows in the
+    order of `id_list`, and removed with the id files. A partial work-log that cannot be read, f.i. the parquet
+    file of a shard that crashed, is left next to `log_file` with the suffix '.broken', see :func:`merge_work_logs`.
+
+    Progress of all shards together is reported as by :meth:`Worker.download_batch`: the shards pass the start
+    and the work-log row of each file to this process, which keeps one :class:`fedora.events.ProgressReporter`.
+
+    On Ctrl-C the shards stop taking new ids, finish the files they are working on and close their partial
+    work-logs. The rows of finished files are merged into `log_file` and KeyboardInterrupt is raised again.
+    A second Ctrl-C terminates the shards; the rows that made it into the partial work-logs are merged.
+
+    :param id_list: a list or generator of file-id's, or the name of the file that contains this list
+    :param cfg_file: configuration file for the Fedora instances, default: see :meth:`Fedora.from_file`
+    :param shards: number of processes
+    :param dump_dir: where to store downloaded files
+    :param log_file: where to write the merged work-log
+    :param id_in_path: should (the number part of) the object_id be part of the local path, default: `True`
+    :param chunk_size: size of chuncks for read-write operation, default: 1024
+    :param reporting: progress of all shards, `True` for the console, `False` for none, or a callable that gets
+        the events, see :func:`fedora.events.reporter`, default: `True`
+    :param log_format: format of the work-log, see :meth:`Worker.download_batch`
+    :param max_workers: number of threads within each shard, default: 1
+    :param fedora_kwargs: keyword arguments for the Fedora instances
+    :param report_interval: seconds between progress events
+    :param cas_dir: directory of a content store shared by all shards, see :meth:`Worker.download_batch`
+    :param fingerprint_file: database of a fingerprint cache shared by all shards, see
+        :meth:`Worker.download_batch`
+    :param dedupe: download ids that occur more than once in `id_list` only once, see :meth:`Worker.id_iter`
+    :param use_foxml: get metadata from one objectXML request per file, see :meth:`Worker.download_batch`
+    :param bandwidth: maximum number of bytes per second of all shards together, each shard gets an equal part,
+        default: `None` (no maximum)
+    :return: count of checksum errors
+    """
+    work_log = os.path.abspath(log_file)
+    os.makedirs(os.path.dirname(work_log), exist_ok=True)
+    fmt = log_format or worklog.log_format(work_log)
+    base, ext = os.path.splitext(work_log)
+    part_files = ["%s.part-%d%s" % (base, shard, ext) for shard in range(shards)]
+    id_files = ["%s.part-%d.ids" % (base, shard) for shard in range(shards)]
+    total = _split_ids(id_list, id_files, dedupe)
+
+    context = multiprocessing.get_context("spawn")
+    taken = context.Value('q', 0)
+    stop = context.Event()
+    messages = context.Queue()
+    processes = []
+    for shard in range(shards):
+        process = context.Process(target=_run_shard, name="shard-%d" % shard,
+                                  args=(id_files[shard], cfg_file, fedora_kwargs or {}, dump_dir,
+                                        part_files[shard], id_in_path, chunk_size, fmt, max_workers, cas_dir,
+                                        fingerprint_file, use_foxml,
+                                        None if bandwidth is None else bandwidth / shards, taken, stop,
+                                        messages))
+        process.start()
+        processes.append(process)
+
+    progress = events.reporter(reporting, total, report_interval)
+    interrupted = False
+    finished = False
+    try:
+        with progress:
+            try:
+                _follow(processes, messages, progress, report_interval)
+            except KeyboardInterrupt:
+                interrupted = True
+                LOG.warning("Interrupted with %d of %d ids taken, waiting for shards to finish the files they are "
+                            "working on" % (taken.value, total))
+                stop.set()
+                _follow(processes, messages, progress, report_interval)
+        finished = True
+    finally:
+        for process in processes:
+            if not finished and process.is_alive():
+                LOG.warning("Interrupted again, terminating %s" % process.name)
+                process.terminate()
+            process.join()
+            if process.exitcode != 0:
+                LOG.error("%s exited with code %s" % (process.name, process.exitcode))
+        try:
+            columns = worklog.TRANSFER_COLUMNS if cas_dir or fingerprint_file else worklog.WORK_LOG_COLUMNS
+            checksum_error_count = merge_work_logs([f for f in part_files if os.path.exists(f)], work_log, fmt,
+                                                   columns)
+            for part_file in part_files:
+                if os.path.exists(part_file):
+                    os.remove(part_file)
+        finally:
+            for id_file in id_files:
+                if os.path.exists(id_file):
+                    os.remove(id_file)
+    if interrupted:
+        raise KeyboardInterrupt
+    return checksum_error_count
+
+
+def merge_work_logs(part_files, log_file, log_format=None, columns=worklog.WORK_LOG_COLUMNS):
+    """
+    Merge partial work-logs round-robin: first row of the first part, first row of the second part, etc.
+    Parts that run out of rows are skipped. The merged work-log is written to a temporary file first
+    and then moved to `log_file`.
+
+    A part that cannot be read at all, like a parquet file without footer, is left out and renamed with the
+    suffix '.broken'; the rows of the files in it are lost and these files should be downloaded again.
+    Incomplete rows at the end of a csv part, written by a shard that crashed, are left out.
+
+    :param part_files: the partial work-logs, in shard order
+    :param log_file: the merged work-log
+    :param log_format: format of all work-logs, default: derived from the extension of `log_file`
+    :param columns: columns of the merged work-log, default: :data:`fedora.worklog.WORK_LOG_COLUMNS`
+    :return: count of checksum errors in the merged work-log
+    """
+    fmt = log_format or worklog.log_format(log_file)
+    base, ext = os.path.splitext(log_file)
+    tmp_file = base + ".merging" + ext
+    checksum_error_count = 0
+    readers = [_read_part(part_file, fmt) for part_file in part_files]
+    with worklog.open_work_log(tmp_file, fmt, columns=columns) as writer:
+        while readers:
+            for reader in list(readers):
+                row = next(reader, None)
+                if row is None:
+                    readers.remove(reader)
+                    continue
+                writer.write(row)
+                if row[14]:
+                    checksum_error_count += 1
+    os.replace(tmp_file, log_file)
+    return checksum_error_count
+
+
+def _read_part(part_file, fmt):
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+
+        try:
+            # reads the footer, fails for a file that was not closed
+            pq.ParquetFile(part_file)
+        except (OSError, ValueError) as e:
+            LOG.error("Cannot read partial work-log %s, renamed to %s.broken: %s" % (part_file, part_file, e))
+            os.replace(part_file, part_file + ".broken")
+            return
+    for row in worklog.read_work_log(part_file, fmt, dialect=utils.RFC4180):
+        if len(row) < len(worklog.WORK_LOG_COLUMNS):
+            LOG.error("Incomplete row in partial work-log %s: %s" % (part_file, row))
+            continue
+        yield row
+
+
+def _split_ids(id_list, id_files, dedupe=False):
+    files = [open(id_file, "w") for id_file in id_files]
+    count = 0
+    try:
+        for count, object_id in enumerate(Worker.id_iter(id_list, dedupe), 1):
+            files[(count - 1) % len(files)].write(object_id + "\n")
+    finally:
+        for f in files:
+            f.close()
+    return count
+
+
+def _follow(processes, messages, progress, interval):
+    # pass what the shards report to `progress` until all shards are done
+    while any(process.is_alive() for process in processes):
+        time.sleep(interval)
+        _drain(messages, progress)
+    _drain(messages, progress)
+
+
+def _drain(messages, progress):
+    while True:
+        try:
+            row = messages.get_nowait()
+        except queue.Empty:
+            return
+        if row is None:
+            progress.started()
+        else:
+            progress.finished(row)
+
+
+class _ShardProgress(events.ProgressReporter):
+    """
+    Progress of a shard, passed on to the parent process: `None` for a file started, the work-log row for a file
+    finished.
+    """
+
+    def __init__(self, messages):
+        super().__init__()
+        self.messages = messages
+
+    def started(self):
+        self.messages.put(None)
+
+    def finished(self, row):
+        self.messages.put(tuple(row))
+
+
+def _run_shard(id_file, cfg_file, fedora_kwargs, dump_dir, part_file, id_in_path, chunk_size, log_format,
+               max_workers, cas_dir, fingerprint_file, use_foxml, bandwidth, taken, stop, messages):
+    # Ctrl-C is handled by the parent process, which sets `stop`
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    fedora = Fedora.from_file(cfg_file, **fedora_kwargs)
+    worker = Worker(fedora)
+    ids = _shard_iter(id_file, taken, stop)
+    worker.download_batch(ids, dump_dir, part_file, id_in_path, chunk_size, reporting=_ShardProgress(messages),
+                          log_format=log_format, max_workers=max_workers, cas_dir=cas_dir,
+                          fingerprint_file=fingerprint_file, use_foxml=use_foxml, bandwidth=bandwidth)
+
+
+def _shard_iter(id_list, taken, stop):
+    for object_id in Worker.id_iter(id_list):
+        if stop.is_set():
+            break
+        yield object_id
+        with taken.get_lock():
+            taken.value += 1
@@ -0,0 +1,151 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+import collections
+import logging
+import queue
+import threading
+
+from fedora import utils
+from fedora.rest.api import FedoraException
+from fedora.rest.ds import DatastreamProfile
+
+LOG = logging.getLogger(__name__)
+
+
+class SizeScheduler(object):
+    """
+    Runs a job on many files of very different sizes so that it finishes early.
+
+    Files of at least `large_size` bytes are done largest first on `large_workers` dedicated threads, so that
+    the biggest transfers start at once instead of last. The other files are sorted largest first as well and
+    packed into batches of at most `batch_files` files or `batch_bytes` bytes; the remaining threads take a
+    batch at a time, so tiny files do not take turns with the large ones. A thread that runs out of its own kind
+    of work takes the other kind. Files of unknown size count as small files of size 0.
+
+    Results come in the order in which files are done, not in the order in which they were given. Example::
+
+        scheduler = SizeScheduler(max_workers=8, large_workers=2)
+        sizes = prefetch_sizes(ids, fedora)
+        for row in scheduler.map(download, ids, sizes):
+            print(row)
+
+    :param max_workers: total number of threads, default: 4
+    :param large_workers: number of threads that prefer large files, default: 1
+    :param large_size: size in bytes from which a file is large, default: 1 GiB
+    :param batch_bytes: maximum number of bytes in a batch of small files, default: 64 MiB
+    :param batch_files: maximum number of files in a batch of small files, default: 50
+    """
+
+    def __init__(self, max_workers=4, large_workers=1, large_size=1 << 30, batch_bytes=64 << 20, batch_files=50):
+        if not 0 < large_workers <= max_workers:
+            raise ValueError("large_workers should be between 1 and max_workers, not %s" % large_workers)
+        self.max_workers = max_workers
+        self.large_workers = large_workers
+        self.large_size = large_size
+        self.batch_bytes = batch_bytes
+        self.batch_files = batch_files
+
+    def plan(self, items, sizes):
+        """
+        Split the items into large files and batches of small files.
+
+        :param items: the items, f.i. file ids
+        :param sizes: dict with the size of each item in bytes
+        :return: tuple (list of large items, list of batches of small items), both largest first
+        """
+        ordered = sorted(items, key=lambda item: sizes.get(item) or 0, reverse=True)
+        large = [item for item in ordered if (sizes.get(item) or 0) >= self.large_size]
+        batches = []
+        batch, batch_size = [], 0
+        for item in ordered[len(large):]:
+            size = sizes.get(item) or 0
+            if batch and (len(batch) >= self.batch_files or batch_size + size > self.batch_bytes):
+                batches.append(batch)
+                batch, batch_size = [], 0
+            batch.append(item)
+            batch_size += size
+        if batch:
+            batches.append(batch)
+        return large, batches
+
+    def map(self, fn, items, sizes):
+        """
+        Call `fn` on each item in the threads of this scheduler.
+
+        :param fn: the function to call on each item
+        :param items: the items
+        :param sizes: dict with the size of each item in bytes
+        :return: generator of the results, in the order in which the calls finish
+        """
+        large, batches = self.plan(items, sizes)
+        LOG.info("Scheduled %d large files and %d batches of small files" % (len(large), len(batches)))
+        large = collections.deque([item] for item in large)
+        batches = collections.deque(batches)
+        lock = threading.Lock()
+        results = queue.Queue()
+        stopped = threading.Event()
+
+        def take(own, other):
+            with lock:
+                if own:
+                    return own.popleft()
+                if other:
+                    return other.popleft()
+                return None
+
+        def run(own, other):
+            try:
+                while not stopped.is_set():
+                    work = take(own, other)
+                    if work is None:
+                        break
+                    for item in work:
+                        # after an error or when the caller stopped, do not finish the batch
+                        if stopped.is_set():
+                            break
+                        results.put((True, fn(item)))
+            except BaseException as e:
+                results.put((False, e))
+            finally:
+                results.put(None)
+
+        threads = [threading.Thread(target=run, args=(large, batches) if i < self.large_workers else (batches, large),
+                                    name="scheduler-%d" % i, daemon=True) for i in range(self.max_workers)]
+        for thread in threads:
+            thread.start()
+        running = len(threads)
+        try:
+            while running:
+                result = results.get()
+                if result is None:
+                    running -= 1
+                    continue
+                ok, value = result
+                if not ok:
+                    raise value
+                yield value
+        finally:
+            stopped.set()
+            for thread in threads:
+                thread.join()
+
+
+def prefetch_sizes(ids, fedora, max_workers=8):
+    """
+    Get the size of the EASY_FILE datastream of files from their profiles.
+
+    :param ids: the file ids
+    :param fedora: the Fedora instance
+    :param max_workers: number of threads fetching profiles, default: 8
+    :return: dict with the size of each file, `None` if the profile could not be read
+    """
+    def fetch(file_id):
+        profile = DatastreamProfile(file_id, "EASY_FILE", fedora)
+        try:
+            profile.fetch()
+        except FedoraException:
+            LOG.warning("No size of %s" % file_id)
+            return file_id, None
+        return file_id, profile.ds_size
+
+    return dict(utils.ordered_map(fetch, ids, max_workers))
@@ -0,0 +1,257 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+import contextlib
+import hashlib
+import io
+import os
+import re
+from xml.sax.saxutils import escape
+
+from fedora.rest.api import FedoraException
+
+RELS_EXT = """<rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">
+  <rdf:Description rdf:about="info:fedora/{pid}">
+    <isSubordinateTo xmlns="http://dans.knaw.nl/ontologies/relations#" rdf:resource="info:fedora/{dataset}"/>
+    <hasModel xmlns="info:fedora/fedora-system:def/model#" rdf:resource="info:fedora/easy-model:EDM1FILE"/>
+  </rdf:Description>
+</rdf:RDF>
+"""
+
+FILE_METADATA = """<?xml version="1.0" encoding="UTF-8"?>
+<fimd:file-item-md xmlns:fimd="http://easy.dans.knaw.nl/easy/file-item-md/" version="0.1">
+  <sid>{pid}</sid>
+  <parentSid>{parent}</parentSid>
+  <datasetSid>{dataset}</datasetSid>
+  <path>{path}</path>
+  <name>{name}</name>
+  <size>{size}</size>
+  <mimeType>text/plain</mimeType>
+  <creatorRole>DEPOSITOR</creatorRole>
+  <visibleTo>ANONYMOUS</visibleTo>
+  <accessibleTo>{accessible_to}</accessibleTo>
+</fimd:file-item-md>
+"""
+
+
+class FakeFedora(object):
+    """
+    Stands in for :class:`fedora.rest.api.Fedora` in off-line tests. Serves objects from memory.
+    """
+
+    def __init__(self):
+        self.url = "http://localhost:8080/fedora"
+        self.objects = {}
+        self.members = {}
+        self.relationships = set()
+        self.calls = []
+
+    def add_object(self, pid, m_date="2017-01-01T00:00:00.000Z", state="A", label=None):
+        self.objects[pid] = {"fields": {"pid": pid, "label": label or pid, "state": state, "ownerId": "owner",
+                                        "cDate": "2016-01-01T00:00:00.000Z", "mDate": m_date},
+                             "datastreams": {}}
+
+    def add_datastream(self, pid, ds_id, content, mime="text/xml", created="2016-01-01T00:00:00.000Z",
+                       version_id=None):
+        if isinstance(content, str):
+            content = content.encode("utf-8")
+        history = []
+        if ds_id in self.objects[pid]["datastreams"]:
+            previous = self.objects[pid]["datastreams"][ds_id]
+            history = previous.pop("history") + [previous]
+        self.objects[pid]["datastreams"][ds_id] = {
+            "content": content, "mime": mime, "created": created, "version_id": version_id or ds_id + ".0",
+            "checksum": hashlib.sha1(content).hexdigest(), "history": history}
+
+    def add_file(self, pid, dataset, path, content, accessible_to="ANONYMOUS", parent=None):
+        if isinstance(content, str):
+            content = content.encode("utf-8")
+        self.add_object(pid)
+        name = path.split("/")[-1]
+        if pid not in self.members.setdefault(dataset, []):
+            self.members[dataset].append(pid)
+        self.add_datastream(pid, "EASY_FILE", content, mime="text/plain")
+        self._datastream(pid, "EASY_FILE")["filename"] = name
+        self.add_datastream(pid, "EASY_FILE_METADATA", FILE_METADATA.format(
+            pid=pid, parent=parent or dataset, dataset=dataset, path=path, name=name, size=len(content),
+            accessible_to=accessible_to))
+        self.add_datastream(pid, "RELS-EXT", RELS_EXT.format(pid=pid, dataset=dataset))
+
+    def _datastream(self, pid, ds_id):
+        try:
+            return self.objects[pid]["datastreams"][ds_id]
+        except KeyError:
+            raise FedoraException("Error response from Fedora: 404 Not Found", 404)
+
+    def _version(self, pid, ds_id, as_of_date_time=None):
+        ds = self._datastream(pid, ds_id)
+        if as_of_date_time is None:
+            return ds
+        versions = [v for v in ds["history"] + [ds] if v["created"] <= as_of_date_time]
+        if not versions:
+            raise FedoraException("Error response from Fedora: 404 Not Found", 404)
+        return versions[-1]
+
+    def profile_xml(self, pid, ds_id, element="datastreamProfile", ds=None):
+        ds = ds or self._datastream(pid, ds_id)
+        return '<%s xmlns="http://www.fedora.info/definitions/1/0/management/" pid="%s" dsID="%s">' \
+               '<dsLabel>%s</dsLabel><dsVersionID>%s</dsVersionID><dsCreateDate>%s</dsCreateDate>' \
+               '<dsState>%s</dsState><dsMIME>%s</dsMIME><dsControlGroup>M</dsControlGroup>' \
+               '<dsSize>%d</dsSize><dsVersionable>true</dsVersionable>' \
+               '<dsChecksumType>SHA-1</dsChecksumType><dsChecksum>%s</dsChecksum></%s>' \
+               % (element, pid, ds_id, ds_id, ds["version_id"], ds["created"], ds.get("state", "A"), ds["mime"],
+                  len(ds["content"]), ds["checksum"], element)
+
+    def datastream(self, object_id, ds_id, content_format="content", as_of_date_time=None):
+        self.calls.append(("datastream", object_id, ds_id, content_format))
+        ds = self._version(object_id, ds_id, as_of_date_time)
+        if content_format == "content":
+            return str(ds["content"], "utf-8", errors="replace")
+        return '<?xml version="1.0" encoding="UTF-8"?>' + self.profile_xml(object_id, ds_id, ds=ds)
+
+    def object_profile(self, object_id):
+        self.calls.append(("object_profile", object_id))
+        if object_id not in self.objects:
+            raise FedoraException("Error response from Fedora: 404 Not Found", 404)
+        fields = self.objects[object_id]["fields"]
+        return '<objectProfile xmlns="http://www.fedora.info/definitions/1/0/access/" pid="%s">' \
+               '<objLabel>%s</objLabel><objOwnerId>%s</objOwnerId><objCreateDate>%s</objCreateDate>' \
+               '<objLastModDate>%s</objLastModDate><objState>%s</objState></objectProfile>' \
+               % (object_id, escape(fields["label"]), fields["ownerId"], fields["cDate"], fields["mDate"],
+                  fields["state"])
+
+    def modify_object(self, pid, state=None, label=None, owner_id=None, log_message=None):
+        self.calls.append(("modify_object", pid, state))
+        if pid not in self.objects:
+            raise FedoraException("Error response from Fedora: 404 Not Found", 404)
+        if state is not None:
+            self.objects[pid]["fields"]["state"] = state
+
+    def purge_object(self, pid, log_message=None):
+        self.calls.append(("purge_object", pid))
+        if self.objects.pop(pid, None) is None:
+            raise FedoraException("Error response from Fedora: 404 Not Found", 404)
+
+    def modify_datastream_state(self, pid, ds_id, state, log_message=None):
+        self.calls.append(("modify_datastream_state", pid, ds_id, state))
+        self._datastream(pid, ds_id)["state"] = state
+
+    def purge_datastream(self, pid, ds_id, start_dt=None, end_dt=None, log_message=None):
+        self.calls.append(("purge_datastream", pid, ds_id))
+        self._datastream(pid, ds_id)
+        del self.objects[pid]["datastreams"][ds_id]
+
+    def add_relationship(self, subj_id, predicate, obj, is_literal=False, data_type=None):
+        self.calls.append(("add_relationship", subj_id, predicate, obj))
+        self.relationships.add((subj_id, predicate, obj))
+
+    def purge_relationship(self, subj_id, predicate, obj, is_literal=False, data_type=None):
+        self.calls.append(("purge_relationship", subj_id, predicate, obj))
+        if (subj_id, predicate, obj) not in self.relationships:
+            return False
+        self.relationships.remove((subj_id, predicate, obj))
+        return True
+
+    def object_xml(self, object_id):
+        self.calls.append(("object_xml", object_id))
+        if object_id not in self.objects:
+            raise FedoraException("Error response from Fedora: 404 Not Found", 404)
+        obj = self.objects[object_id]
+        properties = "".join('<foxml:property NAME="info:fedora/fedora-system:def/%s" VALUE="%s"/>'
+                             % (name, escape(obj["fields"][field])) for name, field in
+                             (("model#state", "state"), ("model#label", "label"), ("model#ownerId", "ownerId"),
+                              ("model#createdDate", "cDate"), ("view#lastModifiedDate", "mDate")))
+        datastreams = []
+        for ds_id, ds in obj["datastreams"].items():
+            control_group = "X" if ds["mime"] == "text/xml" else "M"
+            versions = []
+            for v in ds["history"] + [ds]:
+                if control_group == "X":
+                    content = re.sub(r"^<\?xml[^>]*\?>", "", str(v["content"], "utf-8").strip())
+                    content = "<foxml:xmlContent>%s</foxml:xmlContent>" % content
+                else:
+                    content = '<foxml:contentLocation TYPE="INTERNAL_ID" REF="%s+%s+%s"/>' \
+                              % (object_id, ds_id, v["version_id"])
+                versions.append('<foxml:datastreamVersion ID="%s" LABEL="%s" CREATED="%s" MIMETYPE="%s" SIZE="%d">'
+                                '<foxml:contentDigest TYPE="SHA-1" DIGEST="%s"/>%s</foxml:datastreamVersion>'
+                                % (v["version_id"], ds_id, v["created"], v["mime"], len(v["content"]),
+                                   v["checksum"], content))
+            datastreams.append('<foxml:datastream ID="%s" STATE="A" CONTROL_GROUP="%s" VERSIONABLE="true">%s'
+                               '</foxml:datastream>' % (ds_id, control_group, "".join(versions)))
+        return '<?xml version="1.0" encoding="UTF-8"?>' \
+               '<foxml:digitalObject xmlns:foxml="info:fedora/fedora-system:def/foxml#" VERSION="1.1" PID="%s">' \
+               '<foxml:objectProperties>%s</foxml:objectProperties>%s</foxml:digitalObject>' \
+               % (object_id, properties, "".join(datastreams))
+
+    @contextlib.contextmanager
+    def object_xml_stream(self, object_id):
+        yield io.BytesIO(self.object_xml(object_id).encode("utf-8"))
+
+    def datastream_history(self, object_id, ds_id):
+        self.calls.append(("datastream_history", object_id, ds_id))
+        ds = self._datastream(object_id, ds_id)
+        profiles = [self.profile_xml(object_id, ds_id, ds=v) for v in reversed(ds["history"] + [ds])]
+        return '<datastreamHistory xmlns="http://www.fedora.info/definitions/1/0/management/" pid="%s" dsID="%s">' \
+               '%s</datastreamHistory>' % (object_id, ds_id, "".join(profiles))
+
+    def list_datastreams(self, pid, profiles=False):
+        self.calls.append(("list_datastreams", pid))
+        items = []
+        for ds_id, ds in self.objects[pid]["datastreams"].items():
+            if profiles:
+                items.append(self.profile_xml(pid, ds_id))
+            else:
+                items.append('<datastream dsid="%s" label="%s" mimeType="%s"/>' % (ds_id, ds_id, ds["mime"]))
+        return '<objectDatastreams xmlns="http://www.fedora.info/definitions/1/0/access/" pid="%s">%s' \
+               '</objectDatastreams>' % (pid, "".join(items))
+
+    def find_objects(self, query, max_results=25, result_format="xml", fields=("pid", "label"),
+                     session_token=None):
+        self.calls.append(("find_objects", query, session_token))
+        prefix = re.findall(r"pid~(\S+)\*", query)
+        since = re.findall(r"mDate>=(\S+)", query)
+        found = [o["fields"] for pid, o in sorted(self.objects.items())
+                 if (not prefix or pid.startswith(prefix[0])) and (not since or o["fields"]["mDate"] >= since[0])]
+        start = int(session_token or 0)
+        page = found[start:start + max_results]
+        token = ""
+        if start + max_results < len(found):
+            token = "<listSession><token>%d</token></listSession>" % (start + max_results)
+        results = "".join("<objectFields>%s</objectFields>"
+                          % "".join("<%s>%s</%s>" % (f, escape(str(o[f])), f) for f in fields) for o in page)
+        return '<result xmlns="http://www.fedora.info/definitions/1/0/types/">%s<resultList>%s</resultList>' \
+               '</result>' % (token, results)
+
+    def download(self, object_id, ds_id, folder="downloads", id_in_path=True, chunk_size=1024, throttle=None,
+                 filename=None):
+        self.calls.append(("download", object_id, ds_id))
+        ds = self._datastream(object_id, ds_id)
+        if throttle is not None:
+            throttle(len(ds["content"]))
+        if id_in_path:
+            path = os.path.abspath(os.path.join(folder, object_id.split(":")[1]))
+        else:
+            path = os.path.abspath(folder)
+        os.makedirs(path, exist_ok=True)
+        if filename is None:
+            filename = ds.get("filename", ds_id)
+        local_path = os.path.join(path, filename)
+        with open(local_path + ".part", "wb") as fd:
+            fd.write(ds["content"])
+        os.replace(local_path + ".part", local_path)
+        return {"filename": filename, "local-path": local_path, "Date": "Wed, 21 Dec 2016 12:31:38 GMT",
+                "Content-Type": ds["mime"], "Content-Length": str(len(ds["content"]))}
+
+    @contextlib.contextmanager
+    def content_stream(self, object_id, ds_id):
+        self.calls.append(("content_stream", object_id, ds_id))
+        ds = self._datastream(object_id, ds_id)
+        yield io.BytesIO(ds["content"]), {"Content-Type": ds["mime"], "Content-Length": str(len(ds["content"]))}
+
+    def risearch(self, query, type="tuples", flush=False, lang="sparql", format="CSV", limit=1000, distinct="off",
+                 stream="on"):
+        self.calls.append(("risearch", query))
+        if "view:lastModifiedDate" in query:
+            return "s,date\n" + "".join("info:fedora/%s,%s\n" % (pid, obj["datastreams"]["EASY_FILE"]["created"])
+                                         for pid, obj in self.objects.items() if "EASY_FILE" in obj["datastreams"])
+        dataset = re.findall(r"isSubordinateTo <info:fedora/([^>]+)>", query)[0]
+        return "s\n" + "".join("info:fedora/%s\n" % pid for pid in self.members.get(dataset, []))
@@ -0,0 +1,83 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+import json
+import os
+import tempfile
+import unittest
+
+from fedora.bulk import BulkOperations
+from fedora.test.fake_fedora import FakeFedora
+
+SUBORDINATE_TO = "http://dans.knaw.nl/ontologies/relations#isSubordinateTo"
+
+
+class TestBulkOperations(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.journal_file = os.path.join(self.tmp.name, "journal.jsonl")
+        self.fedora = FakeFedora()
+        for i in range(1, 4):
+            self.fedora.add_file("easy-file:%d" % i, "easy-dataset:1", "f%d.txt" % i, "content")
+        self.fedora.objects["easy-file:3"]["fields"]["state"] = "I"
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def journal(self):
+        with open(self.journal_file) as f:
+            return [json.loads(line) for line in f]
+
+    def states(self):
+        return [self.fedora.objects["easy-file:%d" % i]["fields"]["state"] for i in range(1, 4)]
+
+    def test_dry_run_and_undo(self):
+        ids = ["easy-file:1", "easy-file:2", "easy-file:3", "easy-file:404"]
+        bulk = BulkOperations(self.fedora, self.journal_file, max_workers=2, dry_run=True)
+        self.assertEqual({"dry-run": 2, "unchanged": 1, "failed": 1}, bulk.set_object_state(ids, "I"))
+        self.assertEqual(["A", "A", "I"], self.states())
+
+        bulk.dry_run = False
+        self.assertEqual({"done": 2, "unchanged": 1, "failed": 1}, bulk.set_object_state(ids, "I"))
+        self.assertEqual(["I", "I", "I"], self.states())
+        records = self.journal()[4:]
+        self.assertEqual(("easy-file:1", "A", "I", "done"), tuple(records[0][k] for k in
+                                                                  ("pid", "before", "after", "status")))
+
+        self.assertEqual({"done": 2}, bulk.undo())
+        self.assertEqual(["A", "A", "I"], self.states())
+        # what was undone is not undone again, and the undo is not undone in turn
+        self.assertEqual({}, bulk.undo())
+        self.assertEqual(["A", "A", "I"], self.states())
+
+    def test_undo_newest_first(self):
+        bulk = BulkOperations(self.fedora, self.journal_file)
+        bulk.set_object_state(["easy-file:1", "easy-file:3"], "I")
+        bulk.set_object_state(["easy-file:1", "easy-file:2", "easy-file:3"], "D")
+        self.assertEqual(["D", "D", "D"], self.states())
+        # each object goes back to its state before the first change, in one call
+        self.assertEqual({"done": 3}, bulk.undo())
+        self.assertEqual(["A", "A", "I"], self.states())
+        records = self.journal()
+        undo_of_1 = [r for r in records if r["undo"] and r["pid"] == "easy-file:1"][0]
+        self.assertEqual(sorted(r["id"] for r in records[:5] if r["pid"] == "easy-file:1" and r["status"] == "done"),
+                         sorted(undo_of_1["undoes"]))
+        self.assertEqual({}, bulk.undo())
+
+    def test_datastreams_and_relationships(self):
+        self.fedora.relationships.add(("easy-file:1", SUBORDINATE_TO, "info:fedora/easy-dataset:1"))
+        bulk = BulkOperations(self.fedora, self.journal_file, rate=100)
+        bulk.set_datastream_state(["easy-file:1", "easy-file:2"], "EASY_FILE", "D")
+        self.assertEqual("D", self.fedora.objects["easy-file:2"]["datastreams"]["EASY_FILE"]["state"])
+        self.assertEqual({"done": 1, "unchanged": 1},
+                         bulk.purge_relationship(["easy-file:1", "easy-file:2"], SUBORDINATE_TO,
+                                                 "info:fedora/easy-dataset:1"))
+        bulk.purge_datastream(["easy-file:1"], "EASY_FILE_METADATA")
+        bulk.purge_object(["easy-file:3"])
+        self.assertNotIn("EASY_FILE_METADATA", self.fedora.objects["easy-file:1"]["datastreams"])
+        self.assertNotIn("easy-file:3", self.fedora.objects)
+        self.assertEqual("I", self.journal()[-1]["before"]["state"])
+
+        self.assertEqual({"done": 3}, bulk.undo())
+        self.assertEqual("A", self.fedora.objects["easy-file:2"]["datastreams"]["EASY_FILE"]["state"])
+        self.assertIn(("easy-file:1", SUBORDINATE_TO, "info:fedora/easy-dataset:1"), self.fedora.relationships)
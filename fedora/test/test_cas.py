@@ -0,0 +1,77 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+import os
+import tempfile
+import threading
+import unittest
+
+from fedora import utils
+from fedora.cas import ContentStore
+
+
+class TestContentStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.source = os.path.join(self.tmp.name, "a.txt")
+        with open(self.source, "w") as f:
+            f.write("abc")
+        self.checksum = utils.sha1_for_file(self.source)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_add_concurrently(self):
+        store = ContentStore(os.path.join(self.tmp.name, "cas"))
+        barrier = threading.Barrier(8)
+        link = store._link
+        results = []
+
+        def slow_link(source, target):
+            # all threads found the content missing before one of them links it
+            barrier.wait()
+            return link(source, target)
+
+        def add():
+            try:
+                results.append(store.add(self.source, self.checksum))
+            except OSError as e:
+                results.append(e)
+
+        store._link = slow_link
+
+        threads = [threading.Thread(target=add) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(8, len(results))
+        self.assertTrue(all(isinstance(result, bool) for result in results))
+        self.assertIn(True, results)
+        self.assertEqual([self.checksum], os.listdir(os.path.dirname(store.path(self.checksum))))
+
+    def test_add_and_materialize(self):
+        store = ContentStore(os.path.join(self.tmp.name, "cas"))
+        self.assertFalse(store.contains(self.checksum))
+        self.assertTrue(store.add(self.source, self.checksum))
+        self.assertFalse(store.add(self.source, self.checksum))
+        self.assertTrue(store.contains(self.checksum.upper()))
+
+        target = os.path.join(self.tmp.name, "copies", "b.txt")
+        self.assertEqual("hard", store.materialize(self.checksum, target))
+        self.assertEqual(os.stat(self.source).st_ino, os.stat(target).st_ino)
+        # an existing file is replaced
+        self.assertEqual("hard", store.materialize(self.checksum, target))
+        self.assertFalse(os.path.exists(target + ".part"))
+
+    def test_copy(self):
+        store = ContentStore(os.path.join(self.tmp.name, "cas"), link="copy")
+        store.add(self.source, self.checksum)
+        target = os.path.join(self.tmp.name, "b.txt")
+        self.assertEqual("copy", store.materialize(self.checksum, target))
+        self.assertNotEqual(os.stat(self.source).st_ino, os.stat(target).st_ino)
+        self.assertEqual(self.checksum, utils.sha1_for_file(target))
+
+    def test_unknown_link(self):
+        with self.assertRaises(ValueError):
+            ContentStore(self.tmp.name, link="soft")
@@ -0,0 +1,37 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+import gzip
+import os
+import tempfile
+import unittest
+
+from fedora import compression
+
+TEXT = "<emd>\r\n<title>é</title>\n</emd>\n"
+
+
+class TestCompression(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_compression_of(self):
+        self.assertEqual("zstd", compression.compression_of("a/EMD.0.zst"))
+        self.assertEqual("gzip", compression.compression_of("a/EMD.0.gz.part"))
+        self.assertEqual("none", compression.compression_of("a/EMD.0.xml"))
+
+    def test_round_trip(self):
+        for suffix in (".gz", ".xml") + ((".zst",) if compression.zstandard is not None else ()):
+            path = os.path.join(self.tmp.name, "EMD.0" + suffix)
+            compression.write_text(path, TEXT)
+            self.assertEqual(TEXT, compression.read_text(path))
+            self.assertFalse(os.path.exists(path + ".part"))
+        with gzip.open(os.path.join(self.tmp.name, "EMD.0.gz"), "rb") as f:
+            self.assertEqual(TEXT.encode("utf-8"), f.read())
+
+    def test_unknown_compression(self):
+        with self.assertRaises(ValueError):
+            compression.open_text(os.path.join(self.tmp.name, "a"), "wt", "lzma")
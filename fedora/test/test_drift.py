@@ -0,0 +1,65 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from fedora.drift import detect_drift, write_ids
+from fedora.rest.api import FedoraException
+from fedora.test.fake_fedora import FakeFedora
+from fedora.worker import Worker
+
+
+class TestDrift(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.log_file = os.path.join(self.tmp.name, "worker-log.csv")
+        self.fedora = FakeFedora()
+        for i, content in enumerate(["a", "bb", "ccc", "dddd"], 1):
+            self.fedora.add_file("easy-file:%d" % i, "easy-dataset:1", "f%d.txt" % i, content)
+        Worker(self.fedora).download_batch(["easy-file:%d" % i for i in range(1, 6)],
+                                           os.path.join(self.tmp.name, "downloads"), self.log_file,
+                                           reporting=False)
+        # 1 stays, 2 changes content, 3 gets a new version with the same content, 4 is purged,
+        # 5 failed to download and is there now
+        self.fedora.add_datastream("easy-file:2", "EASY_FILE", "BB", created="2018-01-01T00:00:00.000Z",
+                                   version_id="EASY_FILE.1")
+        self.fedora.add_datastream("easy-file:3", "EASY_FILE", "ccc", created="2018-01-01T00:00:00.000Z",
+                                   version_id="EASY_FILE.1")
+        del self.fedora.objects["easy-file:4"]
+        self.fedora.add_file("easy-file:5", "easy-dataset:1", "f5.txt", "eeeee")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_detect_drift(self):
+        drift = detect_drift(self.log_file, self.fedora, max_workers=2)
+        self.assertEqual(["current", "changed", "stale", "gone", "missing"], list(drift["state"]))
+        self.assertEqual("EASY_FILE.1", drift["remote_version_id"][1])
+
+        id_file = os.path.join(self.tmp.name, "ids.txt")
+        self.assertEqual(3, write_ids(drift, id_file))
+        with open(id_file) as f:
+            self.assertEqual(["easy-file:2", "easy-file:3", "easy-file:5"], f.read().split())
+
+    def test_detect_drift_risearch(self):
+        self.fedora.calls.clear()
+        drift = detect_drift(self.log_file, self.fedora, use_risearch=True)
+        self.assertEqual(["current", "changed", "stale", "gone", "missing"], list(drift["state"]))
+        profiled = [call[1] for call in self.fedora.calls if call[0] == "datastream"]
+        self.assertEqual(["easy-file:2", "easy-file:3", "easy-file:4", "easy-file:5"], profiled)
+
+    def test_error_is_not_gone(self):
+        datastream = self.fedora.datastream
+
+        def failing(object_id, *args, **kwargs):
+            if object_id == "easy-file:1":
+                # gone is told by the status code, not by the message
+                raise FedoraException("Error response from Fedora: 502 Proxy Error: 404 Not Found upstream", 502)
+            return datastream(object_id, *args, **kwargs)
+
+        with mock.patch.object(self.fedora, "datastream", failing):
+            drift = detect_drift(self.log_file, self.fedora, max_workers=2)
+        self.assertEqual(["error", "changed", "stale", "gone", "missing"], list(drift["state"]))
@@ -0,0 +1,57 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+import io
+import json
+import time
+import unittest
+
+from fedora.events import ProgressReporter, JsonLinesSink, ConsoleSink
+
+
+def row(file_id, size, checksum_error="", transfer="download"):
+    return [file_id, "easy-dataset:1", "", "", "", "", "", size, "", "", "", "", "", "", checksum_error, transfer]
+
+
+class TestProgressReporter(unittest.TestCase):
+
+    def test_counts(self):
+        received = []
+        with ProgressReporter(received.append, total=4, interval=60) as progress:
+            for _ in range(3):
+                progress.started()
+            progress.finished(row("easy-file:1", 1000000))
+            progress.finished(row("easy-file:2", 10, transfer="skip"))
+            progress.finished(row("easy-file:3", "ERROR", "ERROR", "ERROR"))
+            snapshot = progress.snapshot()
+        self.assertEqual(3, snapshot["files"])
+        self.assertEqual(0, snapshot["in_flight"])
+        self.assertEqual(1000000, snapshot["bytes"])
+        self.assertEqual((1, 1), (snapshot["errors"], snapshot["failed"]))
+        self.assertEqual({"download": 1, "skip": 1, "ERROR": 1}, snapshot["transfers"])
+        self.assertIsNotNone(snapshot["eta_seconds"])
+        self.assertEqual(["error", "done"], [event["event"] for event in received])
+        self.assertEqual("easy-file:3", received[0]["file_id"])
+
+    def test_background_progress(self):
+        received = []
+        progress = ProgressReporter(received.append, interval=0.01).start()
+        while not received:
+            time.sleep(0.001)
+        progress.stop()
+        self.assertEqual("progress", received[0]["event"])
+        self.assertEqual("done", received[-1]["event"])
+
+    def test_sinks(self):
+        stream = io.StringIO()
+        sink = JsonLinesSink(stream)
+        with ProgressReporter(sink, total=2, interval=60) as progress:
+            progress.started()
+            progress.finished(row("easy-file:1", 5))
+        self.assertEqual(2, json.loads(stream.getvalue())["total"])
+
+        stream = io.StringIO()
+        with ProgressReporter(ConsoleSink(stream), total=2, interval=60) as progress:
+            progress.started()
+            progress.finished(row("easy-file:1", 5))
+        self.assertTrue(stream.getvalue().startswith("\r files 1/2"))
+        self.assertTrue(stream.getvalue().endswith("\n"))
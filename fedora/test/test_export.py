@@ -0,0 +1,154 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+import hashlib
+import io
+import json
+import os
+import tarfile
+import tempfile
+import unittest
+
+from fedora import compression
+from fedora.export import export_dataset, export_emd
+from fedora.rest.api import FedoraException
+from fedora.rest.ds import EasyMetadata
+from fedora.test.fake_fedora import FakeFedora
+
+EMD = """<emd:easymetadata xmlns:emd="http://easy.dans.knaw.nl/easy/easymetadata/"
+    xmlns:eas="http://easy.dans.knaw.nl/easy/easymetadata/eas/" xmlns:dc="http://purl.org/dc/elements/1.1/"
+    xmlns:dct="http://purl.org/dc/terms/" emd:version="0.1">
+  <emd:title><dc:title>Opgraving {n}</dc:title><dct:alternative>Excavation</dct:alternative></emd:title>
+  <emd:creator>
+    <eas:creator><eas:title>Dr</eas:title><eas:initials>A.B.</eas:initials><eas:prefix>van</eas:prefix>
+      <eas:surname>Dijk</eas:surname><eas:organization>DANS</eas:organization></eas:creator>
+    <dc:creator>Archeologie B.V.</dc:creator>
+  </emd:creator>
+  <emd:date><eas:created eas:format="DAY">2015-03-01T00:00:00.000+01:00</eas:created>
+    <eas:available>2016-01-01T00:00:00.000+01:00</eas:available></emd:date>
+  <emd:identifier>
+    <dc:identifier eas:scheme="DOI">10.17026/dans-{n}</dc:identifier>
+    <dc:identifier eas:scheme="PID">urn:nbn:nl:ui:13-{n}</dc:identifier>
+    <dc:identifier eas:scheme="DMO_ID">easy-dataset:{n}</dc:identifier>
+  </emd:identifier>
+  <emd:rights><dct:accessRights>OPEN_ACCESS</dct:accessRights>
+    <dct:license>http://creativecommons.org/licenses/by/4.0</dct:license></emd:rights>
+</emd:easymetadata>"""
+
+
+class TestExport(unittest.TestCase):
+
+    def setUp(self):
+        self.fedora = FakeFedora()
+        self.fedora.add_file("easy-file:1", "easy-dataset:1", "original/a.txt", "aaa")
+        self.fedora.add_file("easy-file:2", "easy-dataset:1", "original/sub/b%.txt", "bbbb")
+
+    def test_bag(self):
+        archive = io.BytesIO()
+        report = export_dataset("easy-dataset:1", self.fedora, archive)
+        self.assertEqual(["", ""], [row["checksum_error"] for row in report])
+        archive.seek(0)
+        with tarfile.open(fileobj=archive) as tar:
+            names = tar.getnames()
+            self.assertIn("easy-dataset_1/data/original/a.txt", names)
+            self.assertEqual(b"bbbb", tar.extractfile("easy-dataset_1/data/original/sub/b%.txt").read())
+            manifest = tar.extractfile("easy-dataset_1/manifest-sha256.txt").read().decode("utf-8")
+            bag_info = tar.extractfile("easy-dataset_1/bag-info.txt").read().decode("utf-8")
+            self.assertIn("easy-dataset_1/tagmanifest-sha256.txt", names)
+        self.assertIn("%s  data/original/a.txt\n" % hashlib.sha256(b"aaa").hexdigest(), manifest)
+        self.assertIn("data/original/sub/b%25.txt", manifest)
+        self.assertIn("Payload-Oxum: 7.2", bag_info)
+        # content was read once, with one stream per file
+        self.assertEqual(["content_stream", "content_stream"],
+                         [call[0] for call in self.fedora.calls if call[0] in ("content_stream", "download")])
+
+    def test_plain_tar_and_checksum_error(self):
+        self.fedora.objects["easy-file:1"]["datastreams"]["EASY_FILE"]["checksum"] = "0" * 40
+        with tempfile.TemporaryDirectory() as tmp:
+            target = os.path.join(tmp, "export.tar.gz")
+            report = export_dataset("easy-dataset:1", self.fedora, target, bag=False, name="ds",
+                                    algorithms=["md5"], use_foxml=True)
+            with tarfile.open(target) as tar:
+                self.assertEqual(["ds/original/a.txt", "ds/original/sub/b%.txt"], tar.getnames())
+        self.assertEqual(hashlib.sha1(b"aaa").hexdigest(), report[0]["checksum_error"])
+        self.assertEqual(hashlib.md5(b"bbbb").hexdigest(), report[1]["md5"])
+
+    def test_bag_with_checksum_error(self):
+        self.fedora.objects["easy-file:1"]["datastreams"]["EASY_FILE"]["checksum"] = "0" * 40
+        archive = io.BytesIO()
+        export_dataset("easy-dataset:1", self.fedora, archive)
+        archive.seek(0)
+        with tarfile.open(fileobj=archive) as tar:
+            self.assertIn("easy-dataset_1/data/original/a.txt", tar.getnames())
+            manifest = tar.extractfile("easy-dataset_1/manifest-sha1.txt").read().decode("utf-8")
+            bag_info = tar.extractfile("easy-dataset_1/bag-info.txt").read().decode("utf-8")
+        self.assertNotIn("data/original/a.txt", manifest)
+        self.assertIn("data/original/sub/b%25.txt", manifest)
+        self.assertIn("Checksum-Error: data/original/a.txt\n", bag_info)
+
+    def test_path_outside_dataset(self):
+        self.fedora.add_file("easy-file:3", "easy-dataset:1", "original/../../../etc/passwd", "x")
+        with self.assertRaises(FedoraException):
+            export_dataset("easy-dataset:1", self.fedora, io.BytesIO())
+        self.fedora.add_file("easy-file:3", "easy-dataset:1", "/original/./c.txt", "x")
+        with self.assertRaises(FedoraException):
+            export_dataset("easy-dataset:1", self.fedora, io.BytesIO())
+        self.fedora.add_file("easy-file:3", "easy-dataset:1", "original/sub/../c.txt", "x")
+        archive = io.BytesIO()
+        export_dataset("easy-dataset:1", self.fedora, archive)
+        archive.seek(0)
+        with tarfile.open(fileobj=archive) as tar:
+            self.assertIn("easy-dataset_1/data/original/c.txt", tar.getnames())
+
+
+class TestExportEmd(unittest.TestCase):
+
+    def setUp(self):
+        self.fedora = FakeFedora()
+        for n in (1, 2, 3):
+            self.fedora.add_object("easy-dataset:%d" % n)
+            self.fedora.add_datastream("easy-dataset:%d" % n, "EMD", EMD.format(n=n))
+        # no EMD
+        self.fedora.add_object("easy-dataset:4")
+
+    def test_record(self):
+        emd = EasyMetadata("easy-dataset:1", self.fedora)
+        emd.fetch()
+        record = emd.record()
+        self.assertEqual("10.17026/dans-1", record["doi"])
+        self.assertEqual("urn:nbn:nl:ui:13-1", record["urn"])
+        self.assertEqual(["Opgraving 1"], record["titles"])
+        self.assertEqual(["Excavation"], record["alternative_titles"])
+        self.assertEqual(["Dr A.B. van Dijk (DANS)", "Archeologie B.V."], record["creators"])
+        self.assertEqual(["2015-03-01T00:00:00.000+01:00"], record["dates"]["created"])
+        self.assertEqual(["easy-dataset:1"], record["identifiers"]["DMO_ID"])
+        self.assertEqual(["OPEN_ACCESS"], record["access_rights"])
+        self.assertEqual(["http://creativecommons.org/licenses/by/4.0"], record["licenses"])
+        self.assertEqual([], record["subjects"])
+
+    def test_jsonl(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            target = os.path.join(tmp, "emd.jsonl.gz")
+            counts = export_emd(target, self.fedora, max_workers=2, batch_size=2)
+            with compression.open_text(target) as f:
+                records = [json.loads(line) for line in f]
+        self.assertEqual({"records": 3, "failed": 1}, counts)
+        self.assertEqual(["easy-dataset:1", "easy-dataset:2", "easy-dataset:3"],
+                         [record["dataset_id"] for record in records])
+        self.assertEqual("10.17026/dans-3", records[2]["doi"])
+
+    def test_parquet(self):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            self.skipTest("pyarrow is not installed")
+        with tempfile.TemporaryDirectory() as tmp:
+            target = os.path.join(tmp, "emd.parquet")
+            counts = export_emd(target, self.fedora, dataset_ids=["easy-dataset:2", "easy-dataset:3"],
+                                batch_size=1)
+            parquet = pq.ParquetFile(target)
+            records = parquet.read().to_pylist()
+            self.assertEqual(2, parquet.num_row_groups)
+        self.assertEqual({"records": 2, "failed": 0}, counts)
+        self.assertEqual("urn:nbn:nl:ui:13-2", records[0]["urn"])
+        self.assertEqual(["Dr A.B. van Dijk (DANS)", "Archeologie B.V."], records[0]["creators"])
+        self.assertIn(("PID", ["urn:nbn:nl:ui:13-2"]), records[0]["identifiers"])
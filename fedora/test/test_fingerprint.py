@@ -0,0 +1,52 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+import os
+import tempfile
+import unittest
+
+from fedora import utils
+from fedora.fingerprint import FingerprintCache
+
+
+class TestFingerprintCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_file = os.path.join(self.tmp.name, "fingerprints.db")
+        self.file = os.path.join(self.tmp.name, "a.txt")
+        with open(self.file, "w") as f:
+            f.write("abc")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_sha1(self):
+        with FingerprintCache(self.db_file) as cache:
+            self.assertIsNone(cache.get(self.file))
+            sha1 = cache.sha1(self.file, "easy-file:1")
+            self.assertEqual(utils.sha1_for_file(self.file), sha1)
+            self.assertEqual(sha1, cache.sha1(self.file))
+            self.assertEqual((1, 1), (cache.hits, cache.misses))
+            self.assertEqual([self.file], cache.local_paths("easy-file:1"))
+
+        # remembered across instances
+        with FingerprintCache(self.db_file) as cache:
+            self.assertEqual(sha1, cache.get(self.file))
+
+    def test_changed_file(self):
+        with FingerprintCache(self.db_file) as cache:
+            cache.put(self.file, "not-the-sha1")
+            with open(self.file, "w") as f:
+                f.write("abcd")
+            self.assertIsNone(cache.get(self.file))
+            self.assertEqual(utils.sha1_for_file(self.file), cache.sha1(self.file))
+            os.remove(self.file)
+            self.assertIsNone(cache.get(self.file))
+
+    def test_shared(self):
+        # two connections, as two processes would have: a put does not keep the database locked
+        with FingerprintCache(self.db_file, timeout=1) as a, FingerprintCache(self.db_file, timeout=1) as b:
+            a.put(self.file, "sha1-a", "easy-file:1")
+            b.put(self.file, "sha1-b", "easy-file:2")
+            a.put(self.file, "sha1-a", "easy-file:1")
+            self.assertEqual("sha1-a", b.get(self.file))
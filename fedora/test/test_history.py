@@ -0,0 +1,71 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+import os
+import tempfile
+import unittest
+
+from fedora import compression
+from fedora.history import HistoryHarvester
+from fedora.rest.ds import DatastreamHistory
+from fedora.test.fake_fedora import FakeFedora
+
+
+class TestHistoryHarvester(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.fedora = FakeFedora()
+        self.fedora.add_object("easy-dataset:1")
+        self.fedora.add_datastream("easy-dataset:1", "EMD", "<emd>\n<title>a</title>\n</emd>\n",
+                                   created="2016-01-01T00:00:00.000Z", version_id="EMD.0")
+        self.fedora.add_datastream("easy-dataset:1", "EMD", "<emd>\n<title>b</title>\n</emd>\n",
+                                   created="2016-02-01T00:00:00.000Z", version_id="EMD.1")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_datastream_history(self):
+        history = DatastreamHistory("easy-dataset:1", "EMD", self.fedora)
+        history.fetch()
+        self.assertEqual(["EMD.0", "EMD.1"], [v.ds_version_id for v in history.versions])
+        self.assertIn("<title>a</title>", history.content(history.versions[0]))
+
+    def test_harvest_incremental(self):
+        with HistoryHarvester(self.fedora, self.tmp.name, max_workers=2) as harvester:
+            self.assertEqual(2, harvester.harvest(["easy-dataset:1"], ds_ids=["EMD"]))
+            versions = harvester.versions("easy-dataset:1", "EMD")
+            self.assertEqual(["EMD.0", "EMD.1"], [v["version_id"] for v in versions])
+            self.assertIsNone(versions[0]["diff"])
+            self.assertIn("-<title>a</title>", versions[1]["diff"])
+            self.assertIn("+<title>b</title>", versions[1]["diff"])
+            self.assertTrue(os.path.exists(versions[0]["local_path"]))
+
+            # only the new version is read, the diff is made against the stored version
+            self.fedora.add_datastream("easy-dataset:1", "EMD", "<emd>\n<title>c</title>\n</emd>\n",
+                                       created="2016-03-01T00:00:00.000Z", version_id="EMD.2")
+            self.fedora.calls.clear()
+            self.assertEqual(1, harvester.harvest(["easy-dataset:1"], ds_ids=["EMD"]))
+            contents = [c for c in self.fedora.calls if c[0] == "datastream"]
+            self.assertEqual(1, len(contents))
+            versions = harvester.versions("easy-dataset:1", "EMD")
+            self.assertEqual("EMD.1", versions[2]["previous_version_id"])
+            self.assertIn("+<title>c</title>", versions[2]["diff"])
+            self.assertEqual("<emd>\n<title>c</title>\n</emd>\n", harvester.content("easy-dataset:1", "EMD", "EMD.2"))
+
+    @unittest.skipIf(compression.zstandard is None, "zstandard is not installed")
+    def test_change_of_compression(self):
+        with HistoryHarvester(self.fedora, self.tmp.name, compression="gzip") as harvester:
+            harvester.harvest(["easy-dataset:1"], ds_ids=["EMD"])
+            self.assertTrue(harvester.versions("easy-dataset:1", "EMD")[1]["local_path"].endswith(".gz"))
+        self.fedora.add_datastream("easy-dataset:1", "EMD", "<emd>\n<title>c</title>\n</emd>\n",
+                                   created="2016-03-01T00:00:00.000Z", version_id="EMD.2")
+        with HistoryHarvester(self.fedora, self.tmp.name, compression="zstd") as harvester:
+            self.assertEqual(1, harvester.harvest(["easy-dataset:1"], ds_ids=["EMD"]))
+            versions = harvester.versions("easy-dataset:1", "EMD")
+            self.assertTrue(versions[2]["local_path"].endswith(".zst"))
+            self.assertIn("-<title>b</title>", versions[2]["diff"])
+            self.assertIn("<title>a</title>", harvester.content("easy-dataset:1", "EMD", "EMD.0"))
+
+    def test_missing_datastream(self):
+        with HistoryHarvester(self.fedora, self.tmp.name) as harvester:
+            self.assertEqual(0, harvester.harvest(["easy-dataset:1"], ds_ids=["AMD"]))
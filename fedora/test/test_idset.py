@@ -0,0 +1,60 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+import unittest
+
+from fedora.idset import BloomFilter, PidBitmap
+
+
+class TestPidBitmap(unittest.TestCase):
+
+    def test_add(self):
+        pids = PidBitmap()
+        self.assertTrue(pids.add("easy-file:9"))
+        self.assertFalse(pids.add("easy-file:9"))
+        self.assertTrue(pids.add("easy-file:123456"))
+        self.assertTrue(pids.add("easy-dataset:9"))
+        self.assertTrue(pids.add("no-number"))
+        self.assertFalse(pids.add("no-number"))
+        self.assertTrue(pids.add("easy-file:%d" % 2 ** 40))
+        self.assertEqual(5, len(pids))
+        self.assertIn("easy-file:123456", pids)
+        self.assertNotIn("easy-file:123457", pids)
+        self.assertNotIn("easy-folder:9", pids)
+        self.assertIn("easy-file:%d" % 2 ** 40, pids)
+
+    def test_leading_zeros(self):
+        pids = PidBitmap()
+        self.assertTrue(pids.add("easy-file:7"))
+        self.assertTrue(pids.add("easy-file:007"))
+        self.assertTrue(pids.add("easy-file:0"))
+        self.assertFalse(pids.add("easy-file:007"))
+        self.assertNotIn("easy-file:07", pids)
+        self.assertNotIn("easy-file:00", pids)
+        self.assertEqual(3, len(pids))
+
+    def test_memory(self):
+        pids = PidBitmap()
+        # dense numbers fill bit arrays, a few huge numbers stay small sets
+        for i in range(100000):
+            pids.add("easy-file:%d" % i)
+        pids.add("easy-file:%d" % (2 ** 32 - 1))
+        pids.add("easy-dataset:%d" % 2 ** 31)
+        self.assertFalse(pids.add("easy-file:99999"))
+        self.assertEqual(100002, len(pids))
+        self.assertIn("easy-file:%d" % (2 ** 32 - 1), pids)
+        self.assertNotIn("easy-file:100000", pids)
+        arrays = [chunk for chunk in pids.chunks.values() if isinstance(chunk, bytearray)]
+        self.assertLess(sum(len(chunk) for chunk in arrays), 14 * 1024)
+        self.assertEqual(2, len(pids.chunks) - len(arrays))
+
+
+class TestBloomFilter(unittest.TestCase):
+
+    def test_add(self):
+        ids = BloomFilter(1000, error_rate=0.01)
+        added = [ids.add("id-%d" % i) for i in range(1000)]
+        self.assertGreater(sum(added), 980)
+        self.assertFalse(ids.add("id-1"))
+        self.assertTrue(all("id-%d" % i in ids for i in range(1000)))
+        false_positives = sum("other-%d" % i in ids for i in range(1000))
+        self.assertLess(false_positives, 50)
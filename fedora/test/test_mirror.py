@@ -0,0 +1,68 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+import os
+import tempfile
+import unittest
+
+from fedora.mirror import MetadataMirror
+from fedora.rest.api import FedoraException
+from fedora.test.fake_fedora import FakeFedora
+
+
+class TestMetadataMirror(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.fedora = FakeFedora()
+        self.fedora.add_file("easy-file:1", "easy-dataset:1", "original/a.txt", "aaa")
+        self.fedora.add_file("easy-file:2", "easy-dataset:1", "original/b.txt", "bbbb", accessible_to="KNOWN")
+        self.fedora.add_file("easy-file:3", "easy-dataset:2", "c.txt", "c")
+        self.mirror = MetadataMirror(self.fedora, os.path.join(self.tmp.name, "mirror.db"), max_workers=2)
+
+    def tearDown(self):
+        self.mirror.close()
+        self.tmp.cleanup()
+
+    def test_harvest_and_query(self):
+        self.assertEqual(3, self.mirror.harvest("pid~easy-file:*", batch_size=2))
+        rows = self.mirror.files("easy-dataset:1", accessible_to="ANONYMOUS")
+        self.assertEqual(["easy-file:1"], [row["pid"] for row in rows])
+        self.assertEqual(3, rows[0]["ds_size"])
+        self.assertEqual("original/a.txt", rows[0]["path"])
+        self.assertEqual(2, len(self.mirror.files("easy-dataset:1")))
+        self.assertEqual("EASY_FILE_METADATA.0",
+                         self.mirror.datastream("easy-file:2", "EASY_FILE_METADATA")["version_id"])
+        relations = self.mirror.query("SELECT subject FROM relationships WHERE object = ?",
+                                      ("info:fedora/easy-dataset:2",))
+        self.assertEqual(["info:fedora/easy-file:3"], [row[0] for row in relations])
+
+    def test_incremental(self):
+        self.mirror.harvest("pid~easy-file:*")
+        # nothing changed: only the findObjects call, no object is fetched again
+        self.fedora.calls = []
+        self.assertEqual(0, self.mirror.harvest("pid~easy-file:*"))
+        self.assertEqual(["find_objects"], [call[0] for call in self.fedora.calls])
+
+        self.fedora.add_file("easy-file:2", "easy-dataset:1", "original/b.txt", "changed")
+        self.fedora.objects["easy-file:2"]["fields"]["mDate"] = "2018-01-01T00:00:00.000Z"
+        self.assertEqual(1, self.mirror.harvest("pid~easy-file:*"))
+        self.assertEqual(7, self.mirror.files("easy-dataset:1")[1]["size"])
+
+    def test_failed_objects_are_harvested_again(self):
+        self.fedora.objects["easy-file:1"]["fields"]["mDate"] = "2017-06-01T00:00:00.000Z"
+        self.fedora.objects["easy-file:3"]["fields"]["mDate"] = "2018-01-01T00:00:00.000Z"
+        list_datastreams = self.fedora.list_datastreams
+
+        def failing(pid, profiles=False):
+            if pid == "easy-file:1":
+                raise FedoraException("Error response from Fedora: 500 Internal Server Error", 500)
+            return list_datastreams(pid, profiles)
+
+        self.fedora.list_datastreams = failing
+        self.assertEqual(2, self.mirror.harvest("pid~easy-file:*"))
+        self.assertEqual("2017-06-01T00:00:00.000Z", self.mirror._mark("pid~easy-file:*"))
+
+        self.fedora.list_datastreams = list_datastreams
+        self.assertEqual(1, self.mirror.harvest("pid~easy-file:*"))
+        self.assertEqual(["easy-file:1", "easy-file:2"], [row["pid"] for row in self.mirror.files("easy-dataset:1")])
+        self.assertEqual("2018-01-01T00:00:00.000Z", self.mirror._mark("pid~easy-file:*"))
@@ -0,0 +1,75 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+import csv
+import os
+import tempfile
+import unittest
+
+from fedora.reconcile import reconcile, scan_tree
+from fedora.test.fake_fedora import FakeFedora
+from fedora.worker import Worker
+
+
+class TestReconcile(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dump_dir = os.path.join(self.tmp.name, "worker-downloads")
+        self.log_file = os.path.join(self.tmp.name, "worker-log.csv")
+        fedora = FakeFedora()
+        for i in range(1, 5):
+            fedora.add_file("easy-file:%d" % i, "easy-dataset:1", "dir/f%d.txt" % i, "content %d" % i)
+        Worker(fedora).download_batch(["easy-file:%d" % i for i in range(1, 5)] + ["easy-file:404"],
+                                      self.dump_dir, self.log_file, reporting=False)
+        self.path = lambda i: os.path.join(self.dump_dir, str(i), "f%d.txt" % i)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_clean(self):
+        report = reconcile(self.log_file, self.dump_dir, verify=True)
+        self.assertTrue(report.is_clean())
+        self.assertEqual((4, 5), (report.files_scanned, report.rows))
+
+    def test_relative_paths(self):
+        with open(self.log_file) as f:
+            text = f.read()
+        with open(self.log_file, "w") as f:
+            f.write(text.replace(self.tmp.name + os.sep, ""))
+        # relative to the directory of the work-log, wherever reconcile runs
+        self.assertTrue(reconcile(self.log_file, self.dump_dir).is_clean())
+        report = reconcile(self.log_file, self.dump_dir, base_dir=self.dump_dir)
+        self.assertEqual((4, 4), (len(report.missing), len(report.orphans)))
+
+    def test_differences(self):
+        os.remove(self.path(1))
+        with open(self.path(2), "a") as f:
+            f.write("more")
+        with open(self.path(3), "w") as f:
+            f.write("CONTENT 3")
+        os.makedirs(os.path.join(self.dump_dir, "9", "deep"))
+        for name in ("9/deep/orphan.txt", "9/f9.txt.part"):
+            with open(os.path.join(self.dump_dir, name), "w") as f:
+                f.write("x")
+
+        report = reconcile(self.log_file, self.dump_dir, max_workers=3)
+        self.assertEqual([self.path(1)], [i["local_path"] for i in report.missing])
+        self.assertEqual([("easy-file:2", "9", 13)], [(i["file_id"], i["expected_size"], i["actual_size"])
+                                                      for i in report.size_mismatches])
+        self.assertEqual([os.path.join(self.dump_dir, "9", "deep", "orphan.txt")],
+                         [i["local_path"] for i in report.orphans])
+        self.assertEqual(1, len(report.partial))
+        self.assertEqual([], report.checksum_mismatches)
+
+        report = reconcile(self.log_file, self.dump_dir, verify=True)
+        self.assertEqual([self.path(3)], [i["local_path"] for i in report.checksum_mismatches])
+        report_file = os.path.join(self.tmp.name, "report.csv")
+        report.write(report_file)
+        with open(report_file, newline="") as f:
+            kinds = [row["kind"] for row in csv.DictReader(f)]
+        self.assertEqual(["orphan", "missing", "size_mismatch", "checksum_mismatch", "partial"], kinds)
+
+    def test_scan_tree(self):
+        files = scan_tree(self.dump_dir, max_workers=2)
+        self.assertEqual(len("content 1"), files[self.path(1)])
+        self.assertEqual(4, len(files))
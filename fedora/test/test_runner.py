@@ -0,0 +1,167 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from fedora.rest.test.local_server import LocalServer
+from fedora.runner import download_sharded, merge_work_logs, _shard_iter
+from fedora.test.fake_fedora import FakeFedora
+from fedora.worklog import open_work_log, read_work_log
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+
+class TestRunner(unittest.TestCase):
+
+    def test_shard_iter(self):
+        ids = ["easy-file:%d" % i for i in range(3)]
+        taken = multiprocessing.Value('q', 0)
+        stop = threading.Event()
+        self.assertEqual(ids, list(_shard_iter(ids, taken, stop)))
+        self.assertEqual(3, taken.value)
+        stop.set()
+        self.assertEqual([], list(_shard_iter(ids, taken, stop)))
+
+    def test_merge_work_logs(self):
+        ids = ["easy-file:%d" % i for i in range(7)]
+        with tempfile.TemporaryDirectory() as tmp:
+            part_files = []
+            for shard in range(3):
+                part_file = os.path.join(tmp, "worker-log.part-%d.csv" % shard)
+                with open_work_log(part_file) as writer:
+                    for object_id in ids[shard::3]:
+                        writer.write([object_id] + [""] * 13 + ["ERROR" if object_id.endswith("4") else ""])
+                part_files.append(part_file)
+            log_file = os.path.join(tmp, "worker-log.csv")
+            self.assertEqual(1, merge_work_logs(part_files, log_file))
+            self.assertEqual(ids, [row[0] for row in read_work_log(log_file)])
+
+    def test_merge_broken_parts(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            part_file = os.path.join(tmp, "worker-log.part-0.csv")
+            with open_work_log(part_file) as writer:
+                writer.write(["easy-file:0"] + [""] * 14)
+            with open(part_file, "a") as f:
+                # a shard that crashed halfway a row
+                f.write("easy-file:2,easy-dataset:1,2017")
+            part_files = [part_file]
+            if pq is not None:
+                part_file = os.path.join(tmp, "worker-log.part-1.csv")
+                with open(part_file, "wb") as f:
+                    f.write(b"PAR1 no footer")
+                part_files.append(part_file)
+            log_file = os.path.join(tmp, "worker-log.csv")
+            self.assertEqual(0, merge_work_logs(part_files, log_file))
+            self.assertEqual(["easy-file:0"], [row[0] for row in read_work_log(log_file)])
+            if pq is not None:
+                parquet_file = os.path.join(tmp, "worker-log.parquet")
+                self.assertEqual(0, merge_work_logs(part_files[1:], parquet_file, "parquet"))
+                self.assertTrue(os.path.exists(part_files[1] + ".broken"))
+
+
+class TestDownloadSharded(unittest.TestCase):
+    """
+    Shards in processes of their own, downloading from a local server.
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.server = LocalServer().start()
+        self.ids = ["easy-file:%d" % i for i in range(1, 13)]
+        fake = FakeFedora()
+        for pid in self.ids:
+            fake.add_file(pid, "easy-dataset:1", "original/%s.txt" % pid.split(":")[1], pid)
+            base = "/fedora/objects/%s/datastreams/" % pid
+            self.server.routes[("GET", base + "EASY_FILE_METADATA/content")] = \
+                (200, {}, fake.datastream(pid, "EASY_FILE_METADATA").encode("utf-8"))
+            self.server.routes[("GET", base + "EASY_FILE")] = \
+                (200, {}, fake.datastream(pid, "EASY_FILE", content_format="xml").encode("utf-8"))
+            self.server.routes[("GET", base + "EASY_FILE/content")] = \
+                self.slow_content(pid.encode("utf-8"), "%s.txt" % pid.split(":")[1])
+        self.cfg_file = os.path.join(self.tmp.name, "fedora.cfg")
+        with open(self.cfg_file, "w") as cfg:
+            cfg.write("%s,%d,user,secret\n" % (self.server.host, self.server.port))
+        self.dump_dir = os.path.join(self.tmp.name, "downloads")
+        self.log_file = os.path.join(self.tmp.name, "worker-log.csv")
+
+    def tearDown(self):
+        self.server.stop()
+        self.tmp.cleanup()
+
+    @staticmethod
+    def slow_content(content, filename, delay=0.2):
+        def route(handler):
+            time.sleep(delay)
+            return 200, {"Content-Type": "text/plain", "Content-Disposition": "attachment; filename=%s" % filename}, \
+                content
+        return route
+
+    def download(self, id_list, reporting=False):
+        return download_sharded(id_list, self.cfg_file, shards=3, dump_dir=self.dump_dir, log_file=self.log_file,
+                                reporting=reporting, report_interval=0.1, fedora_kwargs={"probe": "off"})
+
+    def test_sharded_run(self):
+        # a generator is read once by the parent process
+        self.assertEqual(0, self.download(pid for pid in self.ids + self.ids[:2]))
+        rows = list(read_work_log(self.log_file))
+        self.assertEqual(self.ids + self.ids[:2], [row[0] for row in rows])
+        self.assertEqual(["12.txt"], os.listdir(os.path.join(self.dump_dir, "12")))
+        # every id was fetched once per time it is in the list, by one of the shards
+        contents = [path for path in self.server.paths() if path.endswith("EASY_FILE/content")]
+        self.assertEqual(14, len(contents))
+        self.assertEqual(["worker-log.csv"], [f for f in os.listdir(self.tmp.name) if f.startswith("worker-log")])
+
+    def test_progress(self):
+        reported = []
+        self.download(self.ids, reporting=reported.append)
+        done = reported[-1]
+        self.assertEqual("done", done["event"])
+        self.assertEqual((12, 12, 0), (done["files"], done["total"], done["in_flight"]))
+        self.assertEqual({"download": 12}, done["transfers"])
+
+    def test_interrupted(self):
+        calls = []
+
+        def interrupt(seconds):
+            calls.append(seconds)
+            if len(calls) == 5:
+                raise KeyboardInterrupt
+            time.sleep(seconds)
+
+        # Ctrl-C while the parent process waits for the shards
+        with mock.patch("fedora.runner.time", mock.Mock(sleep=interrupt)):
+            with self.assertRaises(KeyboardInterrupt):
+                self.download(self.ids * 3)
+        rows = list(read_work_log(self.log_file))
+        # the shards stopped taking ids, the files that were done are in the work-log
+        self.assertLess(len(rows), 36)
+        self.assertTrue(all(row[14] == "" and os.path.exists(row[5]) for row in rows))
+        self.assertEqual(["worker-log.csv"], [f for f in os.listdir(self.tmp.name) if f.startswith("worker-log")])
+
+    def test_interrupted_twice(self):
+        calls = []
+
+        def interrupt(seconds):
+            calls.append(seconds)
+            if len(calls) in (3, 4):
+                raise KeyboardInterrupt
+            time.sleep(seconds)
+
+        # the second Ctrl-C terminates the shards
+        with mock.patch("fedora.runner.time", mock.Mock(sleep=interrupt)), \
+                self.assertLogs("fedora.runner", "WARNING") as logs:
+            with self.assertRaises(KeyboardInterrupt):
+                self.download(self.ids * 3)
+        self.assertTrue(any("terminating shard-" in line for line in logs.output))
+        rows = list(read_work_log(self.log_file))
+        self.assertLess(len(rows), 36)
+        self.assertTrue(all(row[14] == "" and os.path.exists(row[5]) for row in rows))
+        self.assertEqual(["worker-log.csv"], [f for f in os.listdir(self.tmp.name) if f.startswith("worker-log")])
@@ -0,0 +1,73 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+import threading
+import time
+import unittest
+
+from fedora.schedule import SizeScheduler, prefetch_sizes
+from fedora.test.fake_fedora import FakeFedora
+
+
+class TestSizeScheduler(unittest.TestCase):
+
+    def test_plan(self):
+        sizes = {"a": 5, "b": 5000, "c": 30, "d": 20, "e": 10, "f": 9000}
+        scheduler = SizeScheduler(max_workers=3, large_size=1000, batch_bytes=40, batch_files=2)
+        large, batches = scheduler.plan(list(sizes) + ["unknown"], sizes)
+        self.assertEqual(["f", "b"], large)
+        self.assertEqual([["c"], ["d", "e"], ["a", "unknown"]], batches)
+
+    def test_map(self):
+        sizes = {"file-%d" % i: i for i in range(100)}
+        scheduler = SizeScheduler(max_workers=4, large_workers=2, large_size=90, batch_files=10)
+        threads = {}
+
+        def work(item):
+            threads[item] = threading.current_thread().name
+            return item
+
+        done = list(scheduler.map(work, list(sizes), sizes))
+        self.assertEqual(sorted(sizes), sorted(done))
+        # the largest files start first, on the dedicated threads
+        self.assertIn(threads["file-99"], ("scheduler-0", "scheduler-1"))
+        self.assertIn(threads["file-98"], ("scheduler-0", "scheduler-1"))
+
+    def test_map_error(self):
+        def work(item):
+            if item == "b":
+                raise ValueError(item)
+            return item
+
+        with self.assertRaises(ValueError):
+            list(SizeScheduler(max_workers=2).map(work, ["a", "b", "c"], {}))
+
+    def test_stop_within_batch(self):
+        done = []
+
+        def work(item):
+            if item == "error":
+                raise ValueError(item)
+            time.sleep(0.01)
+            done.append(item)
+            return item
+
+        # one batch of 50 small files for the thread that does not fail
+        items = ["error"] + ["small-%d" % i for i in range(50)]
+        scheduler = SizeScheduler(max_workers=2, large_size=5, batch_files=50)
+        with self.assertRaises(ValueError):
+            list(scheduler.map(work, items, {"error": 10}))
+        self.assertLess(len(done), 10)
+
+    def test_makespan(self):
+        # one big job given last: with largest first it runs next to the small ones
+        sizes = dict({"small-%d" % i: 1 for i in range(8)}, big=8)
+        scheduler = SizeScheduler(max_workers=2, large_size=5, batch_files=1)
+        start = time.monotonic()
+        list(scheduler.map(lambda item: time.sleep(sizes[item] * 0.02), list(sizes), sizes))
+        self.assertLess(time.monotonic() - start, 0.3)
+
+    def test_prefetch_sizes(self):
+        fedora = FakeFedora()
+        fedora.add_file("easy-file:1", "easy-dataset:1", "a.txt", "aaa")
+        self.assertEqual({"easy-file:1": 3, "easy-file:2": None}, prefetch_sizes(["easy-file:1", "easy-file:2"],
+                                                                                 fedora))
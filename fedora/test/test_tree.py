@@ -0,0 +1,73 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+import os
+import tempfile
+import unittest
+
+from fedora.mirror import MetadataMirror
+from fedora.test.fake_fedora import FakeFedora
+from fedora.tree import DatasetTree
+
+
+class TestDatasetTree(unittest.TestCase):
+
+    def setUp(self):
+        self.fedora = FakeFedora()
+        self.fedora.add_file("easy-file:1", "easy-dataset:1", "original/a.txt", "aaa")
+        self.fedora.add_file("easy-file:2", "easy-dataset:1", "original/sub/b.txt", "bbbb")
+        self.fedora.add_file("easy-file:3", "easy-dataset:1", "original/sub/deeper/c.txt", "cc")
+        self.fedora.add_file("easy-file:4", "easy-dataset:1", "readme.txt", "r")
+        self.fedora.add_file("easy-file:5", "easy-dataset:2", "other.txt", "other")
+
+    def test_from_fedora(self):
+        tree = DatasetTree.from_fedora("easy-dataset:1", self.fedora, max_workers=2)
+        self.assertEqual(10, tree.size())
+        self.assertEqual(4, tree.count())
+        self.assertEqual(["original", "readme.txt"], tree.children())
+        self.assertEqual(["original/a.txt", "original/sub"], tree.children("/original/"))
+        self.assertEqual(6, tree.size("original/sub"))
+        self.assertEqual(4, tree.size("original/sub/b.txt"))
+        self.assertEqual("easy-file:2", tree.pid("original/sub/b.txt"))
+        self.assertTrue(tree.is_folder("original/sub/deeper"))
+        self.assertIn("original/sub", tree)
+        self.assertNotIn("original/other", tree)
+        self.assertEqual(["easy-file:2", "easy-file:3"], sorted(tree.file_ids("original/sub")))
+        self.assertEqual([("", 4, 10), ("original", 3, 9), ("original/sub", 2, 6), ("original/sub/deeper", 1, 2)],
+                         tree.folders())
+        with self.assertRaises(KeyError):
+            tree.size("original/other")
+
+    def test_from_mirror(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            mirror = MetadataMirror(self.fedora, os.path.join(tmp, "mirror.db"))
+            try:
+                mirror.harvest("pid~easy-file:*")
+                calls = len(self.fedora.calls)
+                tree = DatasetTree.from_mirror("easy-dataset:1", mirror)
+            finally:
+                mirror.close()
+        # nothing is fetched from the repository
+        self.assertEqual(calls, len(self.fedora.calls))
+        self.assertEqual(4, tree.count())
+        self.assertEqual([("original/sub/deeper/c.txt", "easy-file:3", 2)], list(tree.files("original/sub/deeper")))
+
+    def test_same_path(self):
+        tree = DatasetTree("easy-dataset:3", [{"pid": "easy-file:1", "path": "a/b.txt", "size": 1},
+                                              {"pid": "easy-file:2", "path": "a/b.txt", "size": 5}])
+        self.assertEqual("easy-file:2", tree.pid("a/b.txt"))
+        self.assertEqual((1, 5), (tree.count("a"), tree.size("a")))
+
+    def test_file_and_folder(self):
+        with self.assertLogs("fedora.tree", "WARNING") as logs:
+            tree = DatasetTree("easy-dataset:3", [{"pid": "easy-file:1", "path": "a/b.txt", "size": 1},
+                                                  {"pid": "easy-file:2", "path": "a", "size": 2},
+                                                  {"pid": "easy-file:3", "path": "c", "size": 3},
+                                                  {"pid": "easy-file:4", "path": "c/d/e.txt", "size": 4}])
+        self.assertEqual(2, len(logs.output))
+        self.assertTrue(tree.is_folder("a"))
+        self.assertEqual("easy-file:1", tree.pid("a/b.txt"))
+        self.assertFalse(tree.is_folder("c"))
+        self.assertNotIn("c/d", tree)
+        self.assertEqual(["easy-file:1", "easy-file:3"], sorted(tree.file_ids()))
+        self.assertEqual((2, 4), (tree.count(), tree.size()))
+        self.assertEqual([("", 2, 4), ("a", 1, 1)], tree.folders())
@@ -17,6 +17,11 @@ class TestUtils(unittest.TestCase):
         err = utils.as_w3c_datetime("123456789")
         self.assertEqual("Error: 123456789", err)
 
+    def test_ordered_map(self):
+        self.assertEqual([1, 4, 9], list(utils.ordered_map(lambda x: x * x, [1, 2, 3])))
+        self.assertEqual([x * x for x in range(50)],
+                         list(utils.ordered_map(lambda x: x * x, iter(range(50)), max_workers=4)))
+
     @unittest.skip("not a test")
     def test_csv_dialects(self):
         print(csv.list_dialects())
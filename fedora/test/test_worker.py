@@ -1,13 +1,19 @@
 #! /usr/bin/env python3
 # -*- coding: utf-8 -*-
+import csv
 import os
+import re
+import tempfile
+import time
 import unittest
+from unittest import mock
 
 import logging
 
 import sys
 
 from fedora.rest.api import Fedora
+from fedora.test.fake_fedora import FakeFedora
 from fedora.worker import Worker, LocalWorker
 
 
@@ -76,3 +82,162 @@ class TestLocalWorker(unittest.TestCase):
         self.assertEqual(0, checksum_error_count)
 
 
+class TestWorkerOffline(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dump_dir = os.path.join(self.tmp.name, "worker-downloads")
+        self.log_file = os.path.join(self.tmp.name, "worker-log.csv")
+        self.fedora = FakeFedora()
+        self.fedora.add_file("easy-file:1", "easy-dataset:1", "original/a.txt", "aaa")
+        self.fedora.add_file("easy-file:2", "easy-dataset:1", "original/sub/b.txt", "bbbb")
+        self.fedora.add_file("easy-file:3", "easy-dataset:2", "c.txt", "c")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def read_log(self):
+        with open(self.log_file, newline='') as f:
+            return list(csv.DictReader(f))
+
+    def test_download_batch(self):
+        ids = ["easy-file:3", "easy-file:1", "easy-file:2", "easy-file:404"]
+        worker = Worker(self.fedora)
+        received = []
+        errors = worker.download_batch(ids, self.dump_dir, self.log_file, reporting=received.append, max_workers=3)
+        self.assertEqual(1, errors)
+        self.assertEqual(["error", "done"], [event["event"] for event in received])
+        self.assertEqual((4, 4, 1), (received[-1]["files"], received[-1]["total"], received[-1]["failed"]))
+        rows = self.read_log()
+        self.assertEqual(ids, [row["file_id"] for row in rows])
+        self.assertEqual(os.path.join(self.dump_dir, "1", "a.txt"), rows[1]["local_path"])
+        self.assertEqual("", rows[1]["checksum_error"])
+        self.assertEqual("ERROR", rows[3]["checksum_error"])
+        # without a store or fingerprint cache there is nothing to say about the transfer
+        self.assertNotIn("transfer", rows[0])
+
+    def test_download_datasets(self):
+        worker = Worker(self.fedora)
+        errors = worker.download_datasets(["easy-dataset:1", "easy-dataset:2"], self.dump_dir, self.log_file,
+                                          reporting=False)
+        self.assertEqual(0, errors)
+        rows = self.read_log()
+        self.assertEqual(["easy-file:1", "easy-file:2", "easy-file:3"], [row["file_id"] for row in rows])
+        self.assertEqual(["easy-dataset:1", "easy-dataset:1", "easy-dataset:2"], [row["dataset_id"] for row in rows])
+        self.assertTrue(os.path.exists(os.path.join(self.dump_dir, "1", "original", "sub", "b.txt")))
+        self.assertTrue(os.path.exists(os.path.join(self.dump_dir, "2", "c.txt")))
+        self.assertNotIn("RELS-EXT", [call[2] for call in self.fedora.calls if call[0] == "datastream"])
+
+    def test_download_datasets_outside_dump_dir(self):
+        self.fedora.add_file("easy-file:4", "easy-dataset:2", "../../escaped.txt", "x")
+        self.fedora.add_file("easy-file:5", "easy-dataset:2", "/tmp/absolute.txt", "x")
+        self.fedora.add_file("easy-file:6", "easy-dataset:2", "sub/..", "x")
+        worker = Worker(self.fedora)
+        worker.download_datasets(["easy-dataset:2"], self.dump_dir, self.log_file, reporting=False)
+        rows = self.read_log()
+        self.assertEqual(["", "ERROR", "ERROR", "ERROR"], [row["checksum_error"] for row in rows])
+        self.assertEqual(["c.txt"], os.listdir(os.path.join(self.dump_dir, "2")))
+        self.assertEqual(["easy-file:3"], [call[1] for call in self.fedora.calls if call[0] == "download"])
+
+    def test_download_batch_foxml(self):
+        worker = Worker(self.fedora)
+        errors = worker.download_batch(["easy-file:1", "easy-file:2"], self.dump_dir, self.log_file,
+                                       reporting=False, use_foxml=True)
+        self.assertEqual(0, errors)
+        rows = self.read_log()
+        self.assertEqual(["original/a.txt", "original/sub/b.txt"], [row["path"] for row in rows])
+        self.assertEqual(["SHA-1", "SHA-1"], [row["checksum_type"] for row in rows])
+        self.assertEqual(["object_xml", "download"] * 2, [call[0] for call in self.fedora.calls])
+
+    def test_id_iter_selection(self):
+        ids = (i for i in ["easy-file:1", "info:fedora/easy-file:2", "easy-file:1", "", "easy-file:3", "x", "x"])
+        self.assertEqual(["easy-file:1", "easy-file:2", "easy-file:3", "x"], list(Worker.id_iter(ids, dedupe=True)))
+        ids = ["easy-file:%d" % (i % 5) for i in range(10)]
+        self.assertEqual(["easy-file:1", "easy-file:3"], list(Worker.id_iter(ids, "bloom", shard=1, shards=2)))
+        self.assertEqual(ids[2:4], list(Worker.id_iter(ids, start=2, stop=4)))
+
+    def test_download_batch_dedup(self):
+        self.fedora.add_file("easy-file:4", "easy-dataset:2", "copy-of-a.txt", "aaa")
+        cas_dir = os.path.join(self.tmp.name, "cas")
+        worker = Worker(self.fedora)
+        errors = worker.download_batch(["easy-file:1", "easy-file:4"], self.dump_dir, self.log_file,
+                                       reporting=False, cas_dir=cas_dir)
+        self.assertEqual(0, errors)
+        rows = self.read_log()
+        self.assertEqual(["download", "dedup"], [row["transfer"] for row in rows])
+        self.assertEqual(os.path.join(self.dump_dir, "4", "copy-of-a.txt"), rows[1]["local_path"])
+        self.assertEqual("3", rows[1]["size"])
+        self.assertEqual(os.stat(rows[0]["local_path"]).st_ino, os.stat(rows[1]["local_path"]).st_ino)
+        downloads = [call[1] for call in self.fedora.calls if call[0] == "download"]
+        self.assertEqual(["easy-file:1"], downloads)
+
+    def test_download_batch_same_name(self):
+        # the server names the file after the datastream label; downloaded or deduplicated, the name is the one in
+        # EASY_FILE_METADATA
+        self.fedora.add_file("easy-file:4", "easy-dataset:2", "a.txt", "aaa")
+        for pid in ("easy-file:1", "easy-file:4"):
+            self.fedora.objects[pid]["datastreams"]["EASY_FILE"]["filename"] = "label.txt"
+        worker = Worker(self.fedora)
+        worker.download_batch(["easy-file:1", "easy-file:4"], self.dump_dir, self.log_file, reporting=False,
+                              cas_dir=os.path.join(self.tmp.name, "cas"))
+        rows = self.read_log()
+        self.assertEqual(["download", "dedup"], [row["transfer"] for row in rows])
+        self.assertEqual([os.path.join(self.dump_dir, n, "a.txt") for n in ("1", "4")],
+                         [row["local_path"] for row in rows])
+        self.assertEqual(["a.txt", "a.txt"], [row["filename"] for row in rows])
+
+    def test_download_batch_server_name(self):
+        # without a store or fingerprints the file keeps the name the server gives it
+        self.fedora.objects["easy-file:1"]["datastreams"]["EASY_FILE"]["filename"] = "label.txt"
+        worker = Worker(self.fedora)
+        worker.download_batch(["easy-file:1"], self.dump_dir, self.log_file, reporting=False)
+        rows = self.read_log()
+        self.assertEqual(os.path.join(self.dump_dir, "1", "label.txt"), rows[0]["local_path"])
+
+    def test_download_batch_dedup_without_size(self):
+        self.fedora.add_file("easy-file:4", "easy-dataset:2", "copy-of-a.txt", "aaa")
+        profile_xml = self.fedora.profile_xml
+
+        def without_size(*args, **kwargs):
+            return re.sub(r"<dsSize>\d+</dsSize>", "", profile_xml(*args, **kwargs))
+
+        worker = Worker(self.fedora)
+        with mock.patch.object(self.fedora, "profile_xml", without_size):
+            errors = worker.download_batch(["easy-file:1", "easy-file:4"], self.dump_dir, self.log_file,
+                                           reporting=False, cas_dir=os.path.join(self.tmp.name, "cas"))
+        self.assertEqual(0, errors)
+        rows = self.read_log()
+        self.assertEqual(["download", "dedup"], [row["transfer"] for row in rows])
+        self.assertEqual(["3", "3"], [row["size"] for row in rows])
+
+    def test_download_batch_sync(self):
+        fingerprint_file = os.path.join(self.tmp.name, "fingerprints.db")
+        ids = ["easy-file:1", "easy-file:2"]
+        worker = Worker(self.fedora)
+        worker.download_batch(ids, self.dump_dir, self.log_file, reporting=False, fingerprint_file=fingerprint_file)
+        self.assertEqual(["download", "download"], [row["transfer"] for row in self.read_log()])
+
+        # one file changed on the server, one file is new
+        self.fedora.add_file("easy-file:1", "easy-dataset:1", "original/a.txt", "AAAA")
+        self.fedora.add_file("easy-file:3", "easy-dataset:2", "c.txt", "c")
+        self.fedora.calls.clear()
+        errors = worker.download_batch(ids + ["easy-file:3"], self.dump_dir, self.log_file, reporting=False,
+                                       fingerprint_file=fingerprint_file)
+        self.assertEqual(0, errors)
+        rows = self.read_log()
+        self.assertEqual(["download", "skip", "download"], [row["transfer"] for row in rows])
+        self.assertEqual(os.path.join(self.dump_dir, "2", "b.txt"), rows[1]["local_path"])
+        self.assertEqual("4", rows[1]["size"])
+        downloads = [call[1] for call in self.fedora.calls if call[0] == "download"]
+        self.assertEqual(["easy-file:1", "easy-file:3"], downloads)
+
+    def test_download_batch_scheduled(self):
+        self.fedora.add_file("easy-file:4", "easy-dataset:2", "big.txt", "x" * 3000)
+        worker = Worker(self.fedora)
+        start = time.monotonic()
+        errors = worker.download_batch(["easy-file:1", "easy-file:2", "easy-file:4"], self.dump_dir, self.log_file,
+                                       reporting=False, max_workers=2, schedule=True, bandwidth=2000)
+        self.assertEqual(0, errors)
+        # the largest file first; 3007 bytes at 2000 bytes/s, with 2000 bytes to start with
+        self.assertEqual("easy-file:4", self.read_log()[0]["file_id"])
+        self.assertGreater(time.monotonic() - start, 0.4)
@@ -0,0 +1,130 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+import csv
+import os
+import tempfile
+import unittest
+
+from fedora import utils
+from fedora.worker import LocalWorker
+from fedora.worklog import open_work_log, read_work_log, log_format, CsvWorkLog, SqliteWorkLog, WORK_LOG_COLUMNS, \
+    TRANSFER_COLUMNS
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+
+def sample_row(object_id, local_path, checksum, size=3):
+    return [object_id, "easy-dataset:1", "2017-01-01T00:00Z", "a.txt", "original/a.txt", local_path,
+            "text/plain", size, "SHA-1", checksum, "2016-12-12T12:00:00.000Z",
+            "DEPOSITOR", "ANONYMOUS", "ANONYMOUS", "", "download"]
+
+
+class TestWorkLog(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.data_file = os.path.join(self.tmp.name, "a.txt")
+        with open(self.data_file, "w") as f:
+            f.write("abc")
+        self.sha1 = utils.sha1_for_file(self.data_file)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_log_format(self):
+        self.assertEqual("csv", log_format("worker-log.csv"))
+        self.assertEqual("parquet", log_format("worker-log.parquet"))
+        self.assertEqual("sqlite", log_format("worker-log.db"))
+
+    def test_csv(self):
+        log_file = os.path.join(self.tmp.name, "worker-log.csv")
+        with open_work_log(log_file) as writer:
+            self.assertIsInstance(writer, CsvWorkLog)
+            writer.write(sample_row("easy-file:1", self.data_file, self.sha1))
+        with open(log_file, newline='') as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(WORK_LOG_COLUMNS, rows[0])
+        self.assertEqual("easy-file:1", rows[1][0])
+
+    @unittest.skipIf(pq is None, "pyarrow not installed")
+    def test_parquet(self):
+        log_file = os.path.join(self.tmp.name, "worker-log.parquet")
+        with open_work_log(log_file) as writer:
+            writer.row_group_size = 2
+            for i in range(5):
+                writer.write(sample_row("easy-file:%d" % i, self.data_file, self.sha1))
+            writer.write(["easy-file:9"] + ["ERROR"] * 15)
+        parquet_file = pq.ParquetFile(log_file)
+        self.assertEqual(3, parquet_file.num_row_groups)
+        table = parquet_file.read()
+        self.assertEqual(6, table.num_rows)
+        self.assertEqual([3, 3, 3, 3, 3, None], table.column("size").to_pylist())
+
+    @unittest.skipIf(pq is None, "pyarrow not installed")
+    def test_verify_checksums_parquet(self):
+        log_file = os.path.join(self.tmp.name, "worker-log.parquet")
+        with open_work_log(log_file) as writer:
+            writer.write(sample_row("easy-file:1", self.data_file, self.sha1))
+            writer.write(sample_row("easy-file:2", self.data_file, "wrong"))
+
+        self.assertEqual(1, LocalWorker().verify_checksums_local(log_file))
+        errors = pq.read_table(log_file).column("checksum_error").to_pylist()
+        self.assertEqual(["", self.sha1], errors)
+        # second pass reports the error of the previous pass
+        self.assertEqual(1, LocalWorker().verify_checksums_local(log_file))
+
+    def test_sqlite(self):
+        db_file = os.path.join(self.tmp.name, "worker-log.db")
+        with open_work_log(db_file) as store:
+            self.assertIsInstance(store, SqliteWorkLog)
+            store.write(sample_row("easy-file:1", self.data_file, self.sha1))
+            store.write(sample_row("easy-file:2", "/no/such/file", "abc"))
+            # same file_id replaces the row
+            store.write(sample_row("easy-file:2", "/other/file", "abc"))
+        with SqliteWorkLog(db_file) as store:
+            self.assertEqual(["easy-file:1", "easy-file:2"], [row[0] for row in store.rows(["file_id"])])
+            self.assertEqual("easy-file:2", store.lookup("/other/file")[0])
+            self.assertEqual(3, store.lookup(self.data_file)[7])
+
+    def test_sqlite_added_column(self):
+        db_file = os.path.join(self.tmp.name, "worker-log.db")
+        with open_work_log(db_file) as store:
+            store.write(sample_row("easy-file:1", self.data_file, self.sha1))
+        # a batch with a content store writes to a work-log without the column 'transfer'
+        with open_work_log(db_file, columns=TRANSFER_COLUMNS) as store:
+            store.write(sample_row("easy-file:2", self.data_file, self.sha1))
+        rows = list(read_work_log(db_file))
+        self.assertEqual([None, "download"], [row[15] for row in rows])
+        # a batch without one still writes to it
+        with open_work_log(db_file) as store:
+            store.write(sample_row("easy-file:3", self.data_file, self.sha1))
+        self.assertEqual(16, len(list(read_work_log(db_file))[2]))
+
+    def test_sqlite_import_export(self):
+        csv_file = os.path.join(self.tmp.name, "worker-log.csv")
+        with open_work_log(csv_file) as writer:
+            for i in range(3):
+                writer.write(sample_row("easy-file:%d" % i, self.data_file, self.sha1))
+        db_file = os.path.join(self.tmp.name, "worker-log.db")
+        export_file = os.path.join(self.tmp.name, "export.csv")
+        with SqliteWorkLog(db_file, batch_size=2) as store:
+            self.assertEqual(3, store.import_csv(csv_file))
+            self.assertEqual(3, store.export_csv(export_file))
+        with open(csv_file, "rb") as original, open(export_file, "rb") as exported:
+            self.assertEqual(original.read(), exported.read())
+
+    def test_verify_checksums_sqlite(self):
+        db_file = os.path.join(self.tmp.name, "worker-log.db")
+        with SqliteWorkLog(db_file, batch_size=1) as store:
+            for i in range(5):
+                store.write(sample_row("easy-file:%d" % i, self.data_file, self.sha1))
+            store.write(sample_row("easy-file:9", self.data_file, "wrong"))
+
+        self.assertEqual(1, LocalWorker().verify_checksums_local(db_file))
+        with SqliteWorkLog(db_file) as store:
+            errors = [row[0] for row in store.rows(["checksum_error"])]
+        self.assertEqual(["", "", "", "", "", self.sha1], errors)
+        self.assertEqual(1, LocalWorker().verify_checksums_local(db_file))
@@ -0,0 +1,198 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+import logging
+
+from fedora import utils
+from fedora.rest.ds import FileItemMetadata, dataset_file_ids
+
+LOG = logging.getLogger(__name__)
+
+
+class DatasetTree(object):
+    """
+    Index of the folders and files of a dataset, after the paths in their EASY_FILE_METADATA.
+
+    The tree is kept in flat lists, one entry per node: path, pid (`None` for folders), number of files and size
+    in bytes, the latter two summed over the subtree of folders, and the indexes of the children. The root is
+    the folder with path ''. It is built in one pass over file records, from a :class:`fedora.mirror.MetadataMirror`
+    or from the repository; folders are made from the paths of the files, so folders without files are not in
+    the tree. Paths are relative to the dataset, without leading or trailing '/'. A path is either a file or a
+    folder: of a file at the path of a folder, or under the path of a file, the one that comes last is left out
+    with a warning. Example::
+
+        tree = DatasetTree.from_mirror("easy-dataset:5958", mirror)
+        print(tree.size("original"), tree.count("original"))
+        worker.download_batch(tree.file_ids("original/images"))
+
+    :param dataset_id: id of the dataset
+    :param records: file records, mappings with the keys pid, path and size, f.i. rows of
+        :meth:`fedora.mirror.MetadataMirror.files`
+    """
+
+    def __init__(self, dataset_id, records=()):
+        self.dataset_id = dataset_id
+        self._paths = [""]
+        self._pids = [None]
+        self._counts = [0]
+        self._sizes = [0]
+        self._parents = [-1]
+        self._children = [[]]
+        self._index = {"": 0}
+        for record in records:
+            self._add(record["pid"], record["path"], record["size"])
+        self._roll_up()
+
+    @classmethod
+    def from_mirror(cls, dataset_id, mirror):
+        """
+        :param dataset_id: id of the dataset
+        :param mirror: a :class:`fedora.mirror.MetadataMirror` with the files of the dataset harvested
+        """
+        return cls(dataset_id, mirror.files(dataset_id))
+
+    @classmethod
+    def from_fedora(cls, dataset_id, fedora, max_workers=8):
+        """
+        Find the files of the dataset with one risearch query and fetch their EASY_FILE_METADATA in `max_workers`
+        threads.
+
+        :param dataset_id: id of the dataset
+        :param fedora: the Fedora instance
+        :param max_workers: number of threads, default: 8
+        """
+        def fetch(file_id):
+            fmd = FileItemMetadata(file_id, fedora)
+            fmd.fetch()
+            return {"pid": file_id, "path": fmd.fmd_path, "size": fmd.fmd_size}
+
+        return cls(dataset_id, utils.ordered_map(fetch, dataset_file_ids(dataset_id, fedora), max_workers))
+
+    def __len__(self):
+        return len(self._paths)
+
+    def __contains__(self, path):
+        return self._normalize(path) in self._index
+
+    def is_folder(self, path):
+        return self._pids[self._node(path)] is None
+
+    def pid(self, path):
+        """
+        :return: the pid of the file at `path`, `None` for a folder
+        """
+        return self._pids[self._node(path)]
+
+    def count(self, path=""):
+        """
+        :return: the number of files at or under `path`
+        """
+        return self._counts[self._node(path)]
+
+    def size(self, path=""):
+        """
+        :return: the size in bytes of the file at `path`, or of all files under it
+        """
+        return self._sizes[self._node(path)]
+
+    def children(self, path=""):
+        """
+        :return: list of the paths of the folders and files directly under `path`, sorted
+        """
+        return sorted(self._paths[child] for child in self._children[self._node(path)])
+
+    def files(self, path=""):
+        """
+        List the files at or under `path`, in no particular order.
+
+        :return: generator of tuples (path, pid, size)
+        """
+        stack = [self._node(path)]
+        while stack:
+            node = stack.pop()
+            if self._pids[node] is not None:
+                yield self._paths[node], self._pids[node], self._sizes[node]
+            stack.extend(self._children[node])
+
+    def file_ids(self, path=""):
+        """
+        :return: list of the pids of the files at or under `path`, f.i. as `id_list` for
+            :meth:`fedora.worker.Worker.download_batch`
+        """
+        return [pid for _, pid, _ in self.files(path)]
+
+    def folders(self, path=""):
+        """
+        Per folder report of the subtree of `path`.
+
+        :return: list of tuples (path, number of files, size in bytes) of `path` and the folders under it,
+            sorted by path
+        """
+        stack = [self._node(path)]
+        folders = []
+        while stack:
+            node = stack.pop()
+            if self._pids[node] is None:
+                folders.append((self._paths[node], self._counts[node], self._sizes[node]))
+                stack.extend(self._children[node])
+        return sorted(folders)
+
+    def _node(self, path):
+        try:
+            return self._index[self._normalize(path)]
+        except KeyError:
+            raise KeyError("%s has no file or folder %s" % (self.dataset_id, path))
+
+    @staticmethod
+    def _normalize(path):
+        return (path or "").strip("/")
+
+    def _add(self, pid, path, size):
+        path = self._normalize(path)
+        if not path:
+            LOG.warning("No path for %s in %s" % (pid, self.dataset_id))
+            return
+        node = self._index.get(path)
+        if node is not None:
+            if self._pids[node] is None:
+                LOG.warning("Path %s of %s is a folder in %s, file left out" % (path, pid, self.dataset_id))
+                return
+            LOG.warning("%s and %s have the same path %s" % (self._pids[node], pid, path))
+            self._pids[node] = pid
+            self._sizes[node] = size or 0
+            return
+        parent = self._folder(path.rpartition("/")[0])
+        if parent is None:
+            LOG.warning("Path %s of %s is under a file in %s, file left out" % (path, pid, self.dataset_id))
+            return
+        self._new_node(path, pid, 1, size or 0, parent)
+
+    def _folder(self, path):
+        # the folder node of path, made if needed; None if path, or a path above it, is a file
+        node = self._index.get(path)
+        if node is None:
+            parent = self._folder(path.rpartition("/")[0])
+            if parent is None:
+                return None
+            node = self._new_node(path, None, 0, 0, parent)
+        elif self._pids[node] is not None:
+            return None
+        return node
+
+    def _new_node(self, path, pid, count, size, parent):
+        node = len(self._paths)
+        self._paths.append(path)
+        self._pids.append(pid)
+        self._counts.append(count)
+        self._sizes.append(size)
+        self._parents.append(parent)
+        self._children.append([])
+        self._children[parent].append(node)
+        self._index[path] = node
+        return node
+
+    def _roll_up(self):
+        # a node always comes after its parent, so one backward pass adds every subtree to its parent
+        for node in range(len(self._paths) - 1, 0, -1):
+            parent = self._parents[node]
+            self._counts[parent] += self._counts[node]
+            self._sizes[parent] += self._sizes[node]
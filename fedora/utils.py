@@ -1,8 +1,10 @@
 #! /usr/bin/env python3
 # -*- coding: utf-8 -*-
+import collections
 import csv
 import hashlib
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from functools import partial
 
@@ -56,6 +58,32 @@ def sha1_for_file(filename, block_size=2**14):
     return d.hexdigest()
 
 
+def ordered_map(fn, iterable, max_workers=1, window=None):
+    """Like the builtin map, but calls `fn` in `max_workers` threads.
+
+    Results are yielded in the order of `iterable`. At most `window` calls are submitted ahead of the result
+    that is yielded next, so `iterable` can be a long generator.
+
+    :param fn: the function to call on each item
+    :param iterable: the items
+    :param max_workers: number of threads, with 1 or less `fn` is called in the current thread
+    :param window: maximum number of calls in flight, default: 2 * `max_workers`
+    """
+    if max_workers <= 1:
+        for item in iterable:
+            yield fn(item)
+        return
+    window = window or 2 * max_workers
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = collections.deque()
+        for item in iterable:
+            pending.append(executor.submit(fn, item))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
 class RFC4180(object):
     delimiter = ','
     quotechar = '"'
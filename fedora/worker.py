@@ -6,9 +6,17 @@ import re
 
 import logging
 
+from fedora import events
 from fedora import utils
+from fedora.cas import ContentStore
+from fedora.fingerprint import FingerprintCache
+from fedora.idset import BloomFilter, PidBitmap
+from fedora import worklog
 from fedora.rest.api import Fedora, FedoraException
-from fedora.rest.ds import DatastreamProfile, FileItemMetadata, RelsExt
+from fedora.rest.ds import DatastreamProfile, FileItemMetadata, RelsExt, dataset_file_ids
+from fedora.rest.foxml import DigitalObject
+from fedora.rest.limiter import TokenBucket
+from fedora.schedule import SizeScheduler, prefetch_sizes
 
 LOG = logging.getLogger(__name__)
 
@@ -40,89 +48,350 @@ class Worker(object):
                        log_file="worker-log.csv",
                        id_in_path=True,
                        chunk_size=1024,
-                       reporting=True):
+                       reporting=True,
+                       log_format=None,
+                       max_workers=1,
+                       cas_dir=None,
+                       fingerprint_file=None,
+                       dedupe=False,
+                       use_foxml=False,
+                       schedule=None,
+                       sizes=None,
+                       bandwidth=None):
         """
         Download a bunch of files, store metadata in a work-log, compare checksums.
 
         :param id_list: either a list of file-id's or the name of the file that contains this list
         :param dump_dir: where to store downloaded files
         :param log_file: where to write the work-log
-        :param dialect: what csv dialect should the work-log be written in, default: :class:`utils.RFC4180`
         :param id_in_path: should (the number part of) the object_id be part of the local path, default: `True`
         :param chunk_size: size of chuncks for read-write operation, default: 1024
+        :param reporting: `True` for progress on the console, `False` for none, or a callable that gets progress
+            and error events, f.i. a :class:`fedora.events.JsonLinesSink`. See :class:`fedora.events.ProgressReporter`.
+        :param log_format: format of the work-log, 'csv' or 'parquet', default: derived from the extension of
+            `log_file`. Csv work-logs are written in the dialect of this worker. See :mod:`fedora.worklog`.
+        :param max_workers: number of files downloaded concurrently, default: 1. The work-log keeps the order
+            of `id_list`.
+        :param cas_dir: directory of a :class:`fedora.cas.ContentStore`, default: `None` (no store). With a store,
+            files with content that was downloaded before are hardlinked from the store instead of downloaded;
+            the column 'transfer' of the work-log says 'dedup' for these files.
+        :param fingerprint_file: database of a :class:`fedora.fingerprint.FingerprintCache`, default: `None`.
+            When given, only new or changed content is downloaded: the profile of each datastream is fetched
+            first and files whose local copy has the size and SHA-1 of the datastream are skipped. Checksums of
+            local copies come from the cache unless the files changed. The column 'transfer' of the work-log says
+            'skip' for these files.
+        :param dedupe: download ids that occur more than once in `id_list` only once, see :meth:`id_iter`,
+            default: `False`
+        :param use_foxml: get EASY_FILE_METADATA, the profile of EASY_FILE and RELS-EXT of each file from one
+            objectXML request instead of two or three separate requests, default: `False`.
+            See :class:`fedora.rest.foxml.DigitalObject`.
+        :param schedule: `True` or a :class:`fedora.schedule.SizeScheduler` to download large files first on
+            dedicated threads and small files in batches, default: `None` (in the order of `id_list`). With
+            `True` a quarter of `max_workers` is dedicated to large files. The work-log is then in the order in
+            which files are done.
+        :param sizes: dict with the size of each file for the `schedule`, default: `None` (sizes are read from
+            the profiles of the files first, see :func:`fedora.schedule.prefetch_sizes`)
+        :param bandwidth: maximum number of bytes per second downloaded by all threads together,
+            default: `None` (no maximum)
         :return: count of checksum errors
         """
-        ds_id = "EASY_FILE"
+        store = None if cas_dir is None else ContentStore(cas_dir)
+        fingerprints = None if fingerprint_file is None else FingerprintCache(fingerprint_file)
+        throttle = None if bandwidth is None else TokenBucket(bandwidth).consume
+
+        ids = self.id_iter(id_list, dedupe)
+        total = len(id_list) if isinstance(id_list, (list, tuple)) else None
+        if schedule is True:
+            schedule = SizeScheduler(max_workers, large_workers=max(1, max_workers // 4))
+        if isinstance(schedule, SizeScheduler):
+            ids = list(ids)
+            total = len(ids)
+            if sizes is None:
+                sizes = prefetch_sizes(ids, self.fedora, max_workers)
+        progress = events.reporter(reporting, total)
+
+        def download(object_id):
+            progress.started()
+            row = self._download_file(object_id, dump_dir, id_in_path, chunk_size, store=store,
+                                      fingerprints=fingerprints, use_foxml=use_foxml, throttle=throttle)
+            progress.finished(row)
+            return row
+
+        try:
+            with progress:
+                if isinstance(schedule, SizeScheduler):
+                    rows = schedule.map(download, ids, sizes)
+                else:
+                    rows = utils.ordered_map(download, ids, max_workers)
+                return self._write_work_log(rows, log_file, log_format,
+                                            store is not None or fingerprints is not None)
+        finally:
+            if fingerprints is not None:
+                fingerprints.close()
+
+    def download_datasets(self, dataset_ids,
+                          dump_dir="worker-downloads",
+                          log_file="worker-log.csv",
+                          chunk_size=1024,
+                          reporting=True,
+                          log_format=None,
+                          max_workers=4,
+                          cas_dir=None,
+                          fingerprint_file=None,
+                          use_foxml=False,
+                          bandwidth=None):
+        """
+        Download all files of a bunch of datasets, store metadata in a work-log, compare checksums.
+
+        The files of each dataset are found with one risearch query. Downloaded files are stored in a tree
+        that mirrors the dataset: `{dump_dir}/{number part of dataset_id}/{path in EASY_FILE_METADATA}`.
+        As the dataset is known, RELS-EXT of the files is not consulted.
+
+        :param dataset_ids: either a list of dataset-id's or the name of the file that contains this list
+        :param dump_dir: where to store downloaded files
+        :param log_file: where to write the work-log
+        :param chunk_size: size of chuncks for read-write operation, default: 1024
+        :param reporting: progress reporting, see :meth:`download_batch`
+        :param log_format: format of the work-log, see :meth:`download_batch`
+        :param max_workers: number of files downloaded concurrently, default: 4
+        :param cas_dir: directory of a content store, see :meth:`download_batch`
+        :param fingerprint_file: database of a fingerprint cache, see :meth:`download_batch`
+        :param use_foxml: get metadata from one objectXML request, see :meth:`download_batch`
+        :param bandwidth: maximum number of bytes per second, see :meth:`download_batch`
+        :return: count of checksum errors
+        """
+        store = None if cas_dir is None else ContentStore(cas_dir)
+        fingerprints = None if fingerprint_file is None else FingerprintCache(fingerprint_file)
+        throttle = None if bandwidth is None else TokenBucket(bandwidth).consume
+
+        def files():
+            for dataset_id in self.id_iter(dataset_ids):
+                for file_id in dataset_file_ids(dataset_id, self.fedora):
+                    yield file_id, dataset_id
+
+        progress = events.reporter(reporting)
+
+        def download(item):
+            progress.started()
+            row = self._download_file(item[0], dump_dir, False, chunk_size, dataset_id=item[1],
+                                      store=store, fingerprints=fingerprints, use_foxml=use_foxml,
+                                      throttle=throttle)
+            progress.finished(row)
+            return row
+
+        try:
+            with progress:
+                rows = utils.ordered_map(download, files(), max_workers)
+                return self._write_work_log(rows, log_file, log_format,
+                                            store is not None or fingerprints is not None)
+        finally:
+            if fingerprints is not None:
+                fingerprints.close()
+
+    def _write_work_log(self, rows, log_file, log_format, transfer=False):
         checksum_error_count = 0
         work_log = os.path.abspath(log_file)
         os.makedirs(os.path.dirname(work_log), exist_ok=True)
-        count = 0
-        with open(work_log, 'w', newline='', ) as csv_log:
-            csv_writer = csv.writer(csv_log, dialect=self.dialect)
-            csv_writer.writerow(["file_id", "dataset_id", "server_date", "filename", "path", "local_path",
-                                 "media_type", "size",
-                                 "checksum_type", "checksum", "creation_date",
-                                 "creator_role", "visible_to", "accessible_to",
-                                 "checksum_error"])
-
-            for object_id in self.id_iter(id_list):
-                dataset_id = server_date = filename = file_path = local_path = media_type = size = checksum_type\
-                    = checksum = creation_date = creator_role = visible_to = accessible_to = checksum_error = "ERROR"
-                try:
-                    meta = self.fedora.download(object_id, ds_id, dump_dir, id_in_path, chunk_size)
-                    profile = DatastreamProfile(object_id, ds_id, self.fedora)
-                    profile.fetch()
-                    fmd = FileItemMetadata(object_id, self.fedora)
-                    fmd.fetch()
-
-                    dataset_id = fmd.fmd_dataset_sid
-                    # as of late the dataset id is not in FileItemMetadata anymore
-                    if dataset_id is None or dataset_id == '':
-                        rex = RelsExt(object_id, self.fedora)
-                        rex.fetch()
-                        dataset_id = rex.get_is_subordinate_to()
-                    server_date = utils.as_w3c_datetime(meta["Date"])
-                    filename = meta["filename"]
-                    file_path = fmd.fmd_path
-                    local_path = meta["local-path"]
-                    media_type = meta["Content-Type"]
-                    size = int(meta["Content-Length"])
-                    checksum_type = profile.ds_checksum_type
-                    checksum = profile.ds_checksum
-                    creation_date = profile.ds_creation_date
-                    creator_role = fmd.fmd_creator_role
-                    visible_to = fmd.fmd_visible_to
-                    accessible_to = fmd.fmd_accessible_to
-
-                    sha1 = utils.sha1_for_file(local_path)
-                    if sha1 != profile.ds_checksum:
-                        checksum_error = sha1
-                        checksum_error_count += 1
-                    else:
-                        checksum_error = ""
-                except FedoraException:
+        # the column 'transfer' only tells something with a store or a fingerprint cache
+        columns = worklog.TRANSFER_COLUMNS if transfer else worklog.WORK_LOG_COLUMNS
+        with worklog.open_work_log(work_log, log_format, dialect=self.dialect, columns=columns) as log_writer:
+            for row in rows:
+                log_writer.write(row)
+                if row[14] != "":
                     checksum_error_count += 1
-                    LOG.exception("Failed to download %s" % object_id)
-
-                csv_writer.writerow([object_id, dataset_id, server_date, filename, file_path, local_path,
-                                     media_type, size,
-                                     checksum_type, checksum, creation_date,
-                                     creator_role, visible_to, accessible_to,
-                                     checksum_error])
-                count += 1
-                if reporting:
-                    print('\r', count, dataset_id, object_id, filename, end='', flush=True)
         return checksum_error_count
 
+    def _download_file(self, object_id, dump_dir, id_in_path, chunk_size, dataset_id=None, store=None,
+                       fingerprints=None, use_foxml=False, throttle=None):
+        """
+        Download one file and collect its work-log row. When `dataset_id` is given, the file is stored under
+        `{dump_dir}/{number part of dataset_id}/{path in EASY_FILE_METADATA}`. When `fingerprints` are given and
+        the local copy of the file matches size and checksum of the datastream, nothing is transferred. When a
+        `store` is given and it has the content already, the file is materialized from the store instead of
+        downloaded. With `use_foxml` all metadata comes from one objectXML request. A `throttle` is passed on to
+        :meth:`fedora.rest.api.Fedora.download`.
+
+        :return: the work-log row, see :data:`worklog.TRANSFER_COLUMNS`
+        """
+        ds_id = "EASY_FILE"
+        server_date = filename = file_path = local_path = media_type = size = checksum_type \
+            = checksum = creation_date = creator_role = visible_to = accessible_to = checksum_error \
+            = transfer = "ERROR"
+        try:
+            if use_foxml:
+                # one request for metadata, profile and relations
+                obj = DigitalObject(object_id, self.fedora)
+                obj.fetch()
+                fmd = obj.file_item_metadata()
+                profile = obj.profile(ds_id)
+            else:
+                obj = None
+                fmd = FileItemMetadata(object_id, self.fedora)
+                fmd.fetch()
+                profile = None
+            if dataset_id is None:
+                folder = dump_dir
+                dataset_id = fmd.fmd_dataset_sid
+                # as of late the dataset id is not in FileItemMetadata anymore
+                if dataset_id is None or dataset_id == '':
+                    if obj is not None:
+                        rex = obj.rels_ext()
+                    else:
+                        rex = RelsExt(object_id, self.fedora)
+                        rex.fetch()
+                    dataset_id = rex.get_is_subordinate_to()
+            else:
+                folder = self._inside(os.path.join(dump_dir, dataset_id.split(":")[1]),
+                                      os.path.dirname(fmd.fmd_path or ""), object_id)
+                id_in_path = False
+            if profile is None:
+                profile = DatastreamProfile(object_id, ds_id, self.fedora)
+                profile.fetch()
+
+            if id_in_path:
+                folder = os.path.join(folder, object_id.split(":")[1])
+            expected_path = self._inside(folder, fmd.fmd_name or object_id, object_id)
+            if os.path.dirname(expected_path) != os.path.abspath(folder):
+                raise FedoraException("Name %s of %s is not a file name" % (fmd.fmd_name, object_id))
+            verifiable = profile.ds_checksum_type == "SHA-1"
+            # metadata of the file as it would have been downloaded
+            meta = {"Date": utils.w3c_now(), "filename": os.path.basename(expected_path), "local-path": expected_path,
+                    "Content-Type": profile.ds_mime, "Content-Length": profile.ds_size}
+
+            local_copy = None
+            if fingerprints is not None and verifiable:
+                local_copy = self._find_local_copy(object_id, expected_path, profile, fingerprints)
+            if local_copy is not None:
+                meta["filename"] = os.path.basename(local_copy)
+                meta["local-path"] = local_copy
+                transfer = "skip"
+            elif store is not None and verifiable and store.contains(profile.ds_checksum):
+                store.materialize(profile.ds_checksum, expected_path)
+                transfer = "dedup"
+            else:
+                # with a store or fingerprints, the same name as a file materialized or found locally
+                filename = None
+                if store is not None or fingerprints is not None:
+                    filename = os.path.basename(expected_path)
+                meta = self.fedora.download(object_id, ds_id, folder, False, chunk_size, throttle=throttle,
+                                            filename=filename)
+                transfer = "download"
+            if meta["Content-Length"] is None:
+                meta["Content-Length"] = os.path.getsize(meta["local-path"])
+
+            server_date = utils.as_w3c_datetime(meta["Date"])
+            filename = meta["filename"]
+            file_path = fmd.fmd_path
+            local_path = meta["local-path"]
+            media_type = meta["Content-Type"]
+            size = int(meta["Content-Length"])
+            checksum_type = profile.ds_checksum_type
+            checksum = profile.ds_checksum
+            creation_date = profile.ds_creation_date
+            creator_role = fmd.fmd_creator_role
+            visible_to = fmd.fmd_visible_to
+            accessible_to = fmd.fmd_accessible_to
+
+            if transfer == "skip":
+                checksum_error = ""
+            elif transfer == "dedup":
+                # the store only holds verified content
+                checksum_error = ""
+                if fingerprints is not None:
+                    fingerprints.put(local_path, checksum, object_id)
+            else:
+                sha1 = utils.sha1_for_file(local_path)
+                if fingerprints is not None:
+                    fingerprints.put(local_path, sha1, object_id)
+                if sha1 != profile.ds_checksum:
+                    checksum_error = sha1
+                else:
+                    checksum_error = ""
+                    if store is not None and verifiable:
+                        store.add(local_path, checksum)
+        except FedoraException:
+            LOG.exception("Failed to download %s" % object_id)
+
+        if dataset_id is None:
+            dataset_id = "ERROR"
+        return [object_id, dataset_id, server_date, filename, file_path, local_path,
+                media_type, size,
+                checksum_type, checksum, creation_date,
+                creator_role, visible_to, accessible_to,
+                checksum_error, transfer]
+
+    @staticmethod
+    def _inside(folder, relative_path, object_id):
+        """
+        :return: the absolute path of `relative_path`, from repository metadata, in `folder`
+        :raises FedoraException: if the path is absolute or leads out of `folder`
+        """
+        folder = os.path.abspath(folder)
+        path = os.path.abspath(os.path.join(folder, relative_path))
+        if os.path.isabs(relative_path) or os.path.commonpath([folder, path]) != folder:
+            raise FedoraException("Path %s of %s is outside %s" % (relative_path, object_id, folder))
+        return path
+
     @staticmethod
-    def id_iter(id_list):
+    def _find_local_copy(object_id, expected_path, profile, fingerprints):
+        """
+        :return: path of an existing local copy with the size and SHA-1 of the datastream, or `None`
+        """
+        # the name given by the server may differ from the name in EASY_FILE_METADATA
+        candidates = [expected_path] + [p for p in fingerprints.local_paths(object_id)
+                                        if p != expected_path and os.path.dirname(p) == os.path.dirname(expected_path)]
+        for candidate in candidates:
+            try:
+                if os.path.getsize(candidate) != profile.ds_size:
+                    continue
+            except OSError:
+                continue
+            if fingerprints.sha1(candidate, object_id) == profile.ds_checksum:
+                return candidate
+        return None
+
+    @staticmethod
+    def id_iter(id_list, dedupe=False, shard=0, shards=1, start=0, stop=None):
+        """
+        Iterate ids without holding them all in memory.
+
+        :param id_list: the name of a file with one id per line, or any iterable of ids, f.i. a generator over
+            risearch results; a leading 'info:fedora/' is removed and empty ids are skipped
+        :param dedupe: skip ids that were seen before: `False` (default), `True` or 'bitmap' for a
+            :class:`fedora.idset.PidBitmap`, 'bloom' for a :class:`fedora.idset.BloomFilter` with room for
+            ten million ids, or any object with a method `add(id)` that returns `False` for a known id
+        :param shard: only yield ids of this shard, default: 0
+        :param shards: number of shards, id number i (after deduplication) belongs to shard i % `shards`, default: 1
+        :param start: skip the ids before id number `start`, default: 0
+        :param stop: stop at id number `stop`, default: `None` (go to the end)
+        """
+        if dedupe is True or dedupe == "bitmap":
+            seen = PidBitmap()
+        elif dedupe == "bloom":
+            seen = BloomFilter(10 ** 7)
+        elif dedupe:
+            seen = dedupe
+        else:
+            seen = None
         if isinstance(id_list, str):
             with open(id_list, "r") as id_file:
-                for line in id_file:
-                    yield line.rstrip()
-        elif isinstance(id_list, list):
-            for id in id_list:
+                yield from Worker._select((line.strip() for line in id_file), seen, shard, shards, start, stop)
+        else:
+            yield from Worker._select(id_list, seen, shard, shards, start, stop)
+
+    @staticmethod
+    def _select(ids, seen, shard, shards, start, stop):
+        i = 0
+        for id in ids:
+            if stop is not None and i >= stop:
+                break
+            if id.startswith("info:fedora/"):
+                id = id[len("info:fedora/"):]
+            if id == "" or (seen is not None and not seen.add(id)):
+                continue
+            if i >= start and i % shards == shard:
                 yield id
+            i += 1
 
 
 class LocalWorker(object):
@@ -137,6 +406,10 @@ class LocalWorker(object):
         The column with column number `col_checksum_error` should be empty and will be used for reporting checksum
         errors.
 
+        Work-logs in parquet or sqlite format (see :mod:`fedora.worklog`) are recognized by their extension; columns
+        are then found by name and the column numbers are ignored. In an sqlite work-log only rows with a changed
+        status are updated, the work-log is not rewritten.
+
         :param log_file: name of the file containing local_path and previously calculated sha1 in columns
         :param has_header: does the `log_file` have column headings, default: True
         :param col_local_path: the column number (zero-based) that contains the local path to each inspected file
@@ -145,6 +418,11 @@ class LocalWorker(object):
         :return: count of checksum errors
         """
         abs_log_file = os.path.abspath(log_file)
+        fmt = worklog.log_format(abs_log_file)
+        if fmt == "parquet":
+            return self._verify_checksums_parquet(abs_log_file)
+        elif fmt == "sqlite":
+            return self._verify_checksums_sqlite(abs_log_file)
         parts = os.path.splitext(os.path.basename(abs_log_file))
         digits = re.findall("\d+", parts[0])
         ordinal = (int(digits[0]) if len(digits) > 0 else 0) + 1
@@ -179,3 +457,58 @@ class LocalWorker(object):
         os.remove(abs_log_file)
         os.rename(new_log_file, abs_log_file)
         return checksum_error_count
+
+    @staticmethod
+    def _verify_checksums_parquet(abs_log_file):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        # the checksum_error column is replaced as a whole, other columns are copied without parsing rows
+        table = pq.read_table(abs_log_file)
+        local_paths = table.column("local_path").to_pylist()
+        checksums = table.column("checksum").to_pylist()
+        previous_errors = table.column("checksum_error").to_pylist()
+
+        checksum_error_count = 0
+        checksum_errors = []
+        for local_path, checksum, previous_error in zip(local_paths, checksums, previous_errors):
+            LOG.debug("Verify sha1 checksum: %s" % local_path)
+            if previous_error:
+                checksum_error = "compromised checksum from previous check: " + previous_error
+                checksum_error_count += 1
+                LOG.warning("Compromised checksum from previous check: %s" % local_path)
+            else:
+                sha1 = utils.sha1_for_file(local_path)
+                if sha1 != checksum:
+                    checksum_error = sha1
+                    checksum_error_count += 1
+                    LOG.warning("Found compromised sha1: %s" % local_path)
+                else:
+                    checksum_error = ""
+            checksum_errors.append(checksum_error)
+
+        index = table.schema.get_field_index("checksum_error")
+        table = table.set_column(index, "checksum_error", pa.array(checksum_errors, type=pa.string()))
+        tmp_file = abs_log_file + ".tmp"
+        pq.write_table(table, tmp_file)
+        os.replace(tmp_file, abs_log_file)
+        return checksum_error_count
+
+    @staticmethod
+    def _verify_checksums_sqlite(abs_log_file):
+        checksum_error_count = 0
+        with worklog.SqliteWorkLog(abs_log_file) as store:
+            for file_id, local_path, checksum, previous_error in \
+                    store.rows(["file_id", "local_path", "checksum", "checksum_error"]):
+                LOG.debug("Verify sha1 checksum: %s" % local_path)
+                if previous_error:
+                    # status does not change, the row is left alone
+                    checksum_error_count += 1
+                    LOG.warning("Compromised checksum from previous check: %s" % local_path)
+                    continue
+                sha1 = utils.sha1_for_file(local_path)
+                if sha1 != checksum:
+                    checksum_error_count += 1
+                    LOG.warning("Found compromised sha1: %s" % local_path)
+                    store.update(file_id, checksum_error=sha1)
+        return checksum_error_count
@@ -0,0 +1,345 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+import csv
+import os
+import sqlite3
+
+from fedora import utils
+
+# the columns of the work-log written by :meth:`fedora.worker.Worker.download_batch`
+WORK_LOG_COLUMNS = ["file_id", "dataset_id", "server_date", "filename", "path", "local_path",
+                    "media_type", "size",
+                    "checksum_type", "checksum", "creation_date",
+                    "creator_role", "visible_to", "accessible_to",
+                    "checksum_error"]
+
+# the columns of the work-log of a batch with a content store or a fingerprint cache: 'transfer' says whether a
+# file was downloaded ('download'), hardlinked from the store ('dedup') or found locally ('skip')
+TRANSFER_COLUMNS = WORK_LOG_COLUMNS + ["transfer"]
+
+# columns that are not text
+INT_COLUMNS = ("size",)
+
+
+class CsvWorkLog(object):
+    """
+    Writes a work-log as csv, row by row.
+
+    :param path: path of the work-log
+    :param dialect: csv dialect, default: :class:`utils.RFC4180`
+    :param columns: column headings, default: :data:`WORK_LOG_COLUMNS`
+    """
+
+    def __init__(self, path, dialect=utils.RFC4180, columns=WORK_LOG_COLUMNS):
+        self.path = path
+        self.columns = columns
+        self.file = open(path, 'w', newline='')
+        self.writer = csv.writer(self.file, dialect=dialect)
+        self.writer.writerow(columns)
+
+    def write(self, row):
+        self.writer.writerow(_fit(row, self.columns))
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class ParquetWorkLog(object):
+    """
+    Writes a work-log as Apache Parquet. Rows are buffered and written in row groups of `row_group_size` rows.
+    Columns are typed: :data:`INT_COLUMNS` are 64-bit integers, all other columns are strings. Values that do not fit
+    the type of their column, like the 'ERROR' placeholders of failed downloads, are written as null.
+
+    Needs the package `pyarrow`.
+
+    :param path: path of the work-log
+    :param row_group_size: number of rows in a row group, default: 10000
+    :param columns: column headings, default: :data:`WORK_LOG_COLUMNS`
+    """
+
+    def __init__(self, path, row_group_size=10000, columns=WORK_LOG_COLUMNS):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.path = path
+        self.columns = columns
+        self.row_group_size = row_group_size
+        self.schema = schema(columns)
+        self.writer = pq.ParquetWriter(path, self.schema)
+        self.buffer = [[] for _ in columns]
+        self.pa = pa
+
+    def write(self, row):
+        for i, value in enumerate(_fit(row, self.columns)):
+            self.buffer[i].append(value)
+        if len(self.buffer[0]) >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        if len(self.buffer[0]) == 0:
+            return
+        arrays = [self.pa.array([_convert(value, field.name) for value in values], type=field.type)
+                  for values, field in zip(self.buffer, self.schema)]
+        self.writer.write_table(self.pa.Table.from_arrays(arrays, schema=self.schema))
+        self.buffer = [[] for _ in self.columns]
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class SqliteWorkLog(object):
+    """
+    Keeps a work-log in an SQLite database, one row per file_id, with an index on local_path.
+
+    Writing a row for a file_id that is already in the database replaces the old row. Checksum verification
+    (see :meth:`fedora.worker.LocalWorker.verify_checksums_local`) updates rows in place and only touches rows
+    whose status changed. The database runs in WAL mode and commits in batches, so a crash loses at most the
+    last uncommitted batch and never leaves the work-log half-written. Use :meth:`export_csv` to get the
+    familiar csv work-log and :meth:`import_csv` to take in existing ones.
+
+    A database that lacks some of the `columns`, like a work-log from before the column 'transfer', gets the
+    missing columns added, with null values in the existing rows.
+
+    :param path: path of the database
+    :param batch_size: number of rows per transaction, default: 1000
+    :param columns: column headings, default: `None` (the columns of an existing database, otherwise
+        :data:`WORK_LOG_COLUMNS`)
+    """
+
+    def __init__(self, path, batch_size=1000, columns=None):
+        self.path = path
+        self.batch_size = batch_size
+        self.pending = 0
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        existing = [row[1] for row in self.connection.execute("PRAGMA table_info(work_log)")]
+        if columns is None:
+            columns = existing or WORK_LOG_COLUMNS
+        self.columns = columns
+        if existing:
+            for name in columns:
+                if name not in existing:
+                    self.connection.execute("ALTER TABLE work_log ADD COLUMN %s %s" % (name, _sql_type(name)))
+        else:
+            column_defs = ", ".join("%s %s" % (name, _sql_type(name)) for name in columns)
+            self.connection.execute("CREATE TABLE work_log (%s, PRIMARY KEY (%s))" % (column_defs, columns[0]))
+        self.connection.execute("CREATE INDEX IF NOT EXISTS work_log_local_path ON work_log (local_path)")
+        self.connection.commit()
+        self.insert = "INSERT OR REPLACE INTO work_log (%s) VALUES (%s)" \
+                      % (", ".join(columns), ", ".join("?" * len(columns)))
+
+    def write(self, row):
+        self.connection.execute(self.insert, [_convert(value, name)
+                                              for value, name in zip(_fit(row, self.columns), self.columns)])
+        self._tick()
+
+    def update(self, file_id, **values):
+        """
+        Update columns of the row with the given file_id.
+
+        :param file_id: the file_id of the row
+        :param values: column names and their new values
+        """
+        assignments = ", ".join("%s = ?" % name for name in values)
+        self.connection.execute("UPDATE work_log SET %s WHERE %s = ?" % (assignments, self.columns[0]),
+                                list(values.values()) + [file_id])
+        self._tick()
+
+    def rows(self, columns=None):
+        """
+        Iterate the rows of the work-log in the order they were written.
+
+        :param columns: names of the columns to select, default: all columns
+        :return: generator of tuples
+        """
+        columns = columns or self.columns
+        select = "SELECT rowid, %s FROM work_log WHERE rowid > ? ORDER BY rowid LIMIT ?" % ", ".join(columns)
+        # page through the table, so that rows can be updated while iterating
+        last = 0
+        while True:
+            page = self.connection.execute(select, (last, self.batch_size)).fetchall()
+            if len(page) == 0:
+                break
+            last = page[-1][0]
+            for row in page:
+                yield row[1:]
+
+    def lookup(self, local_path):
+        """
+        :param local_path: local path of a downloaded file
+        :return: the row of the work-log for this local path, or `None`
+        """
+        return self.connection.execute("SELECT %s FROM work_log WHERE local_path = ?" % ", ".join(self.columns),
+                                       (local_path,)).fetchone()
+
+    def import_csv(self, log_file, dialect=csv.excel, has_header=True):
+        """
+        Add the rows of a csv work-log.
+
+        :param log_file: the csv work-log, with columns in the order of :data:`WORK_LOG_COLUMNS`
+        :param dialect: csv dialect of the work-log
+        :param has_header: does the `log_file` have column headings, default: True
+        :return: number of imported rows
+        """
+        count = 0
+        with open(log_file, "r", newline='') as f:
+            reader = csv.reader(f, dialect=dialect)
+            if has_header:
+                next(reader, None)
+            for row in reader:
+                self.write(row)
+                count += 1
+        self.commit()
+        return count
+
+    def export_csv(self, log_file, dialect=utils.RFC4180):
+        """
+        Write the work-log as csv.
+
+        :param log_file: path of the csv file
+        :param dialect: csv dialect, default: :class:`utils.RFC4180`
+        :return: number of exported rows
+        """
+        count = 0
+        tmp_file = log_file + ".tmp"
+        with open(tmp_file, "w", newline='') as f:
+            writer = csv.writer(f, dialect=dialect)
+            writer.writerow(self.columns)
+            for row in self.rows():
+                writer.writerow(["" if value is None else value for value in row])
+                count += 1
+        os.replace(tmp_file, log_file)
+        return count
+
+    def commit(self):
+        self.connection.commit()
+        self.pending = 0
+
+    def close(self):
+        self.commit()
+        self.connection.close()
+
+    def _tick(self):
+        self.pending += 1
+        if self.pending >= self.batch_size:
+            self.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+WORK_LOG_FORMATS = {"csv": CsvWorkLog, "parquet": ParquetWorkLog, "sqlite": SqliteWorkLog}
+
+
+def schema(columns=WORK_LOG_COLUMNS):
+    """
+    :return: the pyarrow schema of a work-log with the given columns
+    """
+    import pyarrow as pa
+
+    return pa.schema([(name, pa.int64() if name in INT_COLUMNS else pa.string()) for name in columns])
+
+
+def log_format(path):
+    """
+    Derive the format of a work-log from its file extension.
+
+    :param path: path of the work-log
+    :return: 'parquet' for files ending in .parquet or .pq, 'sqlite' for .db, .sqlite or .sqlite3, 'csv' otherwise
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".parquet", ".pq"):
+        return "parquet"
+    if ext in (".db", ".sqlite", ".sqlite3"):
+        return "sqlite"
+    return "csv"
+
+
+def open_work_log(path, fmt=None, dialect=utils.RFC4180, columns=WORK_LOG_COLUMNS):
+    """
+    Open a work-log for writing. Rows that are longer than `columns` are cut to size, shorter rows are padded
+    with `None`.
+
+    :param path: path of the work-log
+    :param fmt: a key in :data:`WORK_LOG_FORMATS`, a class with the same interface as :class:`CsvWorkLog`,
+        or `None` to derive the format from the extension of `path`
+    :param dialect: csv dialect, only used for the csv format
+    :param columns: column headings, default: :data:`WORK_LOG_COLUMNS`; :data:`TRANSFER_COLUMNS` adds 'transfer'
+    :return: a work-log writer
+    """
+    if fmt is None:
+        fmt = log_format(path)
+    cls = WORK_LOG_FORMATS[fmt] if isinstance(fmt, str) else fmt
+    if cls is CsvWorkLog:
+        return cls(path, dialect=dialect, columns=columns)
+    return cls(path, columns=columns)
+
+
+def read_work_log(path, fmt=None, dialect=csv.excel):
+    """
+    Read the rows of a work-log in any of the :data:`WORK_LOG_FORMATS`. Rows have the columns of the work-log:
+    the :data:`WORK_LOG_COLUMNS`, possibly followed by more, like 'transfer' of :data:`TRANSFER_COLUMNS`.
+
+    :param path: path of the work-log
+    :param fmt: format of the work-log, default: derived from the extension of `path`
+    :param dialect: csv dialect, only used for the csv format
+    :return: generator of rows, column headings are skipped
+    """
+    if fmt is None:
+        fmt = log_format(path)
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+
+        parquet_file = pq.ParquetFile(path)
+        for i in range(parquet_file.num_row_groups):
+            columns = parquet_file.read_row_group(i).to_pydict()
+            for row in zip(*columns.values()):
+                yield list(row)
+    elif fmt == "sqlite":
+        with SqliteWorkLog(path) as store:
+            for row in store.rows():
+                yield list(row)
+    else:
+        with open(path, "r", newline='') as f:
+            reader = csv.reader(f, dialect=dialect)
+            next(reader, None)
+            for row in reader:
+                yield row
+
+
+def _fit(row, columns):
+    if len(row) == len(columns):
+        return row
+    return list(row[:len(columns)]) + [None] * (len(columns) - len(row))
+
+
+def _sql_type(name):
+    return "INTEGER" if name in INT_COLUMNS else "TEXT"
+
+
+def _convert(value, name):
+    if value is None:
+        return None
+    if name in INT_COLUMNS:
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+    return str(value)
@@ -9,5 +9,6 @@ setup(
     author='hvdb',
     author_email='',
     description='scripting fedora commons',
-    install_requires=['requests', 'python-dateutil']
+    install_requires=['requests', 'python-dateutil'],
+    extras_require={'parquet': ['pyarrow'], 'http2': ['httpx[http2]'], 'zstd': ['zstandard']}
 )